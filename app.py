@@ -1,99 +1,15 @@
 import streamlit as slit
-import serial.tools.list_ports
-import serial
-import glob
-import subprocess
-import threading
-import time
-import sys
-import queue
 from datetime import datetime
-import os
-import signal
-import json
-
-# Define BAUD_RATE globally
-BAUD_RATE = 9600
-
-# Initialize session_state keys
-if "outputs" not in slit.session_state:
-    slit.session_state.outputs = {}
-if "threads" not in slit.session_state:
-    slit.session_state.threads = {}
-if "queues" not in slit.session_state:
-    slit.session_state.queues = {}
-if "asset_ids" not in slit.session_state:
-    slit.session_state.asset_ids = {}
-if "port_workflows" not in slit.session_state:
-    slit.session_state.port_workflows = {}
-if "ident_queues" not in slit.session_state:
-    slit.session_state.ident_queues = {}
-if "ident_messages" not in slit.session_state:
-    slit.session_state.ident_messages = {}
-if "pids" not in slit.session_state:
-    slit.session_state.pids = {}
-if "port_status" not in slit.session_state:
-    slit.session_state.port_status = {}
-
-def get_com_ports():
-    com_ports = serial.tools.list_ports.comports()
-    return [com_port.device for com_port in com_ports]
-
-def get_workflow_templates(workflow_dir="workflow/templates"):
-    return glob.glob(f"{workflow_dir}/*.json")
-
-def run_workflow_on_port(workflow_path, com_port, q):
-    try:
-        q.put(("info", f"--- Running {workflow_path} on {com_port} ---\n"))
-
-        process = subprocess.Popen(
-            [sys.executable, "-u", "workflow/workflow_runner.py", workflow_path, com_port],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            errors="ignore"
-        )
-        q.put(("pid", process.pid))
-
-        def read_stderr():
-            # Read character-by-character, not line-by-line
-            # This fixes the bug where raw output was not appearing
-            for char in iter(lambda: process.stderr.read(1), ''):
-                q.put(("output", char))
-
-        stderr_thread = threading.Thread(target=read_stderr)
-        stderr_thread.start()
-        for line in iter(process.stdout.readline, ''):
-            if line.startswith("STATUS_FLAG::"):
-                payload_str = line.replace("STATUS_FLAG::", "").strip()
-                try:
-                    # --- THIS IS THE NEW LOGIC ---
-                    # Parse the JSON payload from the runner
-                    status_data = json.loads(payload_str)
-                    q.put(("status", status_data))
-                except json.JSONDecodeError:
-                    # Fallback for simple strings
-                    q.put(("status", {"text": payload_str, "interactive": False}))
-            else:
-                q.put(("output", f"[STDOUT_UNEXPECTED] {line}"))
-
-        process.stdout.close()
-        process.stderr.close()
-        stderr_thread.join()
-        return_code = process.wait()
-
-        if return_code == 0:
-            q.put(("info", f"\n--- FINISHED {com_port}: SUCCESS ---"))
-            q.put(("status", {"text": "Successfully Finished", "completed": True}))
-        else:
-            q.put(("info", f"\n--- FINISHED {com_port}: FAIL (Code {return_code}) ---"))
-            q.put(("status", {"text": "Fatally Failed", "interactive": True}))
+import re
+import itertools
+import threading
 
-    except Exception as e:
-        q.put(("info", f"\n!!!---!!! CRITICAL ERROR on {com_port} !!!---!!!\n{e}"))
-        q.put(("status", {"text": "Fatally Failed", "interactive": True}))
-    finally:
-        q.put(("done", None))
+from hub.log_archive import LogArchive
+from hub.log_index import LogIndex
+from hub.log_stream import STREAM_PORT, start_log_stream, terminal_html
+from hub.orchestrator import Orchestrator
+from hub.runs import get_workflow_templates
+from hub.template_analyzer import format_duration, format_issue, has_errors
 
 # Streamlit UI
 slit.set_page_config(layout="wide")
@@ -181,26 +97,84 @@ div[data-testid="stVerticalBlock"][style*="height: 400px"] {
 
 slit.title("Workflow Hub")
 
-def identify_port_threaded(com_port, q):
-    ident_duration = 20
-    try:
-        q.put(("info", f"Sending {ident_duration}-sec blink to {com_port}"))
-        with serial.Serial(com_port, BAUD_RATE, timeout=1) as ser:
-            end_time = time.time() + ident_duration
-            while time.time() < end_time:
-                ser.write(b"IDENTIFYING_PORT\r\n")
-                ser.flush()
-                time.sleep(0.05)
-        q.put(("success", f"Ident for {com_port} complete."))
-        time.sleep(2)
-    except Exception as e:
-        q.put(("error", f"Could not open {com_port}. Is it in use? Error: {e}"))
-        time.sleep(3)
-    finally:
-        q.put((None, None))
+LOG_TAIL_BYTES = 64 * 1024
+HISTORY_TTL = 30     # seconds a Log History search is reused
+
+@slit.cache_resource
+def get_orchestrator():
+    # One orchestrator per Streamlit server: it outlives page reloads and is
+    # shared by every viewer, so this script only renders its state.
+    return Orchestrator()
+
+@slit.cache_resource
+def get_log_stream():
+    # Pushes new log chunks to the browser; None if the stream port is taken,
+    # in which case the log boxes fall back to re-rendering the text.
+    return start_log_stream(get_orchestrator(), app_port=slit.get_option("server.port"))
+
+@slit.cache_resource
+def get_log_index():
+    # Opened once per server instead of on every rerun; the lock keeps
+    # viewers from using the shared SQLite connection at the same time.
+    return LogIndex(), threading.Lock()
+
+@slit.cache_data(ttl=HISTORY_TTL, max_entries=32, show_spinner=False)
+def search_history(query):
+    # Reruns with the same query reuse the hits; a newly indexed run shows up after HISTORY_TTL.
+    index, lock = get_log_index()
+    with lock:
+        return index.search(query, limit=100)
+
+# --- UPDATED HTML FUNCTION ---
+def get_status_html(status_data):
+    # Default state
+    status_text = "Idle"
+    is_interactive = False
+    is_completed = False
+
+    if isinstance(status_data, dict):
+        status_text = status_data.get("text", "Idle")
+        is_interactive = status_data.get("interactive", False)
+        is_completed = status_data.get("completed", True)
+    elif status_data: # Fallback for old string
+        status_text = str(status_data)
+
+    # --- MODIFIED LOGIC ---
+    # Prioritize red "Failed" status over flashing
+    if status_text == "Fatally Failed":
+        return f'<p class="status-failed">Err: {status_text}</p>'
+    if status_text == "Cancelled":
+        return f'<p class="status-gray">Status: {status_text}</p>'
+
+    # Check for flashing flag
+    if is_interactive:
+        return f'<div class="status-interactive">Interact: {status_text}</div>'
+
+    # Standard color logic
+    if status_text == "Successfully Finished":
+        return f'<p class="status-green status-completed">Status: {status_text}</p>'
+    elif status_text == "Idle" or status_text == "Starting...":
+        return f'<p class="status-gray">Status: {status_text}</p>'
+    else:
+        return f'<p class="status-blue">Processing: {status_text}</p>'
+
+orchestrator = get_orchestrator()
+log_stream = get_log_stream()
+
+with slit.sidebar:
+    slit.header("Log History")
+    history_query = slit.text_input("Search all past runs", help="Substring match, e.g. %Error deleting or FOC1234")
+    if history_query:
+        history_hits = search_history(history_query)
+        if not history_hits:
+            slit.info("No matches")
+        for run_id, source, asset_id, template, port, status, started, line_no, line in history_hits:
+            when = datetime.fromtimestamp(started).strftime("%d.%m.%Y %H:%M") if started else "?"
+            slit.markdown(f"**{asset_id or '-'}** · {template or '-'} · {when}")
+            slit.code(f"{line_no}: {line}")
 
 slit.header("Select COM Ports")
-available_com_ports = get_com_ports()
+available_com_ports = orchestrator.list_ports()
 
 if slit.checkbox("Select All COM Ports"):
     selected_com_ports = slit.multiselect(
@@ -214,104 +188,97 @@ if slit.button("Prepare COM Port Containers", type="primary"):
         slit.error("You must select at least one COM Port")
     else:
         slit.info(f"Preparing {len(selected_com_ports)} port(s)...")
-        slit.session_state.outputs = {}
-        slit.session_state.threads = {}
-        slit.session_state.queues = {}
-        slit.session_state.asset_ids = {}
-        slit.session_state.port_workflows = {}
-        slit.session_state.ident_queues = {}
-        slit.session_state.ident_messages = {}
-        slit.session_state.pids = {}
-        slit.session_state.port_status = {}
-        for com_port in selected_com_ports:
-            slit.session_state.outputs[f"output_{com_port}"] = "Waiting to start..."
+        orchestrator.prepare(selected_com_ports)
+
+with slit.expander("Bench Analytics"):
+    # Only queried while shown: the page reruns whenever a port changes.
+    analytics_hours = slit.selectbox("Window", [8, 24, 24 * 7], index=1, key="analytics_hours",
+                                     format_func=lambda h: f"Last {h // 24} days" if h > 24 else f"Last {h} hours")
+    if slit.checkbox("Show utilization", key="analytics_shown"):
+        analytics = orchestrator.analytics(analytics_hours)
+        if analytics is None:
+            slit.info("The bench timeline is not available on this hub.")
+        else:
+            slit.markdown(f"**{analytics['verdict']}**")
+            metric_cols = slit.columns(4)
+            metric_cols[0].metric("Runs succeeded", f"{analytics['succeeded']}/{analytics['runs']}")
+            metric_cols[1].metric("Port utilization", f"{analytics['utilization']:.0%}")
+            metric_cols[2].metric("Operator wait", format_duration(analytics["states"]["operator"]))
+            metric_cols[3].metric("Failed, unattended", format_duration(analytics["states"]["failed"]))
+            slit.caption("Ports")
+            slit.dataframe([{"Port": p["port"], "Busy": f"{p['utilization']:.0%}",
+                             **{state.capitalize(): format_duration(p[state]) for state in analytics["states"]}}
+                            for p in analytics["ports"]], hide_index=True, use_container_width=True)
+            slit.caption("Templates")
+            slit.dataframe([{"Template": t["template"], "Succeeded": t["succeeded"], "Failed": t["failed"],
+                             "Cancelled": t["cancelled"], "Per hour": round(t["per_hour"], 1),
+                             "Mean run": format_duration(t["mean_run"])}
+                            for t in analytics["templates"]], hide_index=True, use_container_width=True)
+            slit.caption("Steps by wall-clock time")
+            slit.dataframe([{"Share": f"{s['share']:.0%}", "Template": s["template"], "Step": s["step"],
+                             "Waits on": s["state"], "Total": format_duration(s["total"]), "Runs": s["count"],
+                             "Mean": format_duration(s["mean"])}
+                            for s in analytics["steps"]], hide_index=True, use_container_width=True)
 
 active_threads = False
-if slit.session_state.outputs:
-    output_ports = list(slit.session_state.outputs.keys())
+drawn_versions = {}
+if orchestrator.bench:
+    output_ports = list(orchestrator.bench)
     port_count = len(output_ports)
+    # One lock round-trip for the whole grid; unchanged ports come back as cached snapshots.
+    port_records = orchestrator.snapshots(output_ports)
+    drawn_versions = {port: record["version"] for port, record in port_records.items()}
     MAX_COLS_PER_ROW = 2
 
-    # --- UPDATED HTML FUNCTION ---
-    def get_status_html(status_data):
-        # Default state
-        status_text = "Idle"
-        is_interactive = False
-        is_completed = False
-
-        if isinstance(status_data, dict):
-            status_text = status_data.get("text", "Idle")
-            is_interactive = status_data.get("interactive", False)
-            is_completed = status_data.get("completed", True)
-        elif status_data: # Fallback for old string
-            status_text = str(status_data)
-
-        # --- MODIFIED LOGIC ---
-        # Prioritize red "Failed" status over flashing
-        if status_text == "Fatally Failed":
-            return f'<p class="status-failed">Err: {status_text}</p>'
-
-        # Check for flashing flag
-        if is_interactive:
-            return f'<div class="status-interactive">Interact: {status_text}</div>'
-
-        # Standard color logic
-        if status_text == "Successfully Finished":
-            return f'<p class="status-green status-completed">Status: {status_text}</p>'
-        elif status_text == "Idle" or status_text == "Starting...":
-            return f'<p class="status-gray">Status: {status_text}</p>'
-        else:
-            return f'<p class="status-blue">Processing: {status_text}</p>'
-
     available_workflows = get_workflow_templates()
 
+    # Ports waiting on a person, most urgent first, so nobody has to scan the grid for flashing boxes.
+    attention = orchestrator.attention_queue()
+    if attention:
+        slit.subheader(f"Waiting on Operator ({len(attention)})")
+        for rank_no, entry in enumerate(attention, 1):
+            left = f"{format_duration(max(entry['remaining'], 0))} left" if entry["remaining"] is not None else "no timeout"
+            line = (f"{rank_no}. **{entry['port']}** · {entry['asset_id'] or '-'} · {entry['status']} · "
+                    f"waiting {format_duration(entry['waited'])}, {left}")
+            if entry["remaining"] is not None and entry["remaining"] < entry["timeout"] / 4:
+                slit.error(line)
+            else:
+                slit.warning(line)
+
+    if port_count > 1:
+        with slit.expander("Gang Start (identical devices in lockstep)"):
+            gang_workflow = slit.selectbox("Workflow Template", options=available_workflows, key="gang_workflow")
+            if slit.button("Start All Ports as a Gang", use_container_width=True):
+                # Asset IDs come from each port's input below (kept in session_state between reruns).
+                gang_asset_ids = {port: slit.session_state.get(f"asset_id_{port}", "") for port in output_ports}
+                if not gang_workflow:
+                    slit.error("No workflow selected for the gang!")
+                elif not all(gang_asset_ids.values()):
+                    slit.error("Every port needs an Asset ID before a gang start!")
+                else:
+                    try:
+                        started = orchestrator.start_gang(output_ports, gang_workflow, gang_asset_ids)
+                    except ValueError as e:
+                        slit.error(str(e))
+                    else:
+                        if started:
+                            slit.rerun()
+                        slit.error("One or more ports are busy.")
+
     if port_count > 0:
         for i in range(0, port_count, MAX_COLS_PER_ROW):
-            row_port_keys = output_ports[i : i + MAX_COLS_PER_ROW]
+            row_ports = output_ports[i : i + MAX_COLS_PER_ROW]
             output_cols = slit.columns(MAX_COLS_PER_ROW)
 
-            for col_index, port_key in enumerate(row_port_keys):
-                port_name = port_key.replace("output_", "")
-
-                thread_is_running = (port_name in slit.session_state.threads and
-                                     slit.session_state.threads[port_name].is_alive())
-
-                if port_name in slit.session_state.queues:
-                    q = slit.session_state.queues[port_name]
-                    while not q.empty():
-                        msg_type, msg = q.get()
-                        if msg_type == "pid":
-                            slit.session_state.pids[port_name] = msg
-                        elif msg_type == "output":
-                            slit.session_state.outputs[port_key] += msg
-                        elif msg_type == "status":
-                            # --- MODIFIED: 'msg' is now a dictionary ---
-                            slit.session_state.port_status[port_name] = msg
-                        elif msg_type == "info":
-                            slit.session_state.outputs[port_key] += msg
-                        elif msg_type == "done":
-                            del slit.session_state.queues[port_name]
-                            if port_name in slit.session_state.pids:
-                                del slit.session_state.pids[port_name]
-                            break
+            for col_index, port_name in enumerate(row_ports):
+                record = port_records[port_name]
+                thread_is_running = record["running"]
+                ident_is_running = record["ident_running"]
 
                 with output_cols[col_index]:
-                    # ... (Ident logic remains the same) ...
                     ident_placeholder = slit.empty()
-                    if port_name in slit.session_state.ident_queues:
-                        q = slit.session_state.ident_queues[port_name]
-                        while not q.empty():
-                            msg_type, msg = q.get()
-                            if msg_type is None:
-                                del slit.session_state.ident_queues[port_name]
-                                if port_name in slit.session_state.ident_messages:
-                                    del slit.session_state.ident_messages[port_name]
-                                ident_placeholder.empty()
-                            else:
-                                slit.session_state.ident_messages[port_name] = (msg_type, msg)
-
-                    if port_name in slit.session_state.ident_messages:
-                        msg_type, msg = slit.session_state.ident_messages[port_name]
+                    if record["ident"]:
+                        msg_type, msg = record["ident"]
                         if msg_type == "info":
                             ident_placeholder.info(msg)
                         elif msg_type == "success":
@@ -324,31 +291,34 @@ if slit.session_state.outputs:
                         slit.subheader(port_name)
                     with button_col:
                         slit.write("")
-                        ident_is_running = port_name in slit.session_state.ident_queues
                         if slit.button("Ident", key=f"blink_{port_name}",
                                        use_container_width=True, disabled=thread_is_running or ident_is_running):
-                            q = queue.Queue()
-                            slit.session_state.ident_queues[port_name] = q
-                            thread = threading.Thread(target=identify_port_threaded, args=(port_name, q))
-                            thread.start()
+                            orchestrator.start_ident(port_name)
                             slit.rerun()
 
-                    # --- MODIFIED: Status display ---
-                    # Get the status dict, or a default dict if none
-                    status_data = slit.session_state.port_status.get(port_name, {"text": "Idle", "interactive": False, "completed": False})
-                    slit.markdown(get_status_html(status_data), unsafe_allow_html=True)
-
-                    current_assetid = slit.session_state.asset_ids.get(port_name, "")
-                    # ... (rest of Asset ID, Selectbox, Start/Stop buttons, etc. is unchanged) ...
-                    slit.session_state.asset_ids[port_name] = slit.text_input(
-                        "Asset ID", value=current_assetid, key=f"asset_id_{port_name}"
+                    slit.markdown(get_status_html(record["status"]), unsafe_allow_html=True)
+                    if record["gang"] and thread_is_running:
+                        slit.caption(f"Gang of {len(record['gang'])}: stopping this port stops the whole gang")
+                    if record["console"] and thread_is_running:
+                        slit.caption(f"Watch the console: `screen {record['console']['pty']}` · "
+                                     f"`socat - UNIX-CONNECT:{record['console']['socket']}`")
+
+                    port_inventory = record["inventory"]
+                    if port_inventory:
+                        slit.caption(" · ".join(
+                            f"{field}: {', '.join(value) if isinstance(value, list) else value}"
+                            for field, value in port_inventory.items()))
+
+                    # Another viewer may have started this run; show what it is running.
+                    asset_id = slit.text_input(
+                        "Asset ID", value=record["asset_id"], key=f"asset_id_{port_name}",
+                        disabled=thread_is_running
                     )
 
-                    current_workflow = slit.session_state.port_workflows.get(port_name)
                     default_index = 0
-                    if current_workflow and current_workflow in available_workflows:
-                        default_index = available_workflows.index(current_workflow)
-                    slit.session_state.port_workflows[port_name] = slit.selectbox(
+                    if record["template"] in available_workflows:
+                        default_index = available_workflows.index(record["template"])
+                    workflow_to_run = slit.selectbox(
                         "Workflow Template",
                         options=available_workflows,
                         index=default_index,
@@ -356,84 +326,120 @@ if slit.session_state.outputs:
                         disabled=thread_is_running
                     )
 
+                    # Follow-up procedures (verification, baseline config) run on the same open session.
+                    chain_to_run = slit.multiselect(
+                        "Then run (same session)",
+                        options=available_workflows,
+                        default=[t for t in record["chain"] if t in available_workflows],
+                        key=f"chain_{port_name}",
+                        disabled=thread_is_running
+                    )
+
+                    template_errors = False
+                    for chained in chain_to_run:
+                        if has_errors(orchestrator.template_report(chained)):
+                            slit.error(f"{chained} has errors and cannot be chained")
+                            template_errors = True
+                    if workflow_to_run:
+                        report = orchestrator.template_report(workflow_to_run)
+                        template_errors = template_errors or has_errors(report)
+                        slit.caption(f"Worst case {format_duration(report['worst_case'])} "
+                                     f"(operator {format_duration(report['operator_wait'])})")
+                        for issue in report["issues"]:
+                            if issue["level"] == "error":
+                                slit.error(format_issue(issue))
+                            else:
+                                slit.warning(format_issue(issue))
+
                     if thread_is_running:
                         if slit.button("Stop Workflow", key=f"stop_{port_name}",
                                        use_container_width=True, type="primary",
-                                       help="Stops the workflow. The thread will finish and post a FAIL message."):
-                            pid = slit.session_state.pids.get(port_name)
-                            if pid:
-                                try:
-                                    os.kill(pid, signal.SIGTERM)
-                                    ident_placeholder.warning(f"Sent stop signal to {port_name} (PID: {pid})...")
-                                except ProcessLookupError:
-                                    ident_placeholder.error(f"Process {pid} already dead.")
-                                except Exception as e:
-                                    ident_placeholder.error(f"Could not stop process: {e}")
+                                       help="Stops the workflow at the next safe point, closes the port and posts a Cancelled status."):
+                            if orchestrator.stop_run(port_name):
+                                ident_placeholder.warning(f"Cancelling workflow on {port_name} (PID: {record['pid']})...")
+                            else:
+                                ident_placeholder.error(f"Workflow on {port_name} is already stopping.")
                     else:
                         if slit.button("Start Workflow", key=f"start_{port_name}",
-                                       use_container_width=True, disabled=ident_is_running):
-                            workflow_to_run = slit.session_state.port_workflows.get(port_name)
-                            asset_id = slit.session_state.asset_ids.get(port_name, "")
+                                       use_container_width=True, disabled=ident_is_running or template_errors):
                             if not workflow_to_run:
                                 slit.error("No workflow selected for this port!")
                             elif not asset_id:
                                 slit.error(f"Asset ID is required!")
                             else:
-                                if port_name in slit.session_state.pids:
-                                    del slit.session_state.pids[port_name]
-                                slit.session_state.outputs[port_key] = ""
-                                # --- MODIFIED: Set status as dict ---
-                                slit.session_state.port_status[port_name] = {"text": "Starting...", "interactive": False, "completed": False}
-                                q = queue.Queue()
-                                slit.session_state.queues[port_name] = q
-                                thread = threading.Thread(
-                                    target=run_workflow_on_port,
-                                    args=(workflow_to_run, port_name, q)
-                                )
-                                slit.session_state.threads[port_name] = thread
-                                thread.start()
+                                orchestrator.start_run(port_name, workflow_to_run, asset_id, chain_to_run)
                                 slit.rerun()
 
-                    log_data = slit.session_state.outputs.get(port_key, "")
-                    asset_id = slit.session_state.asset_ids.get(port_name, "NO_ASSET_ID")
+                    archive_path = record["archive"]
+                    log_data = record["log"]
                     timestamp = datetime.now().strftime("%d.%m.%Y_%H-%M-%S")
-                    file_name = f"{asset_id}_{timestamp}.log"
-                    slit.download_button(
-                        label="Save Log",
-                        data=log_data.encode("utf-8"),
-                        file_name=file_name,
-                        mime="text/plain",
-                        key=f"download_{port_name}",
-                        use_container_width=True,
-                        disabled=(not log_data)
-                    )
+                    file_name = f"{record['asset_id'] or 'NO_ASSET_ID'}_{timestamp}.log"
+                    if archive_path:
+                        # The archive is only expanded when asked for, and kept for this session until
+                        # the port's next run; reruns never decompress it again.
+                        prepared_key = f"prepared_log_{port_name}"
+                        prepared = slit.session_state.get(prepared_key)
+                        if not prepared or prepared[0] != archive_path:
+                            if slit.button("Prepare Log", key=f"prepare_{port_name}", use_container_width=True):
+                                prepared = (archive_path, LogArchive(archive_path).read_bytes())
+                                slit.session_state[prepared_key] = prepared
+                        if prepared and prepared[0] == archive_path:
+                            slit.download_button(
+                                label="Save Log",
+                                data=prepared[1],
+                                file_name=file_name,
+                                mime="text/plain",
+                                key=f"download_{port_name}",
+                                use_container_width=True,
+                            )
+                    else:
+                        # A running log is still being archived; only its in-memory tail can be saved.
+                        slit.session_state.pop(f"prepared_log_{port_name}", None)
+                        slit.download_button(
+                            label="Save Log (tail)" if thread_is_running else "Save Log",
+                            data=log_data.encode("utf-8"),
+                            file_name=file_name,
+                            mime="text/plain",
+                            key=f"download_{port_name}",
+                            use_container_width=True,
+                            disabled=(not log_data)
+                        )
+
+                    if log_stream:
+                        slit.components.v1.html(terminal_html(STREAM_PORT, port_name), height=400)
+                    else:
+                        log_view = LogArchive(archive_path).tail(LOG_TAIL_BYTES) if archive_path else log_data
+                        output_container = output_cols[col_index].container(height=400)
+                        output_container.markdown(f"```bash\n{log_view}\n```")
 
-                    output_container = output_cols[col_index].container(height=400)
-                    output_container.markdown(f"```bash\n{slit.session_state.outputs.get(port_key, '')}\n```")
+                    if archive_path:
+                        search_term = slit.text_input("Search log", key=f"search_{port_name}")
+                        if search_term:
+                            hits = [line for _, line in itertools.islice(LogArchive(archive_path).search(re.escape(search_term)), 200)]
+                            slit.code("\n".join(hits) or "No matches")
 
-                if port_name in slit.session_state.threads and \
-                        slit.session_state.threads[port_name].is_alive():
-                    active_threads = True
-                if port_name in slit.session_state.ident_queues:
+                if thread_is_running or ident_is_running:
                     active_threads = True
 
-    slit.components.v1.html(
-        """
-        <script>
-        (function() {
-            function scrollAllContainers() {
-                var containers = window.parent.document.querySelectorAll('div[data-testid="stVerticalBlock"][style*="height: 400px"]');
-                containers.forEach(function(container) {
-                    container.scrollTop = container.scrollHeight;
-                });
-            }
-            setTimeout(scrollAllContainers, 0);
-        })();
-        </script>
-        """,
-        height=0
-    )
+    if not log_stream:
+        slit.components.v1.html(
+            """
+            <script>
+            (function() {
+                function scrollAllContainers() {
+                    var containers = window.parent.document.querySelectorAll('div[data-testid="stVerticalBlock"][style*="height: 400px"]');
+                    containers.forEach(function(container) {
+                        container.scrollTop = container.scrollHeight;
+                    });
+                }
+                setTimeout(scrollAllContainers, 0);
+            })();
+            </script>
+            """,
+            height=0
+        )
 
 if active_threads:
-    time.sleep(0.1)
-    slit.rerun()
\ No newline at end of file
+    # Redraw when a port has new output, status or ident state instead of on a fixed tick.
+    orchestrator.wait_changed(drawn_versions, timeout=1.0)
+    slit.rerun()
@@ -0,0 +1,93 @@
+"""
+Per-host hub agent.
+
+Wraps the workflow engine on one bench host and exposes its serial ports and
+run events over HTTP, so a coordinator can drive several hosts as one bench.
+
+    python -m hub.agent --name bench1 --listen 0.0.0.0:8701
+    python -m hub.agent --name sim --listen 127.0.0.1:8702 --ports /dev/pts/3 /dev/pts/4
+"""
+import argparse
+import socket
+
+from hub.orchestrator import Orchestrator
+from hub.service import JsonRequestHandler, serve
+
+
+class HubAgent(Orchestrator):
+    """An orchestrator with a name, served over HTTP to a coordinator."""
+    def __init__(self, name, ports=None, template_dir=None):
+        super().__init__(ports, template_dir)
+        self.name = name
+
+
+class AgentRequestHandler(JsonRequestHandler):
+    routes = {
+        ("GET", "/ports"): "get_ports",
+        ("GET", "/templates"): "get_templates",
+        ("GET", "/events"): "get_events",
+        ("GET", "/attention"): "get_attention",
+        ("GET", "/analytics"): "get_analytics",
+        ("POST", "/runs"): "post_run",
+        ("POST", "/gangs"): "post_gang",
+        ("POST", "/stop"): "post_stop",
+    }
+
+    def get_ports(self, query, body):
+        agent = self.server.context
+        return 200, {"agent": agent.name, "ports": agent.port_states()}
+
+    def get_templates(self, query, body):
+        return 200, {"templates": self.server.context.list_templates()}
+
+    def get_events(self, query, body):
+        events, next_seq = self.server.context.events_since(int(query.get("since", 0)))
+        return 200, {"events": events, "next": next_seq}
+
+    def get_attention(self, query, body):
+        agent = self.server.context
+        return 200, {"agent": agent.name, "waiting": agent.attention_queue()}
+
+    def get_analytics(self, query, body):
+        agent = self.server.context
+        return 200, {"agent": agent.name, "totals": agent.utilization_totals(float(query.get("hours", 24)))}
+
+    def post_run(self, query, body):
+        started = self.server.context.start_run(body["port"], body["template"], body.get("asset_id", ""),
+                                                body.get("then", []))
+        if not started:
+            return 409, {"error": f"{body['port']} is busy"}
+        return 201, {"port": body["port"]}
+
+    def post_gang(self, query, body):
+        asset_ids = body.get("asset_ids", {})
+        started = self.server.context.start_gang(body["ports"], body["template"], asset_ids)
+        if not started:
+            return 409, {"error": "One or more ports are busy"}
+        return 201, {"ports": body["ports"]}
+
+    def post_stop(self, query, body):
+        return 200, {"stopped": self.server.context.stop_run(body["port"])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve this host's serial ports to a hub coordinator.")
+    parser.add_argument("--name", default=socket.gethostname())
+    parser.add_argument("--listen", default="0.0.0.0:8701", help="host:port to listen on")
+    parser.add_argument("--ports", nargs="*", help="Pin the port list (e.g. pty devices for simulation)")
+    parser.add_argument("--templates", help="Template directory (default: workflow/templates)")
+    args = parser.parse_args()
+
+    agent = HubAgent(args.name, args.ports, args.templates)
+    server = serve(AgentRequestHandler, args.listen, agent)
+    print(f"Hub agent '{agent.name}' listening on {args.listen}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
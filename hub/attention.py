@@ -0,0 +1,41 @@
+"""
+Operator attention queue.
+
+The engine posts a "step" event as each step starts. Steps flagged
+"require_physical_interact" ("Press MODE button") put the port on the
+queue until the next step starts or the run ends. The queue is ranked so the
+operator's next action goes where it saves the most: first the ports that
+have used up the largest share of their step timeout (long waits and little
+time left both push a port up), then the longest waits.
+"""
+import time
+
+
+def waiting_entry(step, now=None):
+    """The record kept for a port while it waits on the operator, from a "step" event."""
+    if not step.get("operator"):
+        return None
+    return {
+        "step": step.get("name"),
+        "status": step.get("status"),
+        "since": now if now is not None else time.time(),
+        "timeout": step.get("timeout"),
+    }
+
+
+def live(entry, now=None):
+    """Adds the seconds waited and the seconds left before the step times out."""
+    now = now if now is not None else time.time()
+    waited = max(now - entry["since"], 0.0)
+    timeout = entry.get("timeout")
+    return dict(entry, waited=waited, remaining=timeout - waited if timeout else None)
+
+
+def urgency(entry):
+    timeout = entry.get("timeout")
+    return entry["waited"] / timeout if timeout else 0.0
+
+
+def rank(entries):
+    """Most urgent first; 'entries' are live() entries with whatever port fields the caller adds."""
+    return sorted(entries, key=lambda e: (-urgency(e), -e["waited"]))
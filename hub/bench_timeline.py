@@ -0,0 +1,278 @@
+"""
+Bench utilization timeline and bottleneck report.
+
+The orchestrator records what every bench port is doing as back-to-back
+intervals in one of five states:
+
+    idle       on the bench, no run (waiting to be loaded and started)
+    running    a run is starting up or wrapping up, outside any step
+    operator   a step that waits on a person ("require_physical_interact")
+    device     any other step: the device boots, erases, answers commands
+    failed     the last run failed and nobody has restarted the port yet
+
+plus one row per finished run. A report over a time window answers where
+the bench's hours went: port utilization, operator wait, runs per template
+and the steps that dominate wall-clock time, and names the bottleneck.
+
+    python -m hub.bench_timeline --hours 24
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from hub.template_analyzer import format_duration
+
+TIMELINE_PATH = "logs/bench_timeline.sqlite"
+STATES = ("idle", "running", "operator", "device", "failed")
+BUSY_STATES = ("running", "operator", "device")
+RESULTS = {"Fatally Failed": "failed", "Cancelled": "cancelled"}
+SATURATED = 0.8     # Utilization above which ports, not people, limit throughput
+TOP_STEPS = 10
+RUN_FIELDS = ("runs", "succeeded", "failed", "cancelled", "run_seconds")
+
+
+def run_result(status_text):
+    return RESULTS.get(status_text, "succeeded")
+
+
+class BenchTimeline:
+    def __init__(self, path=TIMELINE_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS intervals (
+                port     TEXT NOT NULL,
+                state    TEXT NOT NULL,
+                start    REAL NOT NULL,
+                end      REAL NOT NULL,
+                template TEXT,
+                step     TEXT
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS intervals_end ON intervals(end)")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                port     TEXT NOT NULL,
+                template TEXT,
+                asset_id TEXT,
+                started  REAL,
+                ended    REAL NOT NULL,
+                result   TEXT
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS runs_ended ON runs(ended)")
+        self.db.commit()
+        self.lock = threading.Lock()
+        self.open = {}      # port -> {"state", "start", "template", "step"}
+        self.runs = {}      # port -> {"template", "asset_id", "started"}
+
+    def close(self):
+        self.db.close()
+
+    # --- Recording ---
+
+    def enter(self, port, state, template=None, step=None, now=None):
+        """Closes the port's current interval and opens one in 'state'."""
+        now = now if now is not None else time.time()
+        with self.lock:
+            self._close(port, now)
+            self.open[port] = {"state": state, "start": now, "template": template, "step": step}
+
+    def leave(self, port, now=None):
+        """The port left the bench: stop accounting for it."""
+        with self.lock:
+            self._close(port, now if now is not None else time.time())
+            self.open.pop(port, None)
+            self.runs.pop(port, None)
+
+    def start_run(self, port, template, asset_id="", now=None):
+        now = now if now is not None else time.time()
+        with self.lock:
+            self.runs[port] = {"template": template, "asset_id": asset_id, "started": now}
+        self.enter(port, "running", template, now=now)
+
+    def step(self, port, name, operator, now=None):
+        run = self.runs.get(port) or {}
+        self.enter(port, "operator" if operator else "device", run.get("template"), name, now)
+
+    def finish_run(self, port, status_text, on_bench=True, now=None):
+        """Ends the run with its final status; the port then sits idle, or failed until restarted."""
+        now = now if now is not None else time.time()
+        result = run_result(status_text)
+        with self.lock:
+            run = self.runs.pop(port, None) or {}
+            with self.db:
+                self.db.execute("INSERT INTO runs (port, template, asset_id, started, ended, result) "
+                                "VALUES (?, ?, ?, ?, ?, ?)",
+                                (port, run.get("template"), run.get("asset_id"), run.get("started"), now, result))
+        if on_bench:
+            self.enter(port, "failed" if result == "failed" else "idle", run.get("template"), now=now)
+        else:
+            self.leave(port, now)
+
+    def _close(self, port, now):
+        interval = self.open.get(port)
+        if interval is None or now <= interval["start"]:
+            return
+        with self.db:
+            self.db.execute("INSERT INTO intervals (port, state, start, end, template, step) VALUES (?, ?, ?, ?, ?, ?)",
+                            (port, interval["state"], interval["start"], now, interval["template"], interval["step"]))
+
+    # --- Reporting ---
+
+    def totals(self, since, until=None):
+        """
+        Raw sums over [since, until] (open intervals count up to now), in the
+        shape merge() and summarize() take:
+
+            {"since", "until",
+             "ports": [{"port", "idle", "running", "operator", "device", "failed"}],
+             "templates": [{"template", "runs", "succeeded", "failed", "cancelled", "run_seconds"}],
+             "steps": [{"template", "step", "state", "total", "count"}]}
+        """
+        until = until if until is not None else time.time()
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT port, state, MAX(start, ?), MIN(end, ?), template, step FROM intervals "
+                "WHERE end > ? AND start < ?", (since, until, since, until)).fetchall()
+            rows += [(port, i["state"], max(i["start"], since), until, i["template"], i["step"])
+                     for port, i in self.open.items() if i["start"] < until]
+            run_rows = self.db.execute(
+                "SELECT template, result, COUNT(*), SUM(ended - started) FROM runs "
+                "WHERE ended >= ? AND ended <= ? GROUP BY template, result", (since, until)).fetchall()
+
+        ports, steps = {}, {}
+        for port, state, start, end, template, step in rows:
+            seconds = end - start
+            if seconds <= 0:
+                continue
+            entry = ports.setdefault(port, dict({s: 0.0 for s in STATES}, port=port))
+            entry[state] += seconds
+            if step is not None:
+                key = (template, step, state)
+                total = steps.setdefault(key, {"template": template, "step": step, "state": state,
+                                               "total": 0.0, "count": 0})
+                total["total"] += seconds
+                total["count"] += 1
+
+        templates = {}
+        for template, result, count, seconds in run_rows:
+            entry = templates.setdefault(template, dict(dict.fromkeys(RUN_FIELDS, 0), template=template))
+            entry["runs"] += count
+            entry[result] = entry.get(result, 0) + count
+            entry["run_seconds"] += seconds or 0.0
+
+        return {"since": since, "until": until, "ports": list(ports.values()),
+                "templates": list(templates.values()), "steps": list(steps.values())}
+
+
+def merge(totals_list):
+    """Adds up totals() from several agents over the same window (ports should already be told apart)."""
+    merged = {"since": min((t["since"] for t in totals_list), default=0),
+              "until": max((t["until"] for t in totals_list), default=0),
+              "ports": [], "templates": [], "steps": []}
+    templates, steps = {}, {}
+    for totals in totals_list:
+        merged["ports"] += totals["ports"]
+        for entry in totals["templates"]:
+            template = entry["template"]
+            total = templates.setdefault(template, dict(dict.fromkeys(RUN_FIELDS, 0), template=template))
+            for field in RUN_FIELDS:
+                total[field] += entry.get(field, 0)
+        for entry in totals["steps"]:
+            key = (entry["template"], entry["step"], entry["state"])
+            total = steps.setdefault(key, dict(entry, total=0.0, count=0))
+            total["total"] += entry["total"]
+            total["count"] += entry["count"]
+    merged["templates"] = list(templates.values())
+    merged["steps"] = list(steps.values())
+    return merged
+
+
+def verdict(states, utilization):
+    """One line naming what limits throughput, from the bench-wide seconds per state."""
+    observed = sum(states.values()) or 1.0
+    if states["operator"] > states["device"]:
+        return ("Operator-bound: ports spent more time waiting on people than on devices "
+                f"({states['operator'] / observed:.0%} of port time). Add operators or remove manual steps.")
+    if states["failed"] > states["device"]:
+        return (f"Failure-bound: failed ports sat unattended for {states['failed'] / observed:.0%} of port time. "
+                "Fix the failing steps below or restart failed ports sooner.")
+    if utilization >= SATURATED:
+        return f"Port-bound: ports were busy {utilization:.0%} of the time. Add ports."
+    if states["idle"] > states["device"]:
+        return (f"Loading-bound: ports sat idle between runs {states['idle'] / observed:.0%} of the time, so the "
+                "bench has spare ports. Start runs sooner (more operators or gang starts), not more ports.")
+    return ("Device-bound: device steps dominate busy time. Engine speed-ups on the steps below "
+            "(pushes, tighter timeouts) pay off most.")
+
+
+def summarize(totals, top=TOP_STEPS):
+    """Adds the derived figures to totals(): utilization, throughput, step shares and a verdict."""
+    hours = max(totals["until"] - totals["since"], 1.0) / 3600
+    states = {s: sum(p[s] for p in totals["ports"]) for s in STATES}
+    busy = sum(states[s] for s in BUSY_STATES)
+    utilization = busy / (sum(states.values()) or 1.0)
+
+    ports = []
+    for entry in sorted(totals["ports"], key=lambda p: p["port"]):
+        observed = sum(entry[s] for s in STATES) or 1.0
+        ports.append(dict(entry, utilization=sum(entry[s] for s in BUSY_STATES) / observed))
+
+    templates = []
+    for entry in sorted(totals["templates"], key=lambda t: -t["runs"]):
+        templates.append(dict(entry, per_hour=entry["succeeded"] / hours,
+                              mean_run=entry["run_seconds"] / entry["runs"] if entry["runs"] else 0.0))
+
+    step_time = sum(s["total"] for s in totals["steps"]) or 1.0
+    steps = [dict(entry, mean=entry["total"] / entry["count"], share=entry["total"] / step_time)
+             for entry in sorted(totals["steps"], key=lambda s: -s["total"])[:top]]
+
+    return {
+        "since": totals["since"], "until": totals["until"],
+        "states": states, "utilization": utilization,
+        "ports": ports, "templates": templates, "steps": steps,
+        "runs": sum(t["runs"] for t in templates),
+        "succeeded": sum(t["succeeded"] for t in templates),
+        "verdict": verdict(states, utilization) if busy else "No runs in this window.",
+    }
+
+
+def format_report(report):
+    lines = [f"{report['succeeded']}/{report['runs']} runs succeeded, bench utilization {report['utilization']:.0%}",
+             report["verdict"], "", "Port time:"]
+    lines += [f"  {state:<9} {format_duration(seconds)}" for state, seconds in report["states"].items()]
+    lines += ["", "Ports:"]
+    lines += [f"  {p['port']:<16} busy {p['utilization']:4.0%}  operator {format_duration(p['operator'])}  "
+              f"failed {format_duration(p['failed'])}" for p in report["ports"]]
+    lines += ["", "Templates:"]
+    lines += [f"  {t['template'] or '-':<32} {t['succeeded']}/{t['runs']} ok, {t['per_hour']:.1f}/h, "
+              f"mean {format_duration(t['mean_run'])}" for t in report["templates"]]
+    lines += ["", "Steps by wall-clock time:"]
+    lines += [f"  {s['share']:4.0%}  {format_duration(s['total'])}  {s['template'] or '-'} / {s['step']} "
+              f"({s['state']}, {s['count']}x, mean {format_duration(s['mean'])})" for s in report["steps"]]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report where the bench's port hours went.")
+    parser.add_argument("--db", default=TIMELINE_PATH)
+    parser.add_argument("--hours", type=float, default=24, help="Window ending now")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"ERROR: No timeline at {args.db}", file=sys.stderr)
+        return 1
+    timeline = BenchTimeline(args.db)
+    try:
+        print(format_report(summarize(timeline.totals(time.time() - args.hours * 3600))))
+    finally:
+        timeline.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Bounded per-port channel between a runner's reader threads and the hub.
+
+A drop-in for the queue.Queue that run_workflow_on_port() and
+run_gang_on_ports() feed, with explicit policies per message kind:
+
+- "output"/"info": consecutive text is coalesced into one message. Once
+  more than 'max_memory' characters are waiting, further text is appended
+  to a temporary spill file and read back in order, so a device dumping
+  boot logs at a stalled consumer costs disk space, not hub memory.
+- everything else ("status", "event", "pid", "done"): always kept, in
+  order. These are small and the consumer must never miss a final status.
+
+put() never blocks: a reader thread that waited on the consumer would stop
+draining the runner's pipe, and the runner would stop reading the serial
+port while the device keeps talking.
+"""
+import codecs
+import queue
+import tempfile
+import threading
+from collections import deque
+
+OUTPUT_KINDS = ("output", "info")
+MAX_MEMORY = 256 * 1024
+SPILL_READ = 64 * 1024
+
+
+class PortChannel:
+    def __init__(self, max_memory=MAX_MEMORY, spill_dir=None):
+        self.max_memory = max_memory
+        self.spill_dir = spill_dir
+        self.items = deque()        # [kind, data]; output data is a list of parts, "spill" data a byte count
+        self.memory = 0             # characters of output held in RAM
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock)
+        self.spill = None           # temporary file, opened on the first overflow
+        self.spill_read = 0
+        self.spill_write = 0
+        self.spilled = 0            # bytes that went through the spill file, for the log
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+
+    def put(self, item, block=True, timeout=None):
+        kind, data = item
+        with self.lock:
+            if kind in OUTPUT_KINDS and data:
+                self._put_text(kind, data)
+            elif kind not in OUTPUT_KINDS:
+                self.items.append([kind, data])
+            self.ready.notify()
+
+    def put_nowait(self, item):
+        self.put(item)
+
+    def _put_text(self, kind, text):
+        last = self.items[-1] if self.items else None
+        if self.memory + len(text) > self.max_memory:
+            data = text.encode("utf-8")
+            if self.spill is None:
+                self.spill = tempfile.TemporaryFile(prefix="switchhub-spill-", dir=self.spill_dir)
+            self.spill.seek(self.spill_write)
+            self.spill.write(data)
+            self.spill_write += len(data)
+            self.spilled += len(data)
+            if last is not None and last[0] == "spill":
+                last[1] += len(data)
+            else:
+                self.items.append(["spill", len(data)])
+            return
+        self.memory += len(text)
+        if last is not None and last[0] == kind:
+            last[1].append(text)
+        else:
+            self.items.append([kind, [text]])
+
+    def get(self, block=True, timeout=None):
+        with self.ready:
+            if block and not self.ready.wait_for(lambda: self.items, timeout):
+                raise queue.Empty
+            if not self.items:
+                raise queue.Empty
+            return self._take()
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def _take(self):
+        kind, data = self.items[0]
+        if kind != "spill":
+            self.items.popleft()
+            if kind in OUTPUT_KINDS:
+                text = "".join(data)
+                self.memory -= len(text)
+                return kind, text
+            return kind, data
+
+        # Spilled text comes back a slice at a time, so reading it never needs more RAM than writing it did.
+        size = min(data, SPILL_READ)
+        self.spill.seek(self.spill_read)
+        chunk = self.spill.read(size)
+        self.spill_read += size
+        if size == data:
+            self.items.popleft()
+        else:
+            self.items[0][1] -= size
+        if self.spill_read == self.spill_write:
+            self.spill.seek(0)
+            self.spill.truncate()
+            self.spill_read = self.spill_write = 0
+        return "output", self.decoder.decode(chunk)
+
+    def qsize(self):
+        with self.lock:
+            return len(self.items)
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def close(self):
+        """Drops whatever is still waiting and deletes the spill file."""
+        with self.lock:
+            self.items.clear()
+            self.memory = 0
+            if self.spill is not None:
+                self.spill.close()
+                self.spill = None
@@ -0,0 +1,244 @@
+"""
+Central hub coordinator.
+
+Polls any number of hub agents, merges their ports and run events into one
+view and hands queued jobs to the first idle matching port.
+
+    python -m hub.coordinator --listen 0.0.0.0:8700 --agent http://bench1:8701 --agent http://bench2:8701
+"""
+import argparse
+import itertools
+import threading
+import time
+from collections import deque
+
+from hub.attention import rank
+from hub.bench_timeline import merge, summarize
+from hub.service import JsonRequestHandler, fetch_json, serve
+
+MAX_EVENTS = 50000
+
+
+class Coordinator:
+    def __init__(self, agent_urls, poll_interval=0.5):
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        # url -> {"name", "online", "ports", "next_seq"}
+        self.agents = {url.rstrip("/"): {"name": url, "online": False, "ports": [], "next_seq": 0}
+                       for url in agent_urls}
+        self.events = deque(maxlen=MAX_EVENTS)
+        self.next_seq = 0
+        self.jobs = []
+        self.job_ids = itertools.count(1)
+        self._stop = threading.Event()
+
+    # --- Aggregated view ---
+
+    def port_states(self):
+        with self.lock:
+            return [dict(port, agent=agent["name"], online=agent["online"])
+                    for agent in self.agents.values() for port in agent["ports"]]
+
+    def events_since(self, seq, limit=1000):
+        with self.lock:
+            events = [e for e in self.events if e["seq"] >= seq][:limit]
+            next_seq = events[-1]["seq"] + 1 if events else min(seq, self.next_seq)
+            return events, next_seq
+
+    def attention_queue(self):
+        """
+        Every port on every online agent that waits on the operator, most
+        urgent first. Wait times are as of the agent's last poll.
+        """
+        with self.lock:
+            entries = [dict(port["waiting"], agent=agent["name"], port=port["port"], asset_id=port["asset_id"])
+                       for agent in self.agents.values() if agent["online"]
+                       for port in agent["ports"] if port.get("waiting")]
+        return rank(entries)
+
+    def analytics(self, hours=24):
+        """
+        Utilization over the last 'hours' across every online agent, fetched
+        on demand. Ports are named "agent:port" so equal device names on
+        different hosts stay apart.
+        """
+        with self.lock:
+            urls = [(url, agent["name"]) for url, agent in self.agents.items() if agent["online"]]
+        totals_list = []
+        for url, name in urls:
+            try:
+                totals = fetch_json(f"{url}/analytics?hours={hours}")["totals"]
+            except (OSError, RuntimeError):
+                continue
+            if totals is None:
+                continue
+            for port in totals["ports"]:
+                port["port"] = f"{name}:{port['port']}"
+            totals_list.append(totals)
+        return summarize(merge(totals_list)) if totals_list else None
+
+    def job_list(self):
+        with self.lock:
+            return [dict(job, inventory=dict(job["inventory"])) for job in self.jobs]
+
+    # --- Job queue ---
+
+    def submit_job(self, template, asset_id, agent=None, port=None):
+        """Queues a run. 'agent' and 'port' optionally pin it to a device."""
+        job = {
+            "id": next(self.job_ids),
+            "template": template,
+            "asset_id": asset_id,
+            "agent": agent,
+            "port": port,
+            "state": "queued",
+            "result": None,
+            "inventory": {},
+            "submitted": time.time(),
+        }
+        with self.lock:
+            self.jobs.append(job)
+        return dict(job)
+
+    def stop(self, agent_name, port):
+        url = self._url_for(agent_name)
+        return fetch_json(f"{url}/stop", {"port": port})["stopped"]
+
+    def _url_for(self, agent_name):
+        with self.lock:
+            for url, agent in self.agents.items():
+                if agent["name"] == agent_name:
+                    return url
+        raise ValueError(f"Unknown agent '{agent_name}'")
+
+    # --- Polling loop ---
+
+    def run(self):
+        while not self._stop.is_set():
+            for url in list(self.agents):
+                self._poll_agent(url)
+            self._dispatch_jobs()
+            self._stop.wait(self.poll_interval)
+
+    def shutdown(self):
+        self._stop.set()
+
+    def _poll_agent(self, url):
+        agent = self.agents[url]
+        try:
+            ports = fetch_json(f"{url}/ports")
+            feed = fetch_json(f"{url}/events?since={agent['next_seq']}")
+        except (OSError, RuntimeError):
+            with self.lock:
+                agent["online"] = False
+            return
+
+        with self.lock:
+            agent["name"] = ports["agent"]
+            agent["online"] = True
+            agent["ports"] = ports["ports"]
+            agent["next_seq"] = feed["next"]
+            for event in feed["events"]:
+                self.events.append(dict(event, seq=self.next_seq, agent=agent["name"], agent_seq=event["seq"]))
+                self.next_seq += 1
+                if event["type"] in ("status", "inventory", "done"):
+                    self._update_job(agent["name"], event)
+
+    def _update_job(self, agent_name, event):
+        for job in self.jobs:
+            if job["state"] == "running" and job["agent"] == agent_name and job["port"] == event["port"]:
+                if event["type"] == "status":
+                    job["result"] = event["data"].get("text")
+                elif event["type"] == "inventory":
+                    job["inventory"].update(event["data"])
+                else:
+                    job["state"] = {"Fatally Failed": "failed", "Cancelled": "cancelled"}.get(job["result"], "finished")
+                return
+
+    def _dispatch_jobs(self):
+        with self.lock:
+            queued = [job for job in self.jobs if job["state"] == "queued"]
+            busy = {(job["agent"], job["port"]) for job in self.jobs if job["state"] == "running"}
+            idle = [(url, agent["name"], port["port"])
+                    for url, agent in self.agents.items() if agent["online"]
+                    for port in agent["ports"] if not port["running"]]
+
+        for job in queued:
+            for url, agent_name, port in idle:
+                if (agent_name, port) in busy:
+                    continue
+                if job["agent"] not in (None, agent_name) or job["port"] not in (None, port):
+                    continue
+                try:
+                    fetch_json(f"{url}/runs", {"port": port, "template": job["template"], "asset_id": job["asset_id"]})
+                except (OSError, RuntimeError):
+                    continue
+                with self.lock:
+                    job.update(state="running", agent=agent_name, port=port, started=time.time())
+                busy.add((agent_name, port))
+                break
+
+
+class CoordinatorRequestHandler(JsonRequestHandler):
+    routes = {
+        ("GET", "/ports"): "get_ports",
+        ("GET", "/events"): "get_events",
+        ("GET", "/attention"): "get_attention",
+        ("GET", "/analytics"): "get_analytics",
+        ("GET", "/jobs"): "get_jobs",
+        ("POST", "/jobs"): "post_job",
+        ("POST", "/stop"): "post_stop",
+    }
+
+    def get_ports(self, query, body):
+        return 200, {"ports": self.server.context.port_states()}
+
+    def get_events(self, query, body):
+        events, next_seq = self.server.context.events_since(int(query.get("since", 0)))
+        return 200, {"events": events, "next": next_seq}
+
+    def get_attention(self, query, body):
+        return 200, {"waiting": self.server.context.attention_queue()}
+
+    def get_analytics(self, query, body):
+        return 200, {"analytics": self.server.context.analytics(float(query.get("hours", 24)))}
+
+    def get_jobs(self, query, body):
+        return 200, {"jobs": self.server.context.job_list()}
+
+    def post_job(self, query, body):
+        job = self.server.context.submit_job(body["template"], body.get("asset_id", ""),
+                                             body.get("agent"), body.get("port"))
+        return 201, job
+
+    def post_stop(self, query, body):
+        try:
+            stopped = self.server.context.stop(body["agent"], body["port"])
+        except (OSError, RuntimeError) as e:
+            # The agent is down or refused; that is not the caller's mistake.
+            return 502, {"error": f"Agent '{body['agent']}': {e}"}
+        return 200, {"stopped": stopped}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate hub agents into one bench.")
+    parser.add_argument("--listen", default="0.0.0.0:8700", help="host:port to listen on")
+    parser.add_argument("--agent", action="append", default=[], help="Agent base URL (repeatable)")
+    parser.add_argument("--poll", type=float, default=0.5, help="Agent poll interval in seconds")
+    args = parser.parse_args()
+
+    coordinator = Coordinator(args.agent, args.poll)
+    threading.Thread(target=coordinator.run, daemon=True).start()
+    server = serve(CoordinatorRequestHandler, args.listen, coordinator)
+    print(f"Hub coordinator listening on {args.listen} with {len(args.agent)} agent(s)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        coordinator.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,713 @@
+"""
+Virtual console devices on ptys, for load testing the whole
+app -> runner -> serial path without hardware.
+
+Each device is a small prompt state machine (Cisco ROMMON "switch:", IOS
+exec/enable/Tcl with "+>" continuation, NX-OS, Aruba "apboot>") that echoes
+input, answers the commands the shipped templates send, boots with a
+configurable delay and output volume, and paces its output like a real
+9600 baud console. One selector loop serves every device, so 64+ instances
+run comfortably on one Linux box.
+
+    python -m hub.device_emulator --profile cisco_ios=48 --profile aruba_ap=16 --boot-delay 20 --boot-lines 400
+    python -m hub.device_emulator --profile cisco_ios=8 --fail-rate 0.05 --fail-modes hang,noise \\
+        --map-out bench.json --template workflow/templates/cisco_2960x.json
+
+The pty paths are printed, and --map-out writes a hub.fleet map for them:
+
+    python -m hub.fleet --map bench.json --jobs 64
+
+Profiles are plain data (see PROFILES), so --profile-file can load more from
+JSON. A device powers on when the emulator starts and again after "reset" or
+"reload", or after --idle-reboot seconds without input, so repeated runs
+find a freshly booted device.
+
+With --power-dir the devices also follow the outlet files of
+workflow/power_control.py's "local" stand-in PDU, so power steps switch
+them off and on; --power-out writes the matching power.json:
+
+    python -m hub.device_emulator --profile cisco_ios=4 --power-dir logs/power --power-out power.json
+"""
+import argparse
+import heapq
+import itertools
+import json
+import os
+import random
+import re
+import selectors
+import sys
+import threading
+import time
+import tty
+
+TICK = 0.01
+POWER_POLL = 0.2
+
+# A state has a prompt and a list of commands, tried in order. Each pattern
+# must match the whole input line (stripped); its groups are available to
+# "output" as {1}, {2}, ... An action may print "output" (after "delay"
+# seconds), move to state "next", run the named "boot" sequence, or "tcl"
+# (run the accumulated Tcl script against the flash listing). "default"
+# answers lines no command matched. A boot sequence prints "lines" filler
+# lines over "delay" seconds, then "banner"; with "interrupt" set it waits
+# "window" seconds for one of "keys" (\r, ^C, ESC or a serial break) and
+# goes to "on_interrupt" if one arrives, otherwise to "then".
+IOS_FLASH = ["c2960x-universalk9-mz.152-7.E2.bin", "config.text", "private-config.text", "vlan.dat",
+             "multiple-fs", "info", "crashinfo"]
+
+PROFILES = {
+    "cisco_ios": {
+        "power_on": "rommon_boot",
+        "flash": IOS_FLASH,
+        "boots": {
+            "rommon_boot": {
+                "lines": 20, "delay": 3.0,
+                "banner": "Boot Loader (C2960X-HBOOT-M) Version 15.2(7r)E, RELEASE SOFTWARE (fc2)\n"
+                          "The system has been interrupted prior to initializing the\nflash filesystem.\n",
+                "then": "rommon",
+            },
+            "ios_boot": {
+                "lines": 200, "delay": 10.0,
+                "banner": "Cisco IOS Software, C2960X Software (C2960X-UNIVERSALK9-M), Version 15.2(7)E2, RELEASE SOFTWARE (fc3)\n"
+                          "Model number                    : WS-C2960X-48FPD-L\n"
+                          "System serial number            : FOC{serial}\n\n"
+                          "Press RETURN to get started!\n\n"
+                          "         --- System Configuration Dialog ---\n\n",
+                "then": "dialog",
+            },
+        },
+        "states": {
+            "rommon": {
+                "prompt": "switch: ",
+                "commands": [
+                    {"match": r"flash_init", "delay": 1.0,
+                     "output": "Initializing Flash...\nflashfs[0]: 7 files, 1 directories\n....done Initializing Flash.\n"},
+                    {"match": r"SWITCH_IGNORE_STARTUP_CFG=1", "output": ""},
+                    {"match": r"dir flash:", "output": "Directory of flash:/\n{flash_listing}\n"},
+                    {"match": r"delete (\S+)", "output": "Are you sure you want to delete \"{1}\" (y/n)?",
+                     "next": "rommon_confirm"},
+                    {"match": r"boot", "output": "Loading \"flash:/c2960x-universalk9-mz.152-7.E2.bin\"...@@@@@@@@\n",
+                     "boot": "ios_boot"},
+                ],
+                "default": {"output": "unknown cmd: {line}\n"},
+            },
+            "rommon_confirm": {
+                "prompt": "",
+                "commands": [{"match": r"y(es)?", "output": "File deleted\n", "next": "rommon"}],
+                "default": {"output": "File not deleted\n", "next": "rommon"},
+            },
+            "dialog": {
+                "prompt": "Would you like to enter the initial configuration dialog? [yes/no]: ",
+                "commands": [{"match": r"(no?)?", "output": "\nPress RETURN to get started!\n\n", "next": "exec"}],
+                "default": {"output": "% Please answer 'yes' or 'no'.\n"},
+            },
+            "exec": {
+                "prompt": "Switch>",
+                "commands": [{"match": r"en(able)?", "next": "enable"}, {"match": r"", "output": "\n"}],
+                "default": {"output": "% Invalid input detected at '^' marker.\n"},
+            },
+            "enable": {
+                "prompt": "Switch#",
+                "commands": [
+                    {"match": r"write erase", "next": "erase_confirm",
+                     "output": "Erasing the nvram filesystem will remove all configuration files! Continue? [confirm]"},
+                    {"match": r"delete (\S+)", "output": "Delete filename [{1}]? ", "next": "delete_name"},
+                    {"match": r"tclsh", "next": "tcl"},
+                    {"match": r"conf(igure)?( t(erminal)?)?", "next": "config",
+                     "output": "Enter configuration commands, one per line.  End with CNTL/Z.\n"},
+                    {"match": r"reload", "output": "Proceed with reload? [confirm]", "next": "reload_confirm"},
+                    {"match": r"", "output": "\n"},
+                ],
+                "default": {"output": "% Invalid input detected at '^' marker.\n"},
+            },
+            "erase_confirm": {
+                "prompt": "",
+                "commands": [],
+                "default": {"output": "[OK]\nErase of nvram: complete\n", "delay": 2.0, "next": "enable"},
+            },
+            "delete_name": {
+                "prompt": "",
+                "commands": [],
+                "default": {"output": "Delete flash:/vlan.dat? [confirm]", "next": "delete_confirm"},
+            },
+            "delete_confirm": {
+                "prompt": "",
+                "commands": [],
+                "default": {"output": "\n", "next": "enable"},
+            },
+            "reload_confirm": {
+                "prompt": "",
+                "commands": [],
+                "default": {"output": "\n", "boot": "rommon_boot"},
+            },
+            "config": {
+                "prompt": "Switch(config)#",
+                "commands": [
+                    {"match": r"end|exit", "next": "enable"},
+                    {"match": r"interface \S+.*", "next": "config_if", "delay": 0.05},
+                    {"match": r"(no )?[a-z][\w-]*( .*)?", "delay": 0.05},
+                ],
+                "default": {"output": "                    ^\n% Invalid input detected at '^' marker.\n\n"},
+            },
+            "config_if": {
+                "prompt": "Switch(config-if)#",
+                "commands": [
+                    {"match": r"end", "next": "enable"},
+                    {"match": r"exit", "next": "config"},
+                    {"match": r"interface \S+.*", "delay": 0.05},
+                    {"match": r"(no )?[a-z][\w-]*( .*)?", "delay": 0.05},
+                ],
+                "default": {"output": "                    ^\n% Invalid input detected at '^' marker.\n\n"},
+            },
+            "tcl": {
+                "prompt": "Switch(tcl)#",
+                "commands": [
+                    {"match": r"tclquit", "next": "enable"},
+                    {"match": r".*\\", "tcl": "continue"},
+                    {"match": r".+", "tcl": "run"},
+                ],
+                "default": {"output": ""},
+            },
+        },
+    },
+    "nxos": {
+        "power_on": "nxos_boot",
+        "boots": {
+            "nxos_boot": {
+                "lines": 300, "delay": 15.0,
+                "banner": "Cisco Nexus Operating System (NX-OS) Software\nSystem is coming up ... Please wait ...\n",
+                "then": "login",
+            },
+        },
+        "states": {
+            "login": {"prompt": "\nswitch login: ", "commands": [{"match": r"\S+", "next": "password"}],
+                      "default": {"output": ""}},
+            "password": {"prompt": "Password: ", "commands": [], "default": {"next": "exec"}},
+            "exec": {
+                "prompt": "switch# ",
+                "commands": [
+                    {"match": r"write erase", "next": "yn",
+                     "output": "Warning: This command will erase the startup-configuration. "
+                               "Do you wish to proceed anyway? (y/n)  [n] "},
+                    {"match": r"delete (\S+)", "next": "yn",
+                     "output": "Do you want to delete \"{1}\" ? (y/n)  [y] "},
+                    {"match": r"reload", "next": "reload_yn",
+                     "output": "This command will reboot the system. (y/n)?  [n] "},
+                    {"match": r"", "output": ""},
+                ],
+                "default": {"output": "% Invalid command at '^' marker.\n"},
+            },
+            "yn": {"prompt": "", "commands": [], "default": {"output": "\n", "next": "exec"}},
+            "reload_yn": {
+                "prompt": "",
+                "commands": [{"match": r"y(es)?", "output": "\n[ 1234.5] rebooting\n", "boot": "nxos_boot"}],
+                "default": {"output": "\n", "next": "exec"},
+            },
+        },
+    },
+    "aruba_ap": {
+        "power_on": "apboot_boot",
+        "boots": {
+            "apboot_boot": {
+                "lines": 60, "delay": 4.0,
+                "banner": "APBoot 1.5.5.7 (build 68024)\nModel: AP-535\nSerial: CNK{serial}\n",
+                "interrupt": {"window": 3.0, "keys": "\r", "prompt": "Hit <Enter> to stop autoboot:  2 \n"},
+                "on_interrupt": "apboot",
+                "then": "aos_boot",
+            },
+            "aos_boot": {
+                "lines": 100, "delay": 8.0,
+                "banner": "\nUser Access Verification\n",
+                "then": "aos",
+            },
+        },
+        "states": {
+            "apboot": {
+                "prompt": "apboot> ",
+                "commands": [
+                    {"match": r"purge", "output": "Purging environment...\n"},
+                    {"match": r"save", "delay": 1.0, "output": "Saving Environment to Flash...\nwriting...done\n"},
+                    {"match": r"factory_reset", "delay": 2.0, "output": "Clearing state... done\n"},
+                    {"match": r"reset", "output": "resetting ...\n\n", "boot": "apboot_boot"},
+                    {"match": r"", "output": ""},
+                ],
+                "default": {"output": "Unknown command '{line}' - try 'help'\n"},
+            },
+            "aos": {"prompt": "User: ", "commands": [], "default": {"output": "Login incorrect\n"}},
+        },
+    },
+}
+
+
+class VirtualDevice:
+    def __init__(self, fleet, name, profile, options, rng, pty=True):
+        self.fleet = fleet
+        self.name = name
+        self.profile = profile
+        self.options = options
+        self.rng = rng
+        self.master = self.slave = None
+        self.path = name
+        if pty:
+            self.master, self.slave = os.openpty()
+            tty.setraw(self.slave)
+            self.path = os.ttyname(self.slave)
+            os.set_blocking(self.master, False)
+        self.serial = f"{rng.randrange(10 ** 7):07d}"
+        self.flash = list(profile.get("flash", []))
+        self.state = None
+        self.line = ""
+        self.typeahead = ""         # Input received while a command is still running
+        self.booting = False
+        self.tcl_script = []
+        self.interrupt = None       # (keys, target state) while an autoboot window is open
+        self.generation = 0         # bumped on reboot/hang to drop scheduled output
+        self.hung = False
+        self.powered = False
+        self.out = bytearray()
+        self.last_input = time.monotonic()
+
+    # --- Output ---
+
+    def write(self, text):
+        if not text:
+            return
+        data = text.replace("\n", "\r\n").encode("ascii", "replace")
+        if "noise" in self.options.fail_modes and self.rng.random() < self.options.fail_rate:
+            data += bytes(self.rng.randrange(32, 127) for _ in range(self.rng.randrange(4, 40)))
+        self.out += data
+
+    def flush(self, budget):
+        if not self.out:
+            return
+        chunk = self.out[:budget] if budget else self.out
+        try:
+            written = os.write(self.master, chunk)
+        except BlockingIOError:
+            written = len(chunk)    # Nobody is reading; the console drops it.
+        except OSError:
+            written = len(chunk)
+        del self.out[:written]
+
+    def later(self, delay, fn):
+        generation = self.generation
+        self.fleet.schedule(delay, lambda: generation == self.generation and self.fleet._guarded(self, fn))
+
+    # --- State machine ---
+
+    def power_on(self):
+        self.generation += 1
+        self.hung = False
+        self.powered = True
+        self.state = None
+        self.interrupt = None
+        self.line = ""
+        self.typeahead = ""
+        self.tcl_script = []
+        self.boot(self.profile["power_on"])
+
+    def power_off(self):
+        """Goes dark: pending output, timers and input are dropped until power_on()."""
+        self.generation += 1
+        self.powered = False
+        self.state = None
+        self.booting = False
+        self.interrupt = None
+        self.out.clear()
+
+    def boot(self, boot_name):
+        spec = self.profile["boots"][boot_name]
+        self.state = None
+        self.booting = True
+        self.typeahead = ""
+        lines = self.options.boot_lines if self.options.boot_lines is not None else spec.get("lines", 0)
+        delay = self.options.boot_delay if self.options.boot_delay is not None else spec.get("delay", 0)
+        delay *= self.rng.uniform(1.0, 1.0 + self.options.jitter)
+        for i in range(lines):
+            self.later(delay * i / max(lines, 1),
+                       lambda i=i: self.write(f"[{i:05d}] {'.' * self.options.line_bytes}\n"))
+        self.later(delay, lambda: self._boot_banner(spec))
+
+    def _boot_banner(self, spec):
+        self.write(self.render(spec.get("banner", ""), ()))
+        interrupt = spec.get("interrupt")
+        if interrupt:
+            self.write(interrupt.get("prompt", ""))
+            self.interrupt = (interrupt["keys"], spec["on_interrupt"])
+            generation = self.generation
+            self.fleet.schedule(interrupt["window"], lambda: self._interrupt_window_closed(generation, spec))
+        else:
+            self.enter(spec["then"])
+
+    def _interrupt_window_closed(self, generation, spec):
+        if generation == self.generation and self.interrupt:
+            self.interrupt = None
+            self.boot(spec["then"])
+
+    def enter(self, state, prompt=None):
+        self.state = state
+        self.booting = False
+        self.write(self.profile["states"][state]["prompt"] if prompt is None else prompt)
+        if self.typeahead:
+            text, self.typeahead = self.typeahead, ""
+            self.feed(text)
+
+    def render(self, text, groups, line=""):
+        listing = "\n".join(f"  {i + 2:4d}  -rwx  {1024 * (i + 1):10d}  <date>  {name}" for i, name in enumerate(self.flash))
+        values = {str(i + 1): g or "" for i, g in enumerate(groups)}
+        values.update(serial=self.serial, line=line, flash_listing=listing)
+        return re.sub(r"\{(\w+)\}", lambda m: values.get(m.group(1), m.group(0)), text)
+
+    def on_input(self, data):
+        self.last_input = time.monotonic()
+        if self.hung or not self.powered:
+            return
+        text = data.decode("ascii", "ignore")
+        if self.interrupt:
+            keys, target = self.interrupt
+            # A serial break arrives as NUL on a pty.
+            if any(c in text for c in keys + "\x00\x03\x1b"):
+                self.interrupt = None
+                self.generation += 1
+                self.write("\n")
+                self.enter(target)
+            return
+        if self.booting:
+            return      # Input during boot is lost, like on a real console.
+        if self.options.rx_fifo and len(text) > self.options.rx_fifo:
+            text = text[:self.options.rx_fifo]     # Receive FIFO overrun: the rest of the burst is lost.
+        self.feed(text)
+
+    def feed(self, text):
+        for i, char in enumerate(text):
+            if self.state is None:
+                self.typeahead += text[i:]
+                return
+            if char == "\r":
+                line, self.line = self.line, ""
+                self.write("\n")
+                self.handle(line.strip())
+            elif char in "\x08\x7f":
+                if self.line:
+                    self.line = self.line[:-1]
+                    self.write("\b \b")
+            elif char in "\x03\x1b\x00\n":
+                continue
+            else:
+                self.line += char
+                self.write(char)
+
+    def handle(self, line):
+        if ("hang" in self.options.fail_modes or "reboot" in self.options.fail_modes) \
+                and self.rng.random() < self.options.fail_rate:
+            mode = self.rng.choice([m for m in ("hang", "reboot") if m in self.options.fail_modes])
+            self.fleet.log(f"{self.name}: injecting {mode} at '{line}'")
+            if mode == "hang":
+                self.hung = True
+                self.generation += 1
+            else:
+                self.write("\n%SYS-2-WATCHDOG: Process aborted on watchdog timeout\n")
+                self.power_on()
+            return
+
+        state = self.profile["states"][self.state]
+        action, groups = state.get("default", {}), ()
+        for command in state.get("commands", []):
+            match = re.fullmatch(command["match"], line)
+            if match:
+                action, groups = command, match.groups()
+                break
+        self.state = None   # Busy until the action completes
+        self.later(action.get("delay", 0), lambda: self.act(state, action, groups, line))
+
+    def act(self, state, action, groups, line):
+        self.write(self.render(action.get("output", ""), groups, line))
+        tcl = action.get("tcl")
+        if tcl == "continue":
+            self.tcl_script.append(line)
+            self.enter(self._state_name(state), "+>")
+            return
+        if tcl == "run":
+            self.run_tcl(" ".join(self.tcl_script + [line]))
+            self.tcl_script = []
+        if action.get("boot"):
+            self.boot(action["boot"])
+            return
+        self.enter(action.get("next") or self._state_name(state))
+
+    def _state_name(self, state):
+        return next(name for name, spec in self.profile["states"].items() if spec is state)
+
+    def run_tcl(self, script):
+        """The templates' delete loop: keeps images, deletes the rest of flash."""
+        if "foreach" not in script:
+            return
+        keep = re.findall(r'string match "([^"]+)" \$fname', script)
+        kept = []
+        for name in self.flash:
+            if any(re.fullmatch(p.replace(".", r"\.").replace("*", ".*"), name) for p in keep):
+                self.write(f"Skipping possible IOS image: {name}\n")
+                kept.append(name)
+            else:
+                self.write(f"Deleting file/dir: {name}\n")
+        self.flash = kept
+
+
+class EmulatorFleet:
+    """Runs any number of VirtualDevices from one selector loop."""
+    def __init__(self, options, log=None):
+        self.options = options
+        self.log = log or (lambda message: print(message, file=sys.stderr, flush=True))
+        self.selector = selectors.DefaultSelector()
+        self.devices = []
+        self.timers = []
+        self.timer_ids = itertools.count()
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def add(self, profile_name, profile, rng):
+        device = VirtualDevice(self, f"{profile_name}-{len(self.devices)}", profile, self.options, rng)
+        self.devices.append(device)
+        self.selector.register(device.master, selectors.EVENT_READ, device)
+        return device
+
+    def schedule(self, delay, fn):
+        with self.lock:
+            heapq.heappush(self.timers, (time.monotonic() + delay, next(self.timer_ids), fn))
+
+    def run(self):
+        for device in self.devices:
+            device.power_on()
+        # Bytes per tick at the configured console speed (10 bits per byte).
+        budget = int(self.options.baud / 10 * TICK) if self.options.baud else 0
+        power_checked = 0.0
+        while not self._stop.is_set():
+            for key, _ in self.selector.select(TICK):
+                try:
+                    data = os.read(key.fd, 4096)
+                except (BlockingIOError, OSError):
+                    continue
+                if data:
+                    self._guarded(key.data, key.data.on_input, data)
+
+            now = time.monotonic()
+            while True:
+                with self.lock:
+                    if not self.timers or self.timers[0][0] > now:
+                        break
+                    _, _, fn = heapq.heappop(self.timers)
+                fn()
+            if self.options.power_dir and now - power_checked >= POWER_POLL:
+                power_checked = now
+                self._follow_power()
+            for device in self.devices:
+                device.flush(budget)
+                if self.options.idle_reboot and device.powered and now - device.last_input > self.options.idle_reboot:
+                    device.last_input = now
+                    device.power_on()
+
+    def _follow_power(self):
+        """Switches devices to match the outlet files a LocalDriver writes, one per device name."""
+        for device in self.devices:
+            try:
+                with open(os.path.join(self.options.power_dir, device.name), "r") as f:
+                    on = f.read().strip() != "off"
+            except OSError:
+                continue
+            if on != device.powered:
+                self.log(f"{device.name}: power {'on' if on else 'off'}")
+                if on:
+                    device.power_on()
+                else:
+                    device.power_off()
+
+    def _guarded(self, device, fn, *args):
+        # A profile mistake should take down one device, not the whole fleet.
+        try:
+            fn(*args)
+        except Exception as e:
+            self.log(f"{device.name}: {type(e).__name__}: {e}; device hung")
+            device.hung = True
+            device.generation += 1
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self):
+        for device in self.devices:
+            self.selector.unregister(device.master)
+            os.close(device.master)
+            os.close(device.slave)
+
+
+class ClockedFleet(EmulatorFleet):
+    """
+    Devices without ptys whose timers run on an external clock, such as the
+    engine's VirtualClock (anything with schedule(delay, fn) and now()).
+    Nothing runs by itself: time moves when the clock's owner waits.
+    """
+    def __init__(self, options, clock, log=None):
+        super().__init__(options, log)
+        self.clock = clock
+
+    def add(self, profile_name, profile, rng):
+        device = VirtualDevice(self, f"{profile_name}-{len(self.devices)}", profile, self.options, rng, pty=False)
+        self.devices.append(device)
+        return device
+
+    def schedule(self, delay, fn):
+        self.clock.schedule(delay, fn)
+
+    def run(self):
+        raise RuntimeError("A ClockedFleet is driven by its clock")
+
+    def close(self):
+        pass
+
+
+class SimulatedSerial:
+    """
+    The part of pyserial's Serial the engine uses, wired straight to a
+    ClockedFleet device. Output is released at the console baud rate as the
+    clock moves, so reads see it arrive the way a real port would.
+    """
+    def __init__(self, device, clock, baud=9600):
+        self.device = device
+        self.clock = clock
+        self.port = device.name
+        self.baudrate = 9600
+        self.pace = baud
+        self.is_open = True
+        self.rx = bytearray()
+        self.released = clock.now()
+
+    def _release(self):
+        now = self.clock.now()
+        out = self.device.out
+        if not out:
+            self.released = now
+            return
+        count = int((now - self.released) * self.pace / 10) if self.pace else len(out)
+        if count:
+            self.rx += out[:count]
+            del out[:count]
+            self.released = now
+
+    @property
+    def in_waiting(self):
+        self._release()
+        return len(self.rx)
+
+    def read(self, size=1):
+        self._release()
+        data = bytes(self.rx[:size])
+        del self.rx[:size]
+        return data
+
+    def write(self, data):
+        self.device.fleet._guarded(self.device, self.device.on_input, bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def send_break(self, duration=0.25):
+        self.write(b"\x00")
+
+    def reset_input_buffer(self):
+        self._release()
+        self.rx.clear()
+
+    def close(self):
+        self.is_open = False
+
+
+def add_device_options(parser):
+    """The device behaviour flags shared by this CLI and workflow/simulate.py."""
+    parser.add_argument("--profile-file", help="JSON file with more profiles, same shape as PROFILES")
+    parser.add_argument("--boot-delay", type=float, help="Override every boot sequence's duration (seconds)")
+    parser.add_argument("--boot-lines", type=int, help="Override every boot sequence's line count")
+    parser.add_argument("--line-bytes", type=int, default=60, help="Width of boot filler lines")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Random extra boot time, as a fraction")
+    parser.add_argument("--baud", type=int, default=9600, help="Console speed to pace output at (0 = unpaced)")
+    parser.add_argument("--rx-fifo", type=int, default=0,
+                        help="Drop input beyond this many bytes per burst, like a slow console (0 = never)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Probability of a fault per command")
+    parser.add_argument("--fail-modes", default="hang", help="Comma list of: hang, reboot, noise")
+    parser.add_argument("--idle-reboot", type=float, default=0, help="Power-cycle after this many idle seconds")
+    parser.add_argument("--seed", type=int, help="Random seed, for repeatable fault injection")
+
+
+def load_profiles(args):
+    """PROFILES plus --profile-file; also turns --fail-modes into a set."""
+    args.fail_modes = {m.strip() for m in args.fail_modes.split(",") if m.strip()}
+    profiles = dict(PROFILES)
+    if args.profile_file:
+        with open(args.profile_file, "r") as f:
+            profiles.update(json.load(f))
+    return profiles
+
+
+def parse_profiles(specs, profiles):
+    """'cisco_ios=48' -> [("cisco_ios", 48)]."""
+    counts = []
+    for spec in specs:
+        name, _, count = spec.partition("=")
+        if name not in profiles:
+            raise ValueError(f"Unknown profile '{name}' (have: {', '.join(sorted(profiles))})")
+        counts.append((name, int(count or 1)))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve virtual console devices on ptys.")
+    parser.add_argument("--profile", action="append", default=[], metavar="NAME[=COUNT]",
+                        help=f"Device profile and count (repeatable): {', '.join(PROFILES)}")
+    add_device_options(parser)
+    parser.add_argument("--map-out", help="Write a hub.fleet map for the devices to this file")
+    parser.add_argument("--template", help="Template for --map-out")
+    parser.add_argument("--power-dir", help="Follow the outlet files of a 'local' power driver in this directory")
+    parser.add_argument("--power-out", help="Write a power.json for the devices to this file (needs --power-dir)")
+    args = parser.parse_args()
+
+    try:
+        profiles = load_profiles(args)
+        counts = parse_profiles(args.profile or ["cisco_ios"], profiles)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+
+    rng = random.Random(args.seed)
+    fleet = EmulatorFleet(args)
+    for name, count in counts:
+        for _ in range(count):
+            device = fleet.add(name, profiles[name], random.Random(rng.random()))
+            print(f"{device.path}\t{device.name}", flush=True)
+
+    if args.map_out:
+        if not args.template:
+            print("ERROR: --map-out needs --template", file=sys.stderr)
+            return 2
+        with open(args.map_out, "w") as f:
+            json.dump({d.path: {"template": args.template, "asset_id": d.name} for d in fleet.devices}, f, indent=2)
+
+    if args.power_out:
+        if not args.power_dir:
+            print("ERROR: --power-out needs --power-dir", file=sys.stderr)
+            return 2
+        with open(args.power_out, "w") as f:
+            json.dump({"pdus": {"emulator": {"driver": "local", "state_dir": args.power_dir}},
+                       "ports": {d.path: {"pdu": "emulator", "outlet": d.name} for d in fleet.devices}}, f, indent=2)
+
+    try:
+        fleet.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fleet.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
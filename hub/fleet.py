@@ -0,0 +1,237 @@
+"""
+Headless fleet runner.
+
+Runs templates on many ports without the Streamlit UI, e.g. for overnight
+batches or scripted lab setups:
+
+    python -m hub.fleet --map bench.json --jobs 8 --log-dir logs/
+    python -m hub.fleet --run COM3=workflow/templates/cisco_2960x.json:ASSET123 --run COM4=...
+
+The map file is a JSON object of port -> {"template": ..., "asset_id": ...},
+with an optional "then": [template, ...] run afterwards in the same serial
+session; on the command line, chain templates with '+' (a.json+b.json:ASSET).
+JSON-lines events go to stdout (or --events FILE); a compact status table is
+redrawn on stderr when it is a terminal. Exit code is 0 when every run
+finished successfully, 1 if any failed, 2 on bad arguments or template
+errors and 130 when interrupted.
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from hub.channel import PortChannel
+from hub.log_archive import seal_log
+from hub.runs import cancel_run, run_workflow_on_port
+from hub.template_analyzer import analyze_file, format_duration, format_issue, has_errors
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+
+def load_mapping(map_path, run_args):
+    """Merges the map file and --run PORT=TEMPLATE[:ASSET] arguments."""
+    mapping = {}
+    if map_path:
+        with open(map_path, "r") as f:
+            for port, entry in json.load(f).items():
+                if isinstance(entry, str):
+                    entry = {"template": entry}
+                mapping[port] = {"template": entry["template"], "asset_id": entry.get("asset_id", ""),
+                                 "then": list(entry.get("then", []))}
+    for arg in run_args:
+        port, sep, rest = arg.partition("=")
+        if not sep or not rest:
+            raise ValueError(f"Expected PORT=TEMPLATE[:ASSET], got '{arg}'")
+        # Windows template paths can contain a drive colon, so split from the right.
+        template, sep, asset_id = rest.rpartition(":")
+        if not sep or not template.endswith(".json"):
+            template, asset_id = rest, ""
+        template, *then = template.split("+")
+        mapping[port] = {"template": template, "asset_id": asset_id, "then": then}
+
+    for port, entry in mapping.items():
+        for template in [entry["template"], *entry["then"]]:
+            if not os.path.isfile(template):
+                raise ValueError(f"{port}: template '{template}' not found")
+    return mapping
+
+
+class FleetRun:
+    def __init__(self, mapping, concurrency, events_out, log_dir=None, table=True, archive=False):
+        self.mapping = mapping
+        self.concurrency = concurrency
+        self.events_out = events_out
+        self.log_dir = log_dir
+        self.table = table
+        self.archive = archive
+        self.queues = {}
+        self.pids = {}
+        self.state = {port: {"status": "Queued", "result": None, "started": None, "ended": None, "inventory": {}}
+                      for port in mapping}
+        self.logs = {port: [] for port in mapping}
+        self.table_lines = 0
+        self.lock = threading.Lock()
+
+    def emit(self, port, event, **fields):
+        record = {"time": round(time.time(), 3), "port": port, "event": event}
+        record.update(fields)
+        self.events_out.write(json.dumps(record) + "\n")
+        self.events_out.flush()
+
+    def _run_one(self, port):
+        entry = self.mapping[port]
+        q = PortChannel()
+        with self.lock:
+            self.queues[port] = q
+        self.state[port].update(status="Starting...", started=time.time())
+        run_workflow_on_port([entry["template"], *entry["then"]], port, q)
+
+    def _drain(self, port, q):
+        output = []
+        while True:
+            try:
+                msg_type, msg = q.get_nowait()
+            except queue.Empty:
+                break
+            if msg_type in ("output", "info"):
+                output.append(msg)
+                continue
+            if output:
+                self._output(port, "".join(output))
+                output = []
+            if msg_type == "pid":
+                self.pids[port] = msg
+                self.emit(port, "started", pid=msg, **self.mapping[port])
+            elif msg_type == "status":
+                self.state[port]["status"] = msg.get("text", "")
+                self.emit(port, "status", **msg)
+            elif msg_type == "event":
+                if msg["type"] == "inventory":
+                    self.state[port]["inventory"].update(msg["data"])
+                self.emit(port, msg["type"], data=msg["data"])
+            elif msg_type == "done":
+                self._finish(port)
+                q.close()
+                with self.lock:
+                    del self.queues[port]
+                return
+        if output:
+            self._output(port, "".join(output))
+
+    def _output(self, port, text):
+        self.logs[port].append(text)
+        self.emit(port, "output", data=text)
+
+    def _finish(self, port):
+        state = self.state[port]
+        state["ended"] = time.time()
+        state["result"] = {"Fatally Failed": "failed", "Cancelled": "cancelled"}.get(state["status"], "success")
+        self.pids.pop(port, None)
+        self.emit(port, "finished", result=state["result"],
+                  duration=round(state["ended"] - state["started"], 1), inventory=state["inventory"])
+        if self.log_dir and self.archive:
+            seal_log("".join(self.logs[port]), self.log_dir, dict(
+                self.mapping[port], port=port, started=state["started"], result=state["result"],
+                inventory=state["inventory"]))
+        elif self.log_dir:
+            asset_id = self.mapping[port]["asset_id"] or "NO_ASSET_ID"
+            timestamp = datetime.now().strftime("%d.%m.%Y_%H-%M-%S")
+            with open(os.path.join(self.log_dir, f"{asset_id}_{timestamp}.log"), "w", encoding="utf-8") as f:
+                f.write("".join(self.logs[port]))
+        self.logs[port] = []
+
+    def _draw_table(self):
+        now = time.time()
+        lines = []
+        for port, state in self.state.items():
+            elapsed = ""
+            if state["started"]:
+                elapsed = f"{int((state['ended'] or now) - state['started'])}s"
+            lines.append(f"{port:<14} {self.mapping[port]['asset_id'][:14]:<14} {elapsed:>6}  {state['status'][:60]}")
+        if self.table_lines:
+            sys.stderr.write(f"\x1b[{self.table_lines}F\x1b[J")
+        sys.stderr.write("\n".join(lines) + "\n")
+        sys.stderr.flush()
+        self.table_lines = len(lines)
+
+    def stop_all(self):
+        for pid in list(self.pids.values()):
+            cancel_run(pid)
+
+    def run(self):
+        if self.log_dir:
+            os.makedirs(self.log_dir, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = [pool.submit(self._run_one, port) for port in self.mapping]
+            last_draw = 0
+            try:
+                while not all(f.done() for f in futures) or self.queues:
+                    with self.lock:
+                        active = list(self.queues.items())
+                    for port, q in active:
+                        self._drain(port, q)
+                    if self.table and time.time() - last_draw >= 1.0:
+                        self._draw_table()
+                        last_draw = time.time()
+                    time.sleep(0.1)
+            except KeyboardInterrupt:
+                self.stop_all()
+                pool.shutdown(wait=True, cancel_futures=True)
+                return EXIT_INTERRUPTED
+        if self.table:
+            self._draw_table()
+        failed = [port for port, state in self.state.items() if state["result"] != "success"]
+        return EXIT_FAILED if failed else EXIT_OK
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run workflow templates on many ports without a browser.")
+    parser.add_argument("--map", help="JSON file: {port: {template, asset_id}}")
+    parser.add_argument("--run", action="append", default=[], metavar="PORT=TEMPLATE[:ASSET]")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="Maximum concurrent runs")
+    parser.add_argument("--events", help="Write JSON-lines events here instead of stdout")
+    parser.add_argument("--log-dir", help="Save each port's full log here when it finishes")
+    parser.add_argument("--archive", action="store_true", help="Save logs as compressed .logz archives")
+    parser.add_argument("--no-table", action="store_true", help="Never draw the live status table")
+    args = parser.parse_args()
+
+    try:
+        mapping = load_mapping(args.map, args.run)
+    except (OSError, ValueError, KeyError, json.JSONDecodeError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    if not mapping or args.jobs < 1:
+        parser.print_usage(sys.stderr)
+        return EXIT_USAGE
+
+    # Check every template before the first port is opened.
+    failed = False
+    for template in sorted({t for entry in mapping.values() for t in [entry["template"], *entry["then"]]}):
+        report = analyze_file(template)
+        print(f"{template}: worst case {format_duration(report['worst_case'])}", file=sys.stderr)
+        for issue in report["issues"]:
+            print(f"  {format_issue(issue)}", file=sys.stderr)
+        failed = failed or has_errors(report)
+    if failed:
+        return EXIT_USAGE
+
+    events_out = open(args.events, "a", encoding="utf-8") if args.events else sys.stdout
+    try:
+        fleet = FleetRun(mapping, args.jobs, events_out, args.log_dir,
+                         table=sys.stderr.isatty() and not args.no_table, archive=args.archive)
+        return fleet.run()
+    finally:
+        if events_out is not sys.stdout:
+            events_out.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""
+Compressed, block-indexed archives for completed run logs.
+
+A sealed log is a sequence of independently compressed blocks followed by a
+JSON index of (raw_offset, raw_len, file_offset, comp_len) per block:
+
+    MAGIC codec | block 0 | block 1 | ... | index JSON | index_offset index_len MAGIC
+
+Readers only load the index up front. Showing the tail of a run or searching
+it decompresses one block at a time, so memory stays at a block or two no
+matter how long the boot log was. zstd frames are used when the 'zstandard'
+package is installed, zlib otherwise.
+"""
+import bisect
+import json
+import os
+import re
+import struct
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b"SWHLOGZ1"
+TRAILER = struct.Struct("<QI")
+CODEC_ZLIB = 0
+CODEC_ZSTD = 1
+BLOCK_SIZE = 64 * 1024
+ARCHIVE_EXT = ".logz"
+
+
+def _compressor(codec):
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=6).compress
+    return lambda data: zlib.compress(data, 6)
+
+
+def _decompressor(codec):
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Archive uses zstd but the 'zstandard' package is not installed")
+        return zstandard.ZstdDecompressor().decompress
+    return zlib.decompress
+
+
+class LogArchiveWriter:
+    """
+    Streams text into a new archive. Raw bytes are buffered until a full
+    block is available, so a run can be archived while it is still going.
+    """
+    def __init__(self, path, meta=None, codec=None, block_size=BLOCK_SIZE):
+        if codec is None:
+            codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+        self.path = path
+        self.meta = dict(meta or {})
+        self.codec = codec
+        self.block_size = block_size
+        self.blocks = []
+        self.raw_size = 0
+        self.pending = bytearray()
+        self.compress = _compressor(codec)
+        self.f = open(path + ".part", "wb")
+        self.f.write(MAGIC + bytes([codec]))
+
+    def write(self, text):
+        self.pending += text.encode("utf-8")
+        while len(self.pending) >= self.block_size:
+            self._flush_block(self.pending[:self.block_size])
+            del self.pending[:self.block_size]
+
+    def _flush_block(self, raw):
+        data = self.compress(bytes(raw))
+        self.blocks.append([self.raw_size, len(raw), self.f.tell(), len(data)])
+        self.f.write(data)
+        self.raw_size += len(raw)
+
+    def close(self):
+        if self.pending:
+            self._flush_block(self.pending)
+            self.pending = bytearray()
+        index = json.dumps({
+            "codec": self.codec,
+            "raw_size": self.raw_size,
+            "sealed": time.time(),
+            "meta": self.meta,
+            "blocks": self.blocks,
+        }).encode("utf-8")
+        index_offset = self.f.tell()
+        self.f.write(index)
+        self.f.write(TRAILER.pack(index_offset, len(index)) + MAGIC)
+        self.f.close()
+        # Only a fully written archive ever carries the final name.
+        os.replace(self.path + ".part", self.path)
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.f.close()
+            os.remove(self.path + ".part")
+
+
+class LogArchive:
+    """Read side. Only the index is loaded until a range is requested."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a log archive")
+            f.seek(-(TRAILER.size + len(MAGIC)), os.SEEK_END)
+            index_offset, index_len = TRAILER.unpack(f.read(TRAILER.size))
+            f.seek(index_offset)
+            index = json.loads(f.read(index_len))
+        self.codec = index["codec"]
+        self.raw_size = index["raw_size"]
+        self.meta = index["meta"]
+        self.sealed = index["sealed"]
+        self.blocks = index["blocks"]
+        self._starts = [block[0] for block in self.blocks]
+        self._decompress = _decompressor(self.codec)
+        self._cached = (None, b"")
+
+    def _block(self, i):
+        if self._cached[0] == i:
+            return self._cached[1]
+        _, _, file_offset, comp_len = self.blocks[i]
+        with open(self.path, "rb") as f:
+            f.seek(file_offset)
+            raw = self._decompress(f.read(comp_len))
+        self._cached = (i, raw)
+        return raw
+
+    def read_bytes(self, start=0, end=None):
+        end = self.raw_size if end is None else min(end, self.raw_size)
+        if start >= end:
+            return b""
+        first = bisect.bisect_right(self._starts, start) - 1
+        parts = []
+        for i in range(first, len(self.blocks)):
+            raw_offset = self.blocks[i][0]
+            if raw_offset >= end:
+                break
+            raw = self._block(i)
+            parts.append(raw[max(start - raw_offset, 0):end - raw_offset])
+        return b"".join(parts)
+
+    def read(self, start=0, end=None):
+        return self.read_bytes(start, end).decode("utf-8", errors="ignore")
+
+    def tail(self, size=BLOCK_SIZE):
+        return self.read(max(self.raw_size - size, 0))
+
+    def search(self, pattern, flags=re.IGNORECASE):
+        """
+        Yields (raw_offset, line) once for every line matching 'pattern', one
+        block at a time. The unfinished last line of each block is carried into
+        the next so matches across block boundaries are not lost.
+        """
+        regex = re.compile(pattern.encode("utf-8") if isinstance(pattern, str) else pattern, flags)
+        carry = b""
+        carry_offset = 0
+        for i in range(len(self.blocks)):
+            raw = carry + self._block(i)
+            base = carry_offset
+            cut = raw.rfind(b"\n") + 1
+            if i == len(self.blocks) - 1:
+                cut = len(raw)
+            pos = 0
+            while pos < cut:
+                match = regex.search(raw, pos, cut)
+                if match is None:
+                    break
+                line_start = raw.rfind(b"\n", 0, match.start()) + 1
+                line_end = raw.find(b"\n", match.end())
+                line_end = cut if line_end == -1 or line_end > cut else line_end
+                yield base + line_start, raw[line_start:line_end].decode("utf-8", errors="ignore")
+                # Once per line: the next search starts after this one.
+                pos = line_end + 1
+            carry = raw[cut:]
+            carry_offset = base + cut
+
+
+def archive_name(asset_id, started=None):
+    timestamp = time.strftime("%d.%m.%Y_%H-%M-%S", time.localtime(started or time.time()))
+    return f"{asset_id or 'NO_ASSET_ID'}_{timestamp}{ARCHIVE_EXT}"
+
+
+def open_archive(directory, meta=None):
+    """A LogArchiveWriter for a new archive in 'directory', named after the run, for streaming a log into."""
+    os.makedirs(directory, exist_ok=True)
+    meta = dict(meta or {})
+    path = os.path.join(directory, archive_name(meta.get("asset_id"), meta.get("started")))
+    base, n = path[:-len(ARCHIVE_EXT)], 1
+    while os.path.exists(path) or os.path.exists(path + ".part"):
+        path = f"{base}_{n}{ARCHIVE_EXT}"
+        n += 1
+    return LogArchiveWriter(path, meta)
+
+
+def seal_log(text, directory, meta=None):
+    """Writes a finished log into 'directory' as an archive and returns its path."""
+    with open_archive(directory, meta) as writer:
+        writer.write(text)
+    return writer.path
+
+
+def list_archives(directory):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(ARCHIVE_EXT))
@@ -0,0 +1,202 @@
+"""
+Full-text index over historical console logs.
+
+Completed runs (sealed .logz archives and plain downloaded .log files) are
+added incrementally to an SQLite FTS5 table, one row per log line, keyed by
+run, asset and template:
+
+    python -m hub.log_index index logs/archive ~/Downloads/*.log
+    python -m hub.log_index search "%Error deleting"
+    python -m hub.log_index search FOC1234 --asset ASSET123
+
+The trigram tokenizer is used where SQLite supports it (3.34+), so a query
+matches any substring of a line, punctuation included.
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from hub.log_archive import ARCHIVE_EXT, LogArchive
+
+INDEX_PATH = "logs/index.sqlite"
+MIN_MATCH = 3       # shortest text the trigram tokenizer can match
+LOG_NAME = re.compile(r"^(?P<asset>.*)_(?P<stamp>\d\d\.\d\d\.\d{4}_\d\d-\d\d-\d\d)(_\d+)?\.(log|logz)$")
+
+
+class LogIndex:
+    def __init__(self, path=INDEX_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id   INTEGER PRIMARY KEY,
+                source   TEXT UNIQUE NOT NULL,
+                asset_id TEXT,
+                template TEXT,
+                port     TEXT,
+                status   TEXT,
+                started  REAL,
+                indexed  REAL,
+                inventory TEXT
+            )""")
+        if "inventory" not in [row[1] for row in self.db.execute("PRAGMA table_info(runs)")]:
+            self.db.execute("ALTER TABLE runs ADD COLUMN inventory TEXT")
+        self.db.execute("CREATE INDEX IF NOT EXISTS runs_asset ON runs(asset_id)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS runs_template ON runs(template)")
+        try:
+            self.db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS lines USING fts5("
+                            "text, run_id UNINDEXED, line_no UNINDEXED, tokenize='trigram')")
+        except sqlite3.OperationalError:
+            # Older SQLite without trigram: fall back to word tokens.
+            self.db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS lines USING fts5("
+                            "text, run_id UNINDEXED, line_no UNINDEXED)")
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def is_indexed(self, source):
+        return self.db.execute("SELECT 1 FROM runs WHERE source = ?", (os.path.abspath(source),)).fetchone() is not None
+
+    def add_run(self, source, lines, asset_id=None, template=None, port=None, status=None, started=None,
+                inventory=None):
+        """Indexes one run. 'lines' may be any iterable; nothing is held in memory."""
+        source = os.path.abspath(source)
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO runs (source, asset_id, template, port, status, started, indexed, inventory) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (source, asset_id, template, port, status, started, time.time(),
+                 json.dumps(inventory) if inventory else None))
+            run_id = cursor.lastrowid
+            self.db.executemany(
+                "INSERT INTO lines (text, run_id, line_no) VALUES (?, ?, ?)",
+                ((line, run_id, n) for n, line in enumerate(lines, 1) if line.strip()))
+        return run_id
+
+    def index_file(self, path):
+        """Indexes a .logz archive or a plain .log file unless it is already in the index."""
+        if self.is_indexed(path):
+            return None
+        name = LOG_NAME.match(os.path.basename(path))
+        asset_id = name.group("asset") if name else None
+        started = time.mktime(time.strptime(name.group("stamp"), "%d.%m.%Y_%H-%M-%S")) if name else None
+
+        if path.endswith(ARCHIVE_EXT):
+            archive = LogArchive(path)
+            meta = archive.meta
+            template = meta.get("template")
+            return self.add_run(path, _archive_lines(archive),
+                                meta.get("asset_id") or asset_id, os.path.basename(template) if template else None,
+                                meta.get("port"), meta.get("status") or meta.get("result"),
+                                meta.get("started") or started, meta.get("inventory"))
+
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return self.add_run(path, (line.rstrip("\n") for line in f), asset_id, started=started)
+
+    def index_paths(self, paths):
+        """Walks files and directories; returns the number of newly indexed runs."""
+        added = 0
+        for path in paths:
+            if os.path.isdir(path):
+                files = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+            else:
+                files = [path]
+            for file_path in files:
+                if file_path.endswith((".log", ARCHIVE_EXT)) and self.index_file(file_path) is not None:
+                    added += 1
+        return added
+
+    def search(self, text, asset_id=None, template=None, limit=200, raw_query=False):
+        """
+        Returns (run row, line_no, line) tuples, newest runs first. 'text' is
+        matched as a literal phrase unless raw_query is set, in which case it
+        is passed to FTS5 MATCH as-is (AND/OR/NEAR, etc.). The trigram index
+        cannot match fewer than 3 characters, so shorter text is found with a
+        LIKE scan of every line instead.
+        """
+        sql = ("SELECT r.run_id, r.source, r.asset_id, r.template, r.port, r.status, r.started, l.line_no, l.text "
+               "FROM lines l JOIN runs r ON r.run_id = l.run_id ")
+        if not raw_query and len(text) < MIN_MATCH:
+            sql += "WHERE l.text LIKE ? ESCAPE '\\'"
+            params = ["%" + re.sub(r"([%_\\])", r"\\\1", text) + "%"]
+        else:
+            sql += "WHERE lines MATCH ?"
+            params = [text if raw_query else '"' + text.replace('"', '""') + '"']
+        if asset_id:
+            sql += " AND r.asset_id = ?"
+            params.append(asset_id)
+        if template:
+            sql += " AND r.template = ?"
+            params.append(os.path.basename(template))
+        sql += " ORDER BY r.started DESC, l.line_no LIMIT ?"
+        params.append(limit)
+        return self.db.execute(sql, params).fetchall()
+
+
+def index_in_background(path, db_path=INDEX_PATH):
+    """Indexes one finished log on a worker thread so the caller never waits on SQLite."""
+    def work():
+        index = LogIndex(db_path)
+        try:
+            index.index_file(path)
+        finally:
+            index.close()
+    thread = threading.Thread(target=work, daemon=True)
+    thread.start()
+    return thread
+
+
+def _archive_lines(archive):
+    """Yields lines from an archive a block at a time."""
+    carry = ""
+    for i in range(len(archive.blocks)):
+        start, length = archive.blocks[i][:2]
+        text = carry + archive.read(start, start + length)
+        lines = text.split("\n")
+        carry = lines.pop()
+        yield from lines
+    if carry:
+        yield carry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index and search historical console logs.")
+    parser.add_argument("--db", default=INDEX_PATH)
+    sub = parser.add_subparsers(dest="action", required=True)
+    index_parser = sub.add_parser("index", help="Add .logz/.log files or directories")
+    index_parser.add_argument("paths", nargs="+")
+    search_parser = sub.add_parser("search", help="Find runs whose log contains TEXT")
+    search_parser.add_argument("text")
+    search_parser.add_argument("--asset")
+    search_parser.add_argument("--template")
+    search_parser.add_argument("--limit", type=int, default=200)
+    search_parser.add_argument("--raw", action="store_true", help="Pass TEXT to FTS5 MATCH unquoted")
+    args = parser.parse_args()
+
+    index = LogIndex(args.db)
+    try:
+        if args.action == "index":
+            print(f"Indexed {index.index_paths(args.paths)} new run(s)")
+        else:
+            for run_id, source, asset_id, template, port, status, started, line_no, line in index.search(
+                    args.text, args.asset, args.template, args.limit, args.raw):
+                when = time.strftime("%d.%m.%Y %H:%M", time.localtime(started)) if started else "?"
+                print(f"{when}  {asset_id or '-'}  {template or '-'}  {os.path.basename(source)}:{line_no}  {line}")
+    except sqlite3.OperationalError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
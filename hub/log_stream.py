@@ -0,0 +1,153 @@
+"""
+Server-sent events endpoint for live console logs.
+
+    GET /stream?port=COM3
+
+The first event ("reset") carries the port's current log; after that only
+new output chunks are pushed as they arrive, and a new run on the port sends
+another "reset". The browser appends to a virtualized terminal (see
+terminal_html), so bandwidth and browser work follow the output rate, not the
+size of the accumulated log.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse, urlsplit
+
+from hub.service import serve
+
+STREAM_PORT = 8765
+KEEPALIVE = 15
+STREAMLIT_PORT = 8501
+
+
+class LogStreamHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _allowed_origin(self):
+        """
+        The request's Origin if it is the Streamlit app this stream serves:
+        same host as the stream, on the app's port. Pages from anywhere else
+        get no CORS header, so their browser will not let them read the logs.
+        """
+        origin = self.headers.get("Origin")
+        if not origin:
+            return None
+        try:
+            parts = urlsplit(origin)
+            host = urlsplit(f"//{self.headers.get('Host', '')}").hostname
+            origin_port = parts.port or (443 if parts.scheme == "https" else 80)
+        except ValueError:
+            return None
+        if parts.scheme in ("http", "https") and parts.hostname == host and origin_port == self.server.app_port:
+            return origin
+        return None
+
+    def _send_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        port = parse_qs(url.query).get("port", [None])[-1]
+        if url.path != "/stream" or not port:
+            self.send_error(404)
+            return
+
+        orchestrator = self.server.context
+        text, seq = orchestrator.log_snapshot(port)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        # The terminal iframe is served by Streamlit from another port.
+        origin = self._allowed_origin()
+        if origin:
+            self.send_header("Access-Control-Allow-Origin", origin)
+            self.send_header("Vary", "Origin")
+        self.end_headers()
+
+        try:
+            self._send_event("reset", text)
+            while True:
+                events, seq = orchestrator.wait_events(seq, KEEPALIVE, port)
+                if not events:
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    continue
+                for event in events:
+                    if event["type"] == "output":
+                        self._send_event("chunk", event["data"])
+                    elif event["type"] == "started":
+                        self._send_event("reset", "")
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+            return
+
+
+def start_log_stream(orchestrator, listen=f"0.0.0.0:{STREAM_PORT}", app_port=STREAMLIT_PORT):
+    """
+    Serves /stream on a daemon thread for the Streamlit app on 'app_port'.
+    Returns the server, or None if the port is taken.
+    """
+    try:
+        server = serve(LogStreamHandler, listen, orchestrator)
+    except OSError:
+        return None
+    server.app_port = app_port
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def terminal_html(stream_port, com_port, height=400):
+    """
+    A self-contained terminal view for st.components.v1.html. It keeps the
+    log as an array of lines and only renders the rows currently scrolled
+    into view; it follows the tail unless the user scrolls up. The markup
+    depends only on the port, so Streamlit reruns never reload it and the
+    EventSource stays connected.
+    """
+    return f"""
+<div id="term" style="height:{height - 2}px;overflow:auto;position:relative;background:#0e1117;color:#fafafa;
+     border:1px solid #262730;border-radius:0.5rem;font:13px/17px monospace;">
+  <div id="spacer"></div>
+  <pre id="rows" style="position:absolute;left:0;top:0;margin:0;padding:0 8px;white-space:pre;"></pre>
+</div>
+<script>
+(function() {{
+  const LINE = 17, MAX_LINES = 100000;
+  const term = document.getElementById("term");
+  const spacer = document.getElementById("spacer");
+  const rows = document.getElementById("rows");
+  let lines = [""], follow = true, scheduled = false;
+
+  function render() {{
+    scheduled = false;
+    spacer.style.height = (lines.length * LINE) + "px";
+    if (follow) term.scrollTop = term.scrollHeight;
+    const first = Math.floor(term.scrollTop / LINE);
+    const count = Math.ceil(term.clientHeight / LINE) + 2;
+    rows.style.top = (first * LINE) + "px";
+    rows.textContent = lines.slice(first, first + count).join("\\n");
+  }}
+  function schedule() {{
+    if (!scheduled) {{ scheduled = true; requestAnimationFrame(render); }}
+  }}
+  function append(text) {{
+    const parts = text.split("\\n");
+    lines[lines.length - 1] += parts[0];
+    for (let i = 1; i < parts.length; i++) lines.push(parts[i]);
+    if (lines.length > MAX_LINES) lines.splice(0, lines.length - MAX_LINES);
+    schedule();
+  }}
+  term.addEventListener("scroll", function() {{
+    follow = term.scrollTop + term.clientHeight >= term.scrollHeight - LINE;
+    schedule();
+  }});
+
+  const host = window.parent.location.hostname;
+  const source = new EventSource("http://" + host + ":{stream_port}/stream?port=" + encodeURIComponent({json.dumps(com_port)}));
+  source.addEventListener("reset", function(e) {{ lines = [""]; follow = true; append(JSON.parse(e.data)); }});
+  source.addEventListener("chunk", function(e) {{ append(JSON.parse(e.data)); }});
+}})();
+</script>
+"""
@@ -0,0 +1,488 @@
+"""
+Long-lived orchestration service.
+
+Owns everything that has to outlive a browser tab: the bench (prepared
+ports), running workflows and ident blinks, each port's log, status and
+inventory, and one event stream. app.py only reads snapshots and calls the
+start/stop/ident methods, so reloading the page never orphans a run and any
+number of viewers share one set of runner pipes.
+"""
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+
+import serial
+
+from hub.attention import live, rank, waiting_entry
+from hub.bench_timeline import TIMELINE_PATH, BenchTimeline, summarize
+from hub.channel import PortChannel
+from hub.log_archive import LogArchive, open_archive
+from hub.log_index import index_in_background
+from hub.port_lease import LEASES, PortBusyError
+from hub.port_state import PortState
+from hub.runs import ROOT_DIR, cancel_run, get_com_ports, get_workflow_templates, run_gang_on_ports, run_workflow_on_port
+from hub.template_analyzer import analyze_file, format_issue, has_errors
+
+BAUD_RATE = 9600
+ARCHIVE_DIR = "logs/archive"
+MAX_EVENTS = 20000
+MAX_CHUNK = 4096        # characters merged into one "output" event, beyond one coalesced message
+LOG_TAIL = 64 * 1024    # characters of a running log kept in memory; the rest is only in its archive
+IDENT_DURATION = 20
+
+
+class Orchestrator:
+    def __init__(self, fixed_ports=None, template_dir=None, archive_dir=ARCHIVE_DIR, timeline_path=TIMELINE_PATH):
+        self.fixed_ports = fixed_ports
+        self.template_dir = template_dir or os.path.join(ROOT_DIR, "workflow", "templates")
+        self.archive_dir = archive_dir
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self.events = deque(maxlen=MAX_EVENTS)
+        self.next_seq = 0
+        self.bench = list(fixed_ports or [])
+        self.records = {port: PortState(port) for port in self.bench}
+        self.reports = {}   # template path -> (mtime, analyzer report)
+        self.timeline = BenchTimeline(timeline_path) if timeline_path else None
+        for port in self.bench:
+            self._timeline("enter", port, "idle")
+
+    # --- Registry ---
+
+    def list_ports(self):
+        # Pty-simulated ports never show up in list_ports, so they can be pinned.
+        return list(self.fixed_ports) if self.fixed_ports else get_com_ports()
+
+    def list_templates(self):
+        return sorted(os.path.basename(p) for p in get_workflow_templates(self.template_dir))
+
+    def resolve_template(self, template):
+        """Accepts a template path or a bare file name from the template directory."""
+        if os.path.isfile(template):
+            return template
+        if template in self.list_templates():
+            return os.path.join(self.template_dir, template)
+        raise ValueError(f"Unknown template '{template}'")
+
+    def template_report(self, template):
+        """The analyzer report for a template, re-checked whenever the file changes."""
+        path = self.resolve_template(template)
+        mtime = os.path.getmtime(path)
+        with self.lock:
+            cached = self.reports.get(path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+        report = analyze_file(path)
+        with self.lock:
+            self.reports[path] = (mtime, report)
+        return report
+
+    def prepare(self, ports):
+        """
+        Sets the bench shown to every viewer. Ports that are still busy keep
+        their record; everything else starts fresh.
+        """
+        with self.lock:
+            # Busy ports dropped from the bench stay registered until they finish.
+            records = {port: record for port, record in self.records.items() if record.busy}
+            for port in ports:
+                record = self.records.get(port)
+                if record is None:
+                    record = PortState(port)
+                elif not record.busy:
+                    record.reset()
+                records[port] = record
+            for port in set(self.records) - set(records):
+                self._timeline("leave", port)
+            for port in ports:
+                if not records[port].busy:
+                    self._timeline("enter", port, "idle")
+            self.bench = list(ports)
+            self.records = records
+            self._post_event(None, "bench", list(ports))
+
+    def snapshot(self, port):
+        """
+        A port's state as a dict that is safe to read without the lock. It is
+        shared with other callers until the port changes: do not modify it.
+        """
+        with self.lock:
+            return self.records[port].view()
+
+    def snapshots(self, ports):
+        """snapshot() for several ports under one lock, as {port: snapshot}."""
+        with self.lock:
+            return {port: self.records[port].view() for port in ports}
+
+    def versions(self, ports=None):
+        """Each port's change counter; compare with a later call to find the ports that changed."""
+        with self.lock:
+            return {port: self.records[port].version for port in (ports or self.records)}
+
+    def wait_changed(self, versions, timeout):
+        """
+        Blocks until one of the ports in 'versions' changed or a run or ident
+        thread on them ended, or 'timeout' seconds passed. Returns the ports
+        that changed.
+        """
+        with self.changed:
+            busy = {port for port in versions if port in self.records and self.records[port].busy}
+
+            def dirty():
+                return [port for port, version in versions.items()
+                        if port in self.records
+                        and (self.records[port].version != version
+                             or (port in busy and not self.records[port].busy))]
+            # Thread ends post no event, so poll for them a few times a second.
+            deadline = time.time() + timeout
+            while not dirty() and time.time() < deadline:
+                self.changed.wait(min(0.25, max(deadline - time.time(), 0)))
+            return dirty()
+
+    def port_states(self):
+        with self.lock:
+            states = []
+            for port in self.bench or self.list_ports():
+                record = self.records.get(port) or PortState(port)
+                states.append({
+                    "port": port,
+                    "running": record.running,
+                    "template": record.template,
+                    "asset_id": record.asset_id,
+                    "status": record.status,
+                    "inventory": dict(record.inventory),
+                    "waiting": live(record.waiting) if record.waiting else None,
+                })
+            return states
+
+    def attention_queue(self):
+        """Ports waiting on the operator, most urgent first (see hub.attention)."""
+        with self.lock:
+            entries = [dict(live(record.waiting), port=port, asset_id=record.asset_id)
+                       for port, record in self.records.items() if record.waiting]
+        return rank(entries)
+
+    def utilization_totals(self, hours=24):
+        """Raw timeline sums over the last 'hours', for a coordinator to merge; None without a timeline."""
+        if self.timeline is None:
+            return None
+        return self.timeline.totals(time.time() - hours * 3600)
+
+    def analytics(self, hours=24):
+        """Bench utilization and bottlenecks over the last 'hours' (see hub.bench_timeline)."""
+        totals = self.utilization_totals(hours)
+        return summarize(totals) if totals is not None else None
+
+    def is_active(self):
+        with self.lock:
+            return any(record.busy for record in self.records.values())
+
+    def _timeline(self, method, *args):
+        """Records a port state change; the bench keeps working if the timeline database does not."""
+        if self.timeline is None:
+            return
+        try:
+            getattr(self.timeline, method)(*args)
+        except Exception as e:
+            print(f"[HUB] Bench timeline unavailable: {e}", file=sys.stderr, flush=True)
+            self.timeline = None
+
+    def _record(self, port):
+        record = self.records.get(port)
+        if record is None:
+            if port not in self.list_ports():
+                raise ValueError(f"Unknown port '{port}'")
+            record = self.records[port] = PortState(port)
+        return record
+
+    # --- Event fan-out ---
+
+    def _post_event(self, port, msg_type, msg):
+        with self.lock:
+            self.events.append({
+                "seq": self.next_seq,
+                "time": time.time(),
+                "port": port,
+                "type": msg_type,
+                "data": msg,
+            })
+            self.next_seq += 1
+            if port in self.records:
+                self.records[port].touch()
+            self.changed.notify_all()
+
+    def events_since(self, seq, limit=1000, port=None):
+        """
+        Returns (events, next_seq) for up to 'limit' events starting at 'seq',
+        optionally only those for one port. Sequence numbers are contiguous,
+        so the start is found by offset instead of scanning the whole buffer.
+        """
+        with self.lock:
+            if not self.events:
+                return [], min(seq, self.next_seq)
+            first = self.events[0]["seq"]
+            start = max(seq - first, 0)
+            stop = min(start + limit, len(self.events))
+            events = [self.events[i] for i in range(start, stop)]
+            next_seq = first + stop if stop > start else min(seq, self.next_seq)
+            if port is not None:
+                events = [e for e in events if e["port"] == port]
+            return events, next_seq
+
+    def wait_events(self, seq, timeout, port=None):
+        """
+        Like events_since(), but blocks up to 'timeout' seconds for something
+        new, for 'port' only if given: other ports' events move 'seq' along
+        without waking the caller.
+        """
+        deadline = time.time() + timeout
+        with self.changed:
+            while True:
+                events, seq = self.events_since(seq, port=port)
+                remaining = deadline - time.time()
+                if events or remaining <= 0:
+                    return events, seq
+                self.changed.wait_for(lambda: self.next_seq > seq, remaining)
+
+    def log_snapshot(self, port):
+        """
+        The port's current log text and the sequence number to stream from, so
+        a new viewer can start with the backlog and then follow live chunks.
+        A running log is represented by its in-memory tail, a sealed one by
+        the tail of its archive.
+        """
+        with self.lock:
+            record = self.records.get(port)
+            if record is None:
+                return "", self.next_seq
+            text, archive_path, seq = record.log, record.archive, self.next_seq
+        if archive_path:
+            text = LogArchive(archive_path).tail()
+        return text, seq
+
+    # --- Runs ---
+
+    def _checked_template(self, template):
+        """Resolves and analyzes a template; returns (path, warnings for the log)."""
+        template_path = self.resolve_template(template)
+        report = self.template_report(template_path)
+        if has_errors(report):
+            raise ValueError(f"Template '{template}' has errors: "
+                             + "; ".join(format_issue(i) for i in report["issues"] if i["level"] == "error"))
+        return template_path, "".join(f"[HUB] Template {format_issue(i)}\n" for i in report["issues"])
+
+    def start_run(self, port, template, asset_id, then=()):
+        """'then' lists templates to run after 'template' on the same open port."""
+        template_paths, warnings = [], ""
+        for name in [template, *then]:
+            template_path, template_warnings = self._checked_template(name)
+            template_paths.append(template_path)
+            warnings += template_warnings
+        with self.lock:
+            record = self._record(port)
+            if record.busy:
+                return False
+            q = PortChannel()
+            thread = threading.Thread(target=run_workflow_on_port, args=(template_paths, port, q), daemon=True)
+            record.reset(template=template, chain=list(then), asset_id=asset_id, log="", thread=thread,
+                         status={"text": "Starting...", "interactive": False, "completed": False},
+                         started=time.time())
+            record.writer = self._open_writer(record)
+            thread.start()
+        self._timeline("start_run", port, "+".join([template, *then]), asset_id)
+
+        threading.Thread(target=self._pump, args=(port, record, q), daemon=True).start()
+        self._post_event(port, "started", {"template": template, "chain": list(then), "asset_id": asset_id})
+        if warnings:
+            self._append_log(port, record, warnings)
+        return True
+
+    def start_gang(self, ports, template, asset_ids):
+        """
+        Runs one template on several ports in lockstep (see workflow/gang_runner.py).
+        'asset_ids' maps each port to its asset ID. Each port still gets its
+        own record, log, archive and pump; they share one runner process, so
+        stopping any of them stops the whole gang.
+        """
+        if len(ports) < 2 or len(set(ports)) != len(ports):
+            raise ValueError("A gang needs two or more distinct ports")
+        template_path, warnings = self._checked_template(template)
+        with self.lock:
+            records = [self._record(port) for port in ports]
+            if any(record.busy for record in records):
+                return False
+            queues = {}
+            for port, record in zip(ports, records):
+                q = queues[port] = PortChannel()
+                # The pump finishes with the port, while the shared runner may still drive the others.
+                pump = threading.Thread(target=self._pump, args=(port, record, q), daemon=True)
+                record.reset(template=template, asset_id=asset_ids.get(port, ""), log="",
+                             thread=pump, gang=list(ports),
+                             status={"text": "Starting...", "interactive": False, "completed": False},
+                             started=time.time())
+                record.writer = self._open_writer(record)
+                self._timeline("start_run", port, template, record.asset_id)
+                pump.start()
+            threading.Thread(target=run_gang_on_ports, args=(template_path, list(ports), queues), daemon=True).start()
+
+        for port, record in zip(ports, records):
+            self._post_event(port, "started", {"template": template, "asset_id": record.asset_id, "gang": list(ports)})
+            if warnings:
+                self._append_log(port, record, warnings)
+        return True
+
+    def stop_run(self, port):
+        with self.lock:
+            record = self.records.get(port)
+            pid = record.pid if record else None
+        if not pid:
+            return False
+        return cancel_run(pid)
+
+    def _pump(self, port, record, q):
+        """
+        Moves runner messages into the port's record and the event stream.
+        The runner's stderr arrives a character at a time; the channel
+        coalesces what piles up and consecutive output is merged here too, so
+        the log and the event stream grow in chunks.
+        """
+        pending = None
+        while True:
+            msg_type, msg = pending or q.get()
+            pending = None
+            if msg_type in ("output", "info"):
+                parts = [msg]
+                size = len(msg)
+                while size < MAX_CHUNK:
+                    try:
+                        item = q.get(timeout=0.05)
+                    except queue.Empty:
+                        break
+                    if item[0] not in ("output", "info"):
+                        pending = item
+                        break
+                    parts.append(item[1])
+                    size += len(item[1])
+                self._append_log(port, record, "".join(parts))
+                continue
+
+            if msg_type == "pid":
+                with self.lock:
+                    record.update(pid=msg)
+            elif msg_type == "status":
+                with self.lock:
+                    record.status = msg
+                self._post_event(port, "status", msg)
+            elif msg_type == "event":
+                if msg["type"] == "inventory":
+                    with self.lock:
+                        record.inventory.update(msg["data"])
+                elif msg["type"] == "step":
+                    with self.lock:
+                        record.waiting = waiting_entry(msg["data"])
+                    self._timeline("step", port, msg["data"].get("name"), msg["data"].get("operator"))
+                elif msg["type"] == "console":
+                    with self.lock:
+                        record.console = msg["data"]
+                self._post_event(port, msg["type"], msg["data"])
+            elif msg_type == "done":
+                with self.lock:
+                    record.waiting = record.console = None
+                if q.spilled:
+                    self._append_log(port, record, f"[HUB] The hub fell behind this port; "
+                                                   f"{q.spilled // 1024} KiB of output was buffered on disk\n")
+                q.close()
+                with self.lock:
+                    on_bench = port in self.bench
+                self._timeline("finish_run", port, record.status.get("text"), on_bench)
+                self._seal(port, record)
+                self._post_event(port, "done", None)
+                return
+
+    def _open_writer(self, record):
+        """
+        The archive a new run's log streams into, or None without an archive
+        directory. A run whose archive cannot be created still runs; only its
+        tail is kept.
+        """
+        if not self.archive_dir:
+            return None
+        try:
+            return open_archive(self.archive_dir, {"asset_id": record.asset_id, "started": record.started})
+        except OSError as e:
+            print(f"[HUB] Cannot archive the log of {record.port}: {e}", file=sys.stderr, flush=True)
+            return None
+
+    def _append_log(self, port, record, chunk):
+        """
+        Streams a chunk into the run's archive, keeps the newest LOG_TAIL
+        characters in memory for viewers, and posts the chunk, all in one lock
+        hold: a viewer's log_snapshot() has either both or neither and never
+        sees the chunk twice.
+        """
+        with self.lock:
+            if record.writer is not None:
+                record.writer.write(chunk)
+            record.log = (record.log + chunk)[-LOG_TAIL:]
+            self._post_event(port, "output", chunk)
+
+    def _seal(self, port, record):
+        """Closes the finished run's archive and drops the in-memory tail."""
+        with self.lock:
+            record.pid = None
+            writer, record.writer = record.writer, None
+            meta = {
+                "port": port,
+                "asset_id": record.asset_id,
+                "template": record.template,
+                "chain": list(record.chain),
+                "status": record.status.get("text"),
+                "inventory": dict(record.inventory),
+                "started": record.started,
+            }
+        if writer is None:
+            return
+        writer.meta.update(meta)
+        archive_path = writer.close()
+        with self.lock:
+            record.update(archive=archive_path, log="")
+        index_in_background(archive_path)
+
+    # --- Ident ---
+
+    def start_ident(self, port):
+        with self.lock:
+            record = self._record(port)
+            if record.busy:
+                return False
+            record.ident_thread = threading.Thread(target=self._ident, args=(port, record), daemon=True)
+            record.ident_thread.start()
+        return True
+
+    def _set_ident(self, port, record, level, message):
+        with self.lock:
+            record.ident = (level, message) if level else None
+        self._post_event(port, "ident", {"level": level, "message": message})
+
+    def _ident(self, port, record):
+        try:
+            self._set_ident(port, record, "info", f"Sending {IDENT_DURATION}-sec blink to {port}")
+            with LEASES.lease(port, "ident"), serial.Serial(port, BAUD_RATE, timeout=1) as ser:
+                end_time = time.time() + IDENT_DURATION
+                while time.time() < end_time:
+                    ser.write(b"IDENTIFYING_PORT\r\n")
+                    ser.flush()
+                    time.sleep(0.05)
+            self._set_ident(port, record, "success", f"Ident for {port} complete.")
+            time.sleep(2)
+        except PortBusyError as e:
+            self._set_ident(port, record, "error", str(e))
+            time.sleep(3)
+        except Exception as e:
+            self._set_ident(port, record, "error", f"Could not open {port}. Is it in use? Error: {e}")
+            time.sleep(3)
+        finally:
+            self._set_ident(port, record, None, None)
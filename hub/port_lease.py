@@ -0,0 +1,56 @@
+import threading
+import time
+
+
+class PortBusyError(RuntimeError):
+    pass
+
+
+class PortLeases:
+    """
+    Process-wide record of who currently owns each serial port. Ident and
+    workflow runs both take a lease before touching a device, so two of them
+    can never contend for the same handle, even from different browser tabs.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.leases = {}  # port -> (owner, since)
+
+    def acquire(self, port, owner):
+        with self.lock:
+            current = self.leases.get(port)
+            if current is not None:
+                raise PortBusyError(f"{port} is in use by {current[0]}")
+            self.leases[port] = (owner, time.time())
+
+    def release(self, port, owner):
+        with self.lock:
+            current = self.leases.get(port)
+            if current is not None and current[0] == owner:
+                del self.leases[port]
+
+    def owner(self, port):
+        with self.lock:
+            current = self.leases.get(port)
+            return current[0] if current else None
+
+    def lease(self, port, owner):
+        """Context manager form: 'with LEASES.lease(port, "ident"): ...'."""
+        return _Lease(self, port, owner)
+
+
+class _Lease:
+    def __init__(self, leases, port, owner):
+        self.leases = leases
+        self.port = port
+        self.owner = owner
+
+    def __enter__(self):
+        self.leases.acquire(self.port, self.owner)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.leases.release(self.port, self.owner)
+
+
+LEASES = PortLeases()
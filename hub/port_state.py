@@ -0,0 +1,84 @@
+"""
+Per-port state kept by the orchestrator.
+
+One PortState per port holds everything about it in one place: the run
+(template, chain, asset ID, runner pid and thread), the ident blink, the log
+tail and the archive the full log streams into, status, inventory and the
+operator wait. Every change bumps
+'version', so a viewer that remembers the versions it last drew can tell
+which ports changed without comparing their contents, and view() only
+rebuilds a port's snapshot when the port has changed since the last one.
+"""
+
+IDLE_STATUS = {"text": "Idle", "interactive": False, "completed": False}
+
+
+class PortState:
+    __slots__ = ("port", "template", "chain", "asset_id", "pid", "status", "inventory", "log", "archive",
+                 "writer", "thread", "ident", "ident_thread", "gang", "waiting", "console", "started", "version",
+                 "_view", "_view_key")
+
+    # Fields a snapshot carries; the thread handles stay private to the orchestrator.
+    VIEW_FIELDS = ("port", "template", "chain", "asset_id", "pid", "status", "inventory", "log", "archive",
+                   "ident", "gang", "waiting", "console", "started", "version")
+
+    def __init__(self, port):
+        self.port = port
+        self.version = 0
+        self._view = self._view_key = None
+        self.reset()
+
+    def reset(self, **fields):
+        """Starts the port over (a new bench or a new run), keeping its version counter going."""
+        self.template = None
+        self.chain = []             # templates run after "template" in the same session
+        self.asset_id = ""
+        self.pid = None
+        self.status = IDLE_STATUS
+        self.inventory = {}
+        self.log = "Waiting to start..."   # the newest LOG_TAIL characters; the full log is in 'writer'
+        self.archive = None
+        self.writer = None          # LogArchiveWriter the running log streams into
+        self.thread = None
+        self.ident = None           # (level, message) while an ident blink is shown
+        self.ident_thread = None
+        self.gang = None            # ports run in lockstep with this one
+        self.waiting = None         # hub.attention entry while a step waits on the operator
+        self.console = None         # the runner's console mirror endpoints (workflow/console_tap.py)
+        self.started = None
+        self.update(**fields)
+
+    def update(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.touch()
+
+    def touch(self):
+        """Marks the port dirty after an in-place change (log appended, inventory merged)."""
+        self.version += 1
+
+    @property
+    def running(self):
+        return bool(self.thread and self.thread.is_alive())
+
+    @property
+    def ident_running(self):
+        return bool(self.ident_thread and self.ident_thread.is_alive())
+
+    @property
+    def busy(self):
+        return self.running or self.ident_running
+
+    def view(self):
+        """
+        A snapshot dict of the port. It is rebuilt only when the port changed
+        (or a thread ended) since the last call and is shared between
+        callers, so treat it as read-only. Call with the orchestrator lock held.
+        """
+        key = (self.version, self.running, self.ident_running)
+        if self._view_key != key:
+            view = {name: getattr(self, name) for name in self.VIEW_FIELDS}
+            view["inventory"] = dict(self.inventory)
+            view["running"], view["ident_running"] = key[1], key[2]
+            self._view, self._view_key = view, key
+        return self._view
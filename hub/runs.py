@@ -0,0 +1,245 @@
+import glob
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import serial.tools.list_ports
+
+from hub.port_lease import LEASES, PortBusyError
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNNER_PATH = os.path.join(ROOT_DIR, "workflow", "workflow_runner.py")
+GANG_RUNNER_PATH = os.path.join(ROOT_DIR, "workflow", "gang_runner.py")
+STATUS_FLAG = "STATUS_FLAG::"
+EVENT_FLAG = "EVENT_FLAG::"
+GANG_FLAG = "GANG_FLAG::"
+CANCEL_COMMAND = "CANCEL\n"
+CANCEL_EXIT_CODE = 130
+CANCEL_GRACE = 3.0
+
+# pid -> Popen of every runner still alive, so a run can be cancelled by pid.
+_processes = {}
+_processes_lock = threading.Lock()
+
+def get_com_ports():
+    com_ports = serial.tools.list_ports.comports()
+    return [com_port.device for com_port in com_ports]
+
+def get_workflow_templates(workflow_dir="workflow/templates"):
+    return glob.glob(f"{workflow_dir}/*.json")
+
+def cancel_run(pid):
+    """
+    Asks a runner to stop at its next safe point. The runner closes the port
+    and posts its final status itself; it is only terminated if it has not
+    exited after CANCEL_GRACE seconds. Works the same on Windows, where a
+    signal would kill the process without giving it a chance to clean up.
+    """
+    with _processes_lock:
+        process = _processes.get(pid)
+    if process is None or process.poll() is not None:
+        return False
+    try:
+        process.stdin.write(CANCEL_COMMAND)
+        process.stdin.flush()
+    except (OSError, ValueError):
+        process.terminate()
+        return True
+
+    def enforce():
+        try:
+            process.wait(CANCEL_GRACE)
+        except subprocess.TimeoutExpired:
+            process.terminate()
+    threading.Thread(target=enforce, daemon=True).start()
+    return True
+
+def _put_result(q, com_port, return_code):
+    if return_code == 0:
+        q.put(("info", f"\n--- FINISHED {com_port}: SUCCESS ---"))
+        q.put(("status", {"text": "Successfully Finished", "completed": True}))
+    elif return_code == CANCEL_EXIT_CODE:
+        q.put(("info", f"\n--- FINISHED {com_port}: CANCELLED ---"))
+        q.put(("status", {"text": "Cancelled", "interactive": False}))
+    else:
+        q.put(("info", f"\n--- FINISHED {com_port}: FAIL (Code {return_code}) ---"))
+        q.put(("status", {"text": "Fatally Failed", "interactive": True}))
+
+def run_workflow_on_port(workflow_path, com_port, q):
+    """'workflow_path' may be a list of templates, run back to back on one open port."""
+    workflow_paths = [workflow_path] if isinstance(workflow_path, str) else list(workflow_path)
+    try:
+        LEASES.acquire(com_port, "workflow")
+    except PortBusyError as e:
+        q.put(("info", f"\n!!!---!!! {e} !!!---!!!"))
+        q.put(("status", {"text": "Fatally Failed", "interactive": True}))
+        q.put(("done", None))
+        return
+
+    process = None
+    try:
+        q.put(("info", f"--- Running {' + '.join(workflow_paths)} on {com_port} ---\n"))
+
+        process = subprocess.Popen(
+            [sys.executable, "-u", RUNNER_PATH, *workflow_paths, com_port],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            errors="ignore"
+        )
+        with _processes_lock:
+            _processes[process.pid] = process
+        q.put(("pid", process.pid))
+
+        def read_stderr():
+            # Read character-by-character, not line-by-line
+            # This fixes the bug where raw output was not appearing
+            for char in iter(lambda: process.stderr.read(1), ''):
+                q.put(("output", char))
+
+        stderr_thread = threading.Thread(target=read_stderr)
+        stderr_thread.start()
+        for line in iter(process.stdout.readline, ''):
+            if line.startswith(STATUS_FLAG):
+                payload_str = line.replace(STATUS_FLAG, "").strip()
+                try:
+                    # --- THIS IS THE NEW LOGIC ---
+                    # Parse the JSON payload from the runner
+                    status_data = json.loads(payload_str)
+                    q.put(("status", status_data))
+                except json.JSONDecodeError:
+                    # Fallback for simple strings
+                    q.put(("status", {"text": payload_str, "interactive": False}))
+            elif line.startswith(EVENT_FLAG):
+                try:
+                    q.put(("event", json.loads(line[len(EVENT_FLAG):])))
+                except json.JSONDecodeError:
+                    q.put(("output", f"[STDOUT_UNEXPECTED] {line}"))
+            else:
+                q.put(("output", f"[STDOUT_UNEXPECTED] {line}"))
+
+        process.stdout.close()
+        process.stderr.close()
+        stderr_thread.join()
+        _put_result(q, com_port, process.wait())
+
+    except Exception as e:
+        q.put(("info", f"\n!!!---!!! CRITICAL ERROR on {com_port} !!!---!!!\n{e}"))
+        q.put(("status", {"text": "Fatally Failed", "interactive": True}))
+    finally:
+        if process is not None:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            with _processes_lock:
+                _processes.pop(process.pid, None)
+            if process.stdin:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+        # The runner has exited, so the OS handle is closed before anyone else may take the port.
+        LEASES.release(com_port, "workflow")
+        q.put(("done", None))
+
+def run_gang_on_ports(workflow_path, com_ports, queues):
+    """
+    Runs one template on several ports in lockstep through a single gang
+    runner process. 'queues' maps each port to the queue that
+    run_workflow_on_port() would have fed, with the same messages, so every
+    port is pumped exactly like an independent run. A port's lease is
+    released and its "done" posted as soon as the runner reports its exit.
+    """
+    leased = []
+    try:
+        for com_port in com_ports:
+            LEASES.acquire(com_port, "workflow")
+            leased.append(com_port)
+    except PortBusyError as e:
+        for com_port in leased:
+            LEASES.release(com_port, "workflow")
+        for q in queues.values():
+            q.put(("info", f"\n!!!---!!! {e} !!!---!!!"))
+            q.put(("status", {"text": "Fatally Failed", "interactive": True}))
+            q.put(("done", None))
+        return
+
+    open_ports = set(com_ports)
+
+    def finish(com_port, return_code):
+        if com_port not in open_ports:
+            return
+        open_ports.discard(com_port)
+        _put_result(queues[com_port], com_port, return_code)
+        LEASES.release(com_port, "workflow")
+        queues[com_port].put(("done", None))
+
+    process = None
+    try:
+        for com_port in com_ports:
+            queues[com_port].put(("info", f"--- Running {workflow_path} on {com_port} (gang of {len(com_ports)}) ---\n"))
+
+        process = subprocess.Popen(
+            [sys.executable, "-u", GANG_RUNNER_PATH, workflow_path, *com_ports],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            errors="ignore"
+        )
+        with _processes_lock:
+            _processes[process.pid] = process
+        for q in queues.values():
+            q.put(("pid", process.pid))
+
+        def read_stderr():
+            # Only output the runner could not attribute to a port lands here.
+            for line in iter(process.stderr.readline, ''):
+                for com_port in list(open_ports):
+                    queues[com_port].put(("output", line))
+
+        stderr_thread = threading.Thread(target=read_stderr)
+        stderr_thread.start()
+        for line in iter(process.stdout.readline, ''):
+            if not line.startswith(GANG_FLAG):
+                continue
+            try:
+                message = json.loads(line[len(GANG_FLAG):])
+            except json.JSONDecodeError:
+                continue
+            com_port, msg_type, data = message["port"], message["type"], message["data"]
+            if com_port not in open_ports:
+                continue
+            if msg_type == "exit":
+                finish(com_port, data)
+            else:
+                queues[com_port].put((msg_type, data))
+
+        process.stdout.close()
+        process.stderr.close()
+        stderr_thread.join()
+        return_code = process.wait()
+        for com_port in list(open_ports):
+            finish(com_port, return_code or 1)
+
+    except Exception as e:
+        for com_port in list(open_ports):
+            queues[com_port].put(("info", f"\n!!!---!!! CRITICAL ERROR on {com_port} !!!---!!!\n{e}"))
+            finish(com_port, 1)
+    finally:
+        if process is not None:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            with _processes_lock:
+                _processes.pop(process.pid, None)
+            if process.stdin:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+        for com_port in list(open_ports):
+            finish(com_port, 1)
@@ -0,0 +1,87 @@
+import json
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class JsonRequestHandler(BaseHTTPRequestHandler):
+    """
+    Tiny JSON-over-HTTP base shared by the hub services. Subclasses define
+    a 'routes' dict mapping (method, path) to a method name; each handler
+    gets (query, body) and returns (http_status, payload).
+    """
+    routes = {}
+
+    def log_message(self, format, *args):
+        # The default handler logs every poll to stderr; keep the console clean.
+        pass
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        handler_name = self.routes.get((method, url.path))
+        if handler_name is None:
+            self._send_json(404, {"error": f"No route for {method} {url.path}"})
+            return
+
+        body = {}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            try:
+                body = json.loads(self.rfile.read(length))
+            except json.JSONDecodeError as e:
+                self._send_json(400, {"error": f"Invalid JSON body: {e}"})
+                return
+
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            status, payload = getattr(self, handler_name)(query, body)
+        except (KeyError, ValueError) as e:
+            status, payload = 400, {"error": str(e)}
+        self._send_json(status, payload)
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+
+def serve(handler_class, listen, context):
+    """
+    Starts a threaded HTTP server on 'host:port'. 'context' is exposed to the
+    handler as self.server.context.
+    """
+    host, _, port = listen.rpartition(":")
+    server = ThreadingHTTPServer((host or "0.0.0.0", int(port)), handler_class)
+    server.daemon_threads = True
+    server.context = context
+    return server
+
+
+def fetch_json(url, payload=None, timeout=5):
+    """GETs (or POSTs, when a payload is given) a JSON endpoint."""
+    data = None
+    headers = {}
+    if payload is not None:
+        data = json.dumps(payload).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+    request = urllib.request.Request(url, data=data, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        # Error bodies are JSON too; surface the message instead of the status line.
+        try:
+            message = json.loads(e.read()).get("error", str(e))
+        except (json.JSONDecodeError, AttributeError):
+            message = str(e)
+        raise RuntimeError(message) from None
@@ -0,0 +1,331 @@
+"""
+Static checks for workflow templates.
+
+Finds expect/extract patterns that do not compile, that contain regex
+metacharacters which were probably meant literally ("(y/n)", "[yes/no]: ")
+or that risk catastrophic backtracking, and estimates each template's
+worst-case duration from its step timeouts. The orchestrator and fleet run it
+before any port is opened; it can also be run by hand:
+
+    python -m hub.template_analyzer workflow/templates/*.json
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+DEFAULT_TIMEOUT = 30
+COMMAND_PAUSE = 5.0        # The runner's quiet wait after a command without an expect, at most
+DEFAULT_BAUD = 9600
+TRANSFER_OVERHEAD = 1.1     # Block headers, CRCs and ACK turnarounds
+PATTERN_FLAGS = re.IGNORECASE | re.MULTILINE
+RETRY_ACTIONS = ("resync", "resend", "reexpect")
+POWER_ACTIONS = ("cycle", "off", "on")
+POWER_OFF_TIME = 5.0        # The runner's default off time in a power cycle (power.json may change it)
+
+
+def _is_unbounded(op, av):
+    return str(op) in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT") and av[1] == sre_parse.MAXREPEAT
+
+
+def _children(op, av):
+    """Sub-sequences of a parsed regex node."""
+    name = str(op)
+    if name == "SUBPATTERN":
+        return [av[3]]
+    if name == "BRANCH":
+        return av[1]
+    if name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"):
+        return [av[2]]
+    if name in ("ASSERT", "ASSERT_NOT"):
+        return [av[1]]
+    if name == "ATOMIC_GROUP":
+        return [av]
+    if name == "GROUPREF_EXISTS":
+        return [seq for seq in av[1:] if seq]
+    return []
+
+
+def _contains_unbounded(seq):
+    for op, av in seq:
+        if _is_unbounded(op, av) or any(_contains_unbounded(child) for child in _children(op, av)):
+            return True
+    return False
+
+
+def _is_wildcard(seq):
+    """True for '.', '\\S', '[^x]' and similar: items that match almost any character."""
+    if len(seq) != 1:
+        return False
+    op, av = seq[0]
+    if str(op) == "ANY":
+        return True
+    return str(op) == "IN" and any(
+        str(item_op) == "NEGATE" or (str(item_op) == "CATEGORY" and "_NOT_" in str(item_av))
+        for item_op, item_av in av)
+
+
+def _literal_text(seq):
+    if seq and all(str(op) == "LITERAL" for op, _ in seq):
+        return "".join(chr(av) for _, av in seq)
+    return None
+
+
+def check_pattern(pattern, whole_buffer=True):
+    """
+    Returns a list of (level, message) for one expect/extract pattern.
+    Levels are "error" (the run would fail or may hang) and "warning".
+    Expects are searched against the whole, growing receive buffer on every
+    read, so wildcard-heavy patterns cost more there than in extractors,
+    which only ever see one line ('whole_buffer=False').
+    """
+    try:
+        parsed = sre_parse.parse(pattern, PATTERN_FLAGS)
+    except (re.error, TypeError) as e:
+        return [("error", f"invalid regex: {e}")]
+
+    issues = []
+
+    def visit(seq, in_repeat=False):
+        wildcards = 0
+        for op, av in seq:
+            name = str(op)
+            if name == "SUBPATTERN" and not in_repeat:
+                text = _literal_text(av[3])
+                if text:
+                    issues.append(("warning", f"'({text})' is a group and matches '{text}' without the "
+                                              f"parentheses; escape them as '\\({text}\\)'"))
+            elif name == "IN":
+                members = [chr(item_av) for item_op, item_av in av if str(item_op) == "LITERAL"]
+                if (len(members) == len(av) >= 3 and sum(c.isalpha() for c in members) >= 3):
+                    text = "".join(members)
+                    issues.append(("warning", f"'[{text}]' is a character class and matches a single "
+                                              f"character; escape the brackets as '\\[{text}\\]'"))
+            if _is_unbounded(op, av):
+                if _contains_unbounded(av[2]):
+                    issues.append(("error", "nested unbounded repeats (like '(a+)+') can backtrack "
+                                            "exponentially while the buffer grows"))
+                elif _is_wildcard(av[2]):
+                    wildcards += 1
+            for child in _children(op, av):
+                visit(child, in_repeat or _is_unbounded(op, av))
+        if wildcards > 1 and whole_buffer:
+            issues.append(("warning", f"{wildcards} unbounded wildcards in one sequence backtrack "
+                                      f"polynomially on long output; anchor on literal text instead"))
+
+    visit(parsed)
+    if whole_buffer and parsed and _is_unbounded(*parsed[0]) and _is_wildcard(parsed[0][1][2]):
+        issues.append(("warning", "leading '.*' is redundant (expects are searched, not matched) "
+                                  "and rescans the whole buffer"))
+    return issues
+
+
+def check_retry(policy):
+    """Problems with a "retry" policy (a step's or the template's default)."""
+    if isinstance(policy, bool) or not isinstance(policy, (int, dict)):
+        return [f"retry must be an attempt count or an object, got {policy!r}"]
+    if isinstance(policy, int):
+        policy = {"attempts": policy}
+    problems = []
+    attempts = policy.get("attempts", 1)
+    if isinstance(attempts, bool) or not isinstance(attempts, int) or attempts < 0:
+        problems.append(f"retry attempts must be a non-negative integer, got {attempts!r}")
+    if policy.get("action", "resync") not in RETRY_ACTIONS:
+        problems.append(f"retry action must be one of {', '.join(RETRY_ACTIONS)}, got {policy.get('action')!r}")
+    for field in ("backoff", "timeout"):
+        value = policy.get(field)
+        if value is not None and (not isinstance(value, (int, float)) or value < 0):
+            problems.append(f"retry {field} must be a non-negative number, got {value!r}")
+    return problems
+
+
+def retry_seconds(step, default=None):
+    """Worst-case seconds a step's retries add, following the runner's retry_policy()."""
+    policy = step.get("retry")
+    if policy is None and not step.get("require_physical_interact"):
+        policy = default
+    if not policy or not step.get("expect") or step.get("interrupt") or step.get("transfer") or step.get("push") \
+            or check_retry(policy):
+        return 0.0
+    if isinstance(policy, int):
+        policy = {"attempts": policy}
+    backoff = policy.get("backoff", 1.0)
+    timeout = policy.get("timeout") or step.get("timeout", DEFAULT_TIMEOUT)
+    return sum(backoff * 2 ** attempt + timeout for attempt in range(policy.get("attempts", 1)))
+
+
+def step_duration(step, retry=None):
+    """Worst-case seconds for one step, as the runner would spend them, retries included."""
+    expect = step.get("expect")
+    timeout = step.get("timeout", DEFAULT_TIMEOUT)
+    seconds = retry_seconds(step, retry)
+    if step.get("power") == "cycle":
+        seconds += step.get("off_time", POWER_OFF_TIME)
+    if step.get("interrupt") or expect:
+        seconds += timeout
+    elif step.get("command") is not None:
+        seconds += COMMAND_PAUSE
+
+    path = step.get("transfer")
+    if path and os.path.isfile(path):
+        baud = step.get("transfer_baud") or DEFAULT_BAUD
+        seconds += os.path.getsize(path) * 10 / baud * TRANSFER_OVERHEAD
+
+    # A push sends the file at line rate; "timeout" bounds the wait for any one line.
+    path = step.get("push")
+    if path and os.path.isfile(path):
+        seconds += os.path.getsize(path) * 10 / DEFAULT_BAUD
+        if not expect:
+            seconds += timeout
+    return seconds
+
+
+def analyze_template(workflow):
+    """
+    Checks a loaded template. Returns a report:
+
+        {"name", "issues": [{"step", "name", "level", "message"}],
+         "worst_case": seconds, "operator_wait": seconds, "steps": [seconds, ...]}
+
+    "worst_case" is the critical path: steps run strictly in sequence, so it
+    is the sum of every step's timeout. "operator_wait" is the part spent on
+    steps that wait for a person (physical interaction or boot interrupts).
+    """
+    issues = []
+
+    def add(index, name, level, message):
+        issues.append({"step": index, "name": name, "level": level, "message": message})
+
+    for field, spec in (workflow.get("extract") or {}).items():
+        pattern = spec if isinstance(spec, str) else spec.get("pattern")
+        for level, message in check_pattern(pattern, whole_buffer=False):
+            add(None, f"extract.{field}", level, message)
+
+    steps = workflow.get("steps")
+    if not isinstance(steps, list) or not steps:
+        add(None, workflow.get("name"), "error", "template has no steps")
+        steps = []
+
+    retry = workflow.get("retry")
+    if retry is not None:
+        for message in check_retry(retry):
+            add(None, "retry", "error", message)
+            retry = None
+
+    durations = []
+    operator_wait = 0.0
+    for index, step in enumerate(steps):
+        name = step.get("name")
+        if not name:
+            add(index, name, "error", "step has no name")
+        timeout = step.get("timeout", DEFAULT_TIMEOUT)
+        if not isinstance(timeout, (int, float)) or timeout < 0:
+            add(index, name, "error", f"timeout must be a non-negative number, got {timeout!r}")
+            timeout = DEFAULT_TIMEOUT
+            step = dict(step, timeout=timeout)
+
+        expect = step.get("expect")
+        if expect is not None:
+            for level, message in check_pattern(expect):
+                add(index, name, level, message)
+        elif step.get("interrupt"):
+            add(index, name, "error", "interrupt steps need an 'expect' to know when to stop")
+
+        path = step.get("transfer")
+        if path and not os.path.isfile(path):
+            add(index, name, "warning", f"transfer file '{path}' does not exist on this host")
+
+        push = step.get("push")
+        if push:
+            if not os.path.isfile(push):
+                add(index, name, "warning", f"push file '{push}' does not exist on this host")
+            window = step.get("window", 1)
+            if isinstance(window, bool) or not isinstance(window, int) or window < 1:
+                add(index, name, "error", f"window must be a positive integer, got {window!r}")
+            for field in ("ack", "error"):
+                if step.get(field) is not None:
+                    for level, message in check_pattern(step[field], whole_buffer=False):
+                        add(index, name, level, f"{field}: {message}")
+
+        power = step.get("power")
+        if power is not None and power not in POWER_ACTIONS:
+            add(index, name, "error", f"power must be one of {', '.join(POWER_ACTIONS)}, got {power!r}")
+            step = dict(step, power=None)
+        off_time = step.get("off_time")
+        if off_time is not None and (not isinstance(off_time, (int, float)) or off_time < 0):
+            add(index, name, "error", f"off_time must be a non-negative number, got {off_time!r}")
+            step = dict(step, off_time=POWER_OFF_TIME)
+
+        if step.get("retry") is not None:
+            for message in check_retry(step["retry"]):
+                add(index, name, "error", message)
+            if not expect or step.get("interrupt") or path or push:
+                add(index, name, "warning", "retry only applies to steps with an 'expect' that are "
+                                            "not interrupt, transfer or push steps; it is ignored here")
+
+        seconds = step_duration(step, retry)
+        durations.append(seconds)
+        if step.get("require_physical_interact") or step.get("interrupt"):
+            operator_wait += seconds
+
+    return {
+        "name": workflow.get("name"),
+        "issues": issues,
+        "worst_case": sum(durations),
+        "operator_wait": operator_wait,
+        "steps": durations,
+    }
+
+
+def analyze_file(path):
+    """analyze_template() for a template file; unreadable files become an error report."""
+    try:
+        with open(path, "r") as f:
+            workflow = json.load(f)
+    except (OSError, ValueError) as e:
+        return {"name": os.path.basename(path), "worst_case": 0.0, "operator_wait": 0.0, "steps": [],
+                "issues": [{"step": None, "name": None, "level": "error", "message": f"cannot load: {e}"}]}
+    return analyze_template(workflow)
+
+
+def has_errors(report):
+    return any(issue["level"] == "error" for issue in report["issues"])
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
+
+def format_issue(issue):
+    where = f"step {issue['step']} '{issue['name']}'" if issue["step"] is not None else (issue["name"] or "template")
+    return f"{issue['level'].upper()}: {where}: {issue['message']}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check workflow templates before running them.")
+    parser.add_argument("templates", nargs="+", help="Template JSON files")
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.templates:
+        report = analyze_file(path)
+        print(f"{path}: worst case {format_duration(report['worst_case'])} "
+              f"(operator {format_duration(report['operator_wait'])})")
+        for issue in report["issues"]:
+            print(f"  {format_issue(issue)}")
+        failed = failed or has_errors(report)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
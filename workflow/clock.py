@@ -0,0 +1,74 @@
+"""
+Engine time. Everything in the runner that waits or measures elapsed time
+goes through now() and sleep(), so a simulation can install VirtualClock and
+have every timeout, pause and boot wait complete as fast as the CPU allows.
+"""
+import heapq
+import itertools
+import time
+
+
+class RealClock:
+    virtual = False
+
+    def now(self):
+        return time.time()
+
+    def sleep(self, seconds, event=None):
+        """Waits 'seconds'; returns True early if 'event' is set."""
+        if event is None:
+            time.sleep(seconds)
+            return False
+        return event.wait(seconds)
+
+
+class VirtualClock:
+    """
+    Time that only moves when the engine waits: sleep() jumps straight to the
+    end of the wait, running the callbacks scheduled on the way (a simulated
+    device's boot lines, command delays, output pacing) at their virtual
+    times. Single-threaded: the engine and the simulation share one thread.
+    """
+    virtual = True
+
+    def __init__(self, start=0.0):
+        self.time = start
+        self.timers = []
+        self.ids = itertools.count()
+
+    def now(self):
+        return self.time
+
+    def schedule(self, delay, fn):
+        heapq.heappush(self.timers, (self.time + max(delay, 0.0), next(self.ids), fn))
+
+    def advance(self, until):
+        while self.timers and self.timers[0][0] <= until:
+            when, _, fn = heapq.heappop(self.timers)
+            self.time = max(self.time, when)
+            fn()
+        self.time = max(self.time, until)
+
+    def sleep(self, seconds, event=None):
+        if event is not None and event.is_set():
+            return True
+        self.advance(self.time + seconds)
+        return event is not None and event.is_set()
+
+
+current = RealClock()
+
+
+def install(clock):
+    """Makes 'clock' the engine's time source; returns the previous one."""
+    global current
+    previous, current = current, clock
+    return previous
+
+
+def now():
+    return current.now()
+
+
+def sleep(seconds, event=None):
+    return current.sleep(seconds, event)
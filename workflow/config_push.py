@@ -0,0 +1,64 @@
+"""
+Bulk configuration push: streams a config file or Tcl script to the console
+with several lines in flight instead of one round trip per line.
+
+The device's prompts are the acknowledgements. Every line it finishes ends
+with a fresh prompt ("Switch(config-if)#", the Tcl "+>"), so the number of
+prompts seen is the number of lines done, and up to 'window' more lines are
+already waiting in the console's type-ahead buffer. The first error line
+("% Invalid input ...", "invalid command name ...") stops the push; since
+it arrives before that line's prompt, it belongs to the line after the
+last acknowledged one.
+"""
+import re
+
+import serial
+
+PUSH_WINDOW = 8
+ACK_PATTERN = r"[^\s#>]*[#>]"
+ERROR_PATTERN = r"%\s?(Invalid|Incomplete|Ambiguous|Unknown|Bad|Error)|invalid command name"
+
+
+class PushError(serial.SerialException):
+    pass
+
+
+def load_lines(path):
+    """
+    The lines to send, as (line number in the file, text). Blank lines and
+    "!" comment lines are skipped: the console would only answer them with
+    a prompt.
+    """
+    with open(path, 'r', encoding='ascii') as f:
+        lines = [(number, line.rstrip("\r\n")) for number, line in enumerate(f, 1)]
+    return [(number, line) for number, line in lines if line.strip() and not line.lstrip().startswith("!")]
+
+
+class LineTracker:
+    """
+    Counts prompts and finds error lines in a push's cleaned console output,
+    across chunk boundaries. Both patterns are matched at the start of a line.
+    """
+    def __init__(self, ack=ACK_PATTERN, error=ERROR_PATTERN):
+        self.ack = re.compile(ack.encode('ascii'), re.IGNORECASE)
+        self.error = re.compile(error.encode('ascii'), re.IGNORECASE)
+        self.acks = 0
+        self.partial = b""          # output since the last newline: the prompt the device sits at
+        self.partial_acked = False
+
+    def feed(self, data):
+        """Consumes cleaned output; returns the first error line as text (and stops counting there), else None."""
+        *lines, self.partial = (self.partial + data).split(b"\n")
+        for line in lines:
+            acked, self.partial_acked = self.partial_acked, False
+            if acked:
+                continue
+            if self.ack.match(line):
+                self.acks += 1
+            elif self.error.match(line):
+                return line.decode('ascii').strip()
+        # The newest prompt has no newline after it until the next line's echo.
+        if not self.partial_acked and self.ack.match(self.partial):
+            self.acks += 1
+            self.partial_acked = True
+        return None
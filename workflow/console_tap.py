@@ -0,0 +1,274 @@
+"""
+Read-only mirrors of a port's raw console, for observers besides the hub.
+
+While a runner owns a serial port nothing else can open it. TappedSerial
+wraps the runner's serial object and hands every chunk read() returns to a
+ConsoleTap, which serves it on two endpoints under logs/consoles/:
+
+    <port>.sock   a unix socket, any number of clients:
+                      socat - UNIX-CONNECT:logs/consoles/ttyUSB0.sock
+    <port>.pty    a link to a pty that screen or picocom can attach to:
+                      screen logs/consoles/ttyUSB0.pty
+
+Observers only watch: whatever they type is read and discarded. Each one
+queues references to the chunks read, the same bytes objects for every
+observer, and a writer thread sends them with non-blocking writes. read()
+therefore only appends references and never waits on an observer; one that
+falls more than 'limit' bytes behind loses its oldest chunks and is sent a
+"[... N bytes dropped ...]" marker in their place. New observers see the
+console from the moment they attach. POSIX only (see available()).
+"""
+import os
+import re
+import selectors
+import socket
+import threading
+from collections import deque
+
+try:
+    import tty
+except ImportError:     # Windows
+    tty = None
+
+TAP_DIR = "logs/consoles"
+OBSERVER_LIMIT = 256 * 1024
+MAX_OBSERVERS = 16
+READ_SIZE = 4096
+
+
+def available():
+    return tty is not None and hasattr(socket, "AF_UNIX") and hasattr(os, "openpty")
+
+
+def tap_name(port):
+    """A file name for the port: /dev/ttyUSB0 -> ttyUSB0, /dev/pts/3 -> pts_3."""
+    return re.sub(r"[^\w.-]", "_", re.sub(r"^/dev/", "", port).strip("/\\")) or "console"
+
+
+class Observer:
+    __slots__ = ("fd", "close", "events", "chunks", "offset", "pending", "dropped")
+
+    def __init__(self, fd, close=None):
+        self.fd = fd
+        self.close = close          # None for the pty, which the tap frees itself
+        self.events = selectors.EVENT_READ
+        self.chunks = deque()       # bytes objects shared with every other observer
+        self.offset = 0             # bytes of chunks[0] already sent
+        self.pending = 0            # bytes queued and not yet sent
+        self.dropped = 0            # bytes lost since the last marker
+
+    def push(self, chunk, limit):
+        self.chunks.append(chunk)
+        self.pending += len(chunk)
+        while self.pending > limit and len(self.chunks) > 1:
+            lost = len(self.chunks.popleft()) - self.offset
+            self.dropped += lost
+            self.pending -= lost
+            self.offset = 0
+
+
+class ConsoleTap:
+    def __init__(self, port, directory=TAP_DIR, limit=OBSERVER_LIMIT):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.observers = []
+        self.closed = False
+        self.wake_pending = False
+        self.server = self.master = self.slave = self.thread = None
+        self.socket_path = self.pty_path = self.pty_name = None
+        self.selector = selectors.DefaultSelector()
+        self.wake_read, self.wake_write = os.pipe()
+        try:
+            for fd in (self.wake_read, self.wake_write):
+                os.set_blocking(fd, False)
+            self.selector.register(self.wake_read, selectors.EVENT_READ, "wake")
+
+            os.makedirs(directory, exist_ok=True)
+            name = tap_name(port)
+            self.socket_path = os.path.join(directory, f"{name}.sock")
+            _unlink(self.socket_path)   # left behind by a runner that was killed
+            self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.server.bind(self.socket_path)
+            self.server.listen(MAX_OBSERVERS)
+            self.server.setblocking(False)
+            self.selector.register(self.server, selectors.EVENT_READ, "accept")
+
+            # Holding the slave open keeps the master usable while no viewer is attached.
+            self.master, self.slave = os.openpty()
+            tty.setraw(self.slave)
+            os.set_blocking(self.master, False)
+            self.pty_name = os.ttyname(self.slave)
+            self.pty_path = os.path.join(directory, f"{name}.pty")
+            _unlink(self.pty_path)
+            os.symlink(self.pty_name, self.pty_path)
+            self._attach(Observer(self.master))
+        except Exception:
+            self.close()
+            raise
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def endpoints(self):
+        return {"socket": self.socket_path, "pty": self.pty_path, "device": self.pty_name}
+
+    def publish(self, chunk):
+        """Queues a chunk the runner read for every observer. Never blocks on one."""
+        with self.lock:
+            for observer in self.observers:
+                observer.push(chunk, self.limit)
+            if self.wake_pending or not self.observers:
+                return
+            self.wake_pending = True
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        if self.thread is not None:
+            self._wake()
+            self.thread.join(1.0)
+        with self.lock:
+            observers, self.observers = self.observers, []
+        for observer in observers:
+            if observer.close:
+                observer.close()
+        self.selector.close()
+        for fd in (self.wake_read, self.wake_write, self.master, self.slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        if self.server is not None:
+            self.server.close()
+        for path in (self.socket_path, self.pty_path):
+            if path:
+                _unlink(path)
+
+    # --- Writer thread ---
+
+    def _wake(self):
+        try:
+            os.write(self.wake_write, b"\0")
+        except OSError:
+            pass    # The pipe is full (a wake-up is already waiting) or closed.
+
+    def _serve(self):
+        while not self.closed:
+            with self.lock:
+                for observer in self.observers:
+                    events = selectors.EVENT_READ | (selectors.EVENT_WRITE if observer.chunks else 0)
+                    if events != observer.events:
+                        self.selector.modify(observer.fd, events, observer)
+                        observer.events = events
+            for key, mask in self.selector.select():
+                if key.data == "wake":
+                    # Drain before clearing the flag, so a publish() in between still leaves a wake-up behind.
+                    try:
+                        os.read(self.wake_read, READ_SIZE)
+                    except BlockingIOError:
+                        pass
+                    with self.lock:
+                        self.wake_pending = False
+                elif key.data == "accept":
+                    self._accept()
+                else:
+                    observer = key.data
+                    if mask & selectors.EVENT_READ and not self._discard_input(observer):
+                        self._detach(observer)
+                    elif mask & selectors.EVENT_WRITE and not self._send(observer):
+                        self._detach(observer)
+
+    def _accept(self):
+        try:
+            conn, _ = self.server.accept()
+        except OSError:
+            return
+        if len(self.observers) > MAX_OBSERVERS:
+            conn.close()
+            return
+        conn.setblocking(False)
+        self._attach(Observer(conn.fileno(), conn.close))
+
+    def _attach(self, observer):
+        self.selector.register(observer.fd, observer.events, observer)
+        with self.lock:
+            self.observers.append(observer)
+
+    def _detach(self, observer):
+        self.selector.unregister(observer.fd)
+        with self.lock:
+            self.observers.remove(observer)
+        if observer.close:
+            observer.close()
+
+    def _discard_input(self, observer):
+        """Reads what an observer typed and drops it; False once it hung up."""
+        try:
+            return bool(os.read(observer.fd, READ_SIZE))
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+
+    def _send(self, observer):
+        """Sends queued chunks until the observer would block; False if it went away."""
+        while True:
+            with self.lock:
+                if not observer.chunks:
+                    return True
+                if observer.dropped and not observer.offset:
+                    marker = f"\r\n[... {observer.dropped} bytes dropped ...]\r\n".encode("ascii")
+                    observer.chunks.appendleft(marker)
+                    observer.pending += len(marker)
+                    observer.dropped = 0
+                head, offset = observer.chunks[0], observer.offset
+            try:
+                sent = os.write(observer.fd, memoryview(head)[offset:])
+            except BlockingIOError:
+                return True
+            except OSError:
+                return False
+            with self.lock:
+                # publish() may have dropped the chunk meanwhile; then there is nothing to advance.
+                if observer.chunks and observer.chunks[0] is head:
+                    observer.offset += sent
+                    observer.pending -= sent
+                    if observer.offset == len(head):
+                        observer.chunks.popleft()
+                        observer.offset = 0
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class TappedSerial:
+    """
+    A serial port whose received bytes also go to a ConsoleTap. Everything
+    else (write, in_waiting, baudrate, xonxoff, send_break, ...) passes
+    straight through to the wrapped port.
+    """
+    __slots__ = ("ser", "tap")
+
+    def __init__(self, ser, port, **options):
+        object.__setattr__(self, "ser", ser)
+        object.__setattr__(self, "tap", ConsoleTap(port, **options))
+
+    def __getattr__(self, name):
+        return getattr(self.ser, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.ser, name, value)
+
+    def read(self, size=1):
+        data = self.ser.read(size)
+        if data:
+            self.tap.publish(data)
+        return data
+
+    def close(self):
+        self.tap.close()
+        self.ser.close()
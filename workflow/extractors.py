@@ -0,0 +1,66 @@
+import re
+
+
+class StreamExtractor:
+    """
+    Pulls inventory fields (serial, model, versions, flash contents) out of
+    console output as it streams past.
+
+    Templates declare extractors at the top level:
+
+        "extract": {
+            "serial": "System [Ss]erial [Nn]umber\\s*:\\s*(?P<serial>\\S+)",
+            "flash_files": {"pattern": "-rwx\\s+\\d+\\s+.*\\s(?P<flash_files>\\S+)$", "multiple": true}
+        }
+
+    Every named group becomes a field. Output is fed in chunks; only complete
+    lines are scanned, each exactly once, so the cost is independent of how
+    long the run has been going.
+    """
+    def __init__(self, spec, on_fields=None):
+        self.rules = []
+        for name, rule in (spec or {}).items():
+            if isinstance(rule, str):
+                rule = {"pattern": rule}
+            regex = re.compile(rule["pattern"])
+            if not regex.groupindex:
+                raise ValueError(f"Extractor '{name}' has no named groups")
+            self.rules.append((regex, rule.get("multiple", False)))
+        self.on_fields = on_fields
+        self.fields = {}
+        self.partial = ""
+
+    def feed(self, data):
+        if not self.rules or not data:
+            return
+        lines = (self.partial + data).split("\n")
+        self.partial = lines.pop()
+        # A console that never sends a newline (spinners, prompts) must not grow this forever.
+        if len(self.partial) > 4096:
+            self.partial = self.partial[-4096:]
+        changed = {}
+        for line in lines:
+            for regex, multiple in self.rules:
+                match = regex.search(line)
+                if not match:
+                    continue
+                for field, value in match.groupdict().items():
+                    if value is None:
+                        continue
+                    value = value.strip()
+                    if multiple:
+                        values = self.fields.setdefault(field, [])
+                        if value not in values:
+                            values.append(value)
+                            changed[field] = list(values)
+                    elif self.fields.get(field) != value:
+                        self.fields[field] = value
+                        changed[field] = value
+        if changed and self.on_fields:
+            self.on_fields(changed)
+
+    def flush(self):
+        """Scans a trailing line that never got its newline (e.g. a final prompt)."""
+        if self.partial:
+            partial, self.partial = self.partial, ""
+            self.feed(partial + "\n")
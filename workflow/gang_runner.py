@@ -0,0 +1,345 @@
+"""
+Gang mode: one template on many identical devices in lockstep.
+
+    python gang_runner.py <template.json> <COM_PORT> <COM_PORT> [...]
+
+The template is loaded and its patterns compiled once. Each device-timed step
+is broadcast to every port in the gang, and one polling loop matches each
+port's output against the shared pattern until all of them have matched (the
+step barrier). A port that is still waiting 'straggler_timeout' seconds after
+the first one matched is evicted: it finishes the step and the rest of the
+template on its own thread, like a normal run, and the gang moves on without
+it. Every port types with its own Pacer, and a command without an expect
+waits for that port to go quiet, as a single run does. A port that times out
+on a step with a "retry" policy is evicted the same way to run its retries.
+Steps that wait on the operator or push a file (transfer, config push) run on
+every port in parallel and the gang waits for all of them. A port that loses
+its serial connection fails alone; the rest of the gang goes on.
+
+Everything a port produces is written to stdout as one JSON line,
+
+    GANG_FLAG::{"port": "COM3", "type": "output" | "status" | "event" | "exit", "data": ...}
+
+where "exit" carries the port's exit code (0, 1 or 130). CANCEL on stdin stops
+the whole gang.
+"""
+import json
+import signal
+import sys
+import threading
+
+import serial
+
+import clock
+import workflow_runner as engine
+from extractors import StreamExtractor
+from pacing import Pacer
+from receive import ReceiveBuffer, clean_bytes, compile_expect
+
+GANG_FLAG = "GANG_FLAG::"
+STRAGGLER_TIMEOUT = 30
+
+stdout_lock = threading.Lock()
+
+
+def emit(port, kind, data):
+    line = json.dumps({"port": port, "type": kind, "data": data})
+    with stdout_lock:
+        print(f"{GANG_FLAG}{line}", flush=True)
+
+
+class GangPort:
+    def __init__(self, port, workflow):
+        self.port = port
+        self.ser = None
+        self.mode = "gang"          # "gang", "solo" once evicted, "done"
+        self.buffer = ReceiveBuffer()
+        self.error = None
+        self.thread = None
+        self.code = None
+        self.retry = workflow.get('retry')
+        pacing = workflow.get('pacing', {})
+        self.pacer = Pacer(**(pacing if isinstance(pacing, dict) else {})) if pacing is not False else None
+        self.carry = ""             # output the next step's prompt wait searches first
+        self.extractor = StreamExtractor(workflow.get('extract'),
+                                         lambda fields: self.sink("event", {"type": "inventory", "data": fields}))
+
+    def sink(self, kind, data):
+        emit(self.port, kind, data)
+
+    def call(self, fn, *args):
+        """Runs an engine function with its output attributed to this port."""
+        engine.console.sink = self.sink
+        try:
+            return fn(*args)
+        finally:
+            engine.console.sink = None
+
+    def finish(self, error=None):
+        engine.console.sink = self.sink
+        try:
+            self.extractor.flush()
+            if error is None:
+                self.ser.close()
+                if self.pacer and self.pacer.drops:
+                    engine.log_output(f"[.] Console dropped characters {self.pacer.drops} time(s); settled on "
+                                      f"{self.pacer.burst}-character bursts, {self.pacer.gap * 1000:.0f} ms apart")
+                engine.log_output("Workflow finished successfully.")
+                engine.send_status("Successfully Finished")
+                code = 0
+            elif engine.cancel_event.is_set():
+                self.ser.close()
+                engine.log_output("!====== Workflow cancelled, port closed ======!")
+                engine.send_status("Cancelled")
+                code = engine.CANCEL_EXIT_CODE
+            else:
+                engine.send_status("Fatally Failed", True) # Make errors flash
+                engine.log_output(f"!====== CRITICAL ERROR: {error} ======!")
+                self.ser.close()
+                code = 1
+        finally:
+            engine.console.sink = None
+        self.mode = "done"
+        self.code = code
+        emit(self.port, "exit", code)
+
+
+def run_solo(member, steps, first=None):
+    """Finishes a port on its own thread: 'first' completes the current step, then the remaining steps run."""
+    engine.console.sink = member.sink
+    try:
+        if first:
+            first()
+        for step in steps:
+            if engine.cancel_event.is_set():
+                raise engine.WorkflowCancelled("Cancelled by operator")
+            output = engine.run_step(member.ser, step, member.extractor, pacer=member.pacer, carry=member.carry,
+                                     retry=member.retry)
+            member.carry = engine.carry_over(step, output)
+    except Exception as e:
+        member.finish(e)
+        return
+    member.finish()
+
+
+def evict(member, reason, first, later_steps):
+    member.mode = "solo"
+    member.call(engine.log_output, f"[GANG] {reason}; continuing independently")
+    member.thread = threading.Thread(target=run_solo, daemon=True, args=(member, later_steps, first))
+    member.thread.start()
+
+
+def straggle(member, step, remaining, later_steps):
+    expect = step['expect']
+
+    def finish_step():
+        try:
+            return engine.read_until(member.ser, expect, remaining, member.extractor, None, member.buffer.text())
+        except serial.SerialTimeoutException as e:
+            policy = engine.retry_policy(step, member.retry)
+            if policy is None or engine.cancel_event.is_set():
+                raise
+            return engine.retry_step(member.ser, step, e, policy, member.extractor, pacer=member.pacer)
+
+    evict(member, f"Still waiting for '{expect}' after the gang matched", finish_step, later_steps)
+
+
+def in_parallel(members, work):
+    """Runs work(member) for every port on its own thread and waits for all; ports that fail are finished."""
+    def run(member):
+        engine.console.sink = member.sink
+        try:
+            work(member)
+        except Exception as e:
+            member.error = e
+
+    threads = [threading.Thread(target=run, args=(m,), daemon=True) for m in members]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        while thread.is_alive():
+            thread.join(0.1)
+    for member in members:
+        if member.error is not None:
+            member.finish(member.error)
+    return [m for m in members if m.mode == "gang"]
+
+
+def run_parallel(members, step):
+    """
+    Operator-timed, transfer, push and power steps: every port runs the step
+    itself; the gang waits for all. Power-ons still come one 'stagger' apart.
+    """
+    def run(member):
+        output = engine.run_step(member.ser, step, member.extractor, pacer=member.pacer, carry=member.carry,
+                                 retry=member.retry)
+        member.carry = engine.carry_over(step, output)
+
+    in_parallel(members, run)
+
+
+def poll(member, pattern):
+    """Reads what a port has waiting into its buffer; True once the buffer matches 'pattern'."""
+    ser = member.ser
+    if ser.in_waiting <= 0:
+        return False
+    cleaned_data = clean_bytes(ser.read(ser.in_waiting))
+    member.buffer.append(cleaned_data)
+    if cleaned_data:
+        text = cleaned_data.decode('ascii')
+        member.sink("output", text)
+        member.extractor.feed(text)
+    if member.buffer.endswith(b'-- MORE --'):
+        member.call(engine.log_output, "[.] Handling pagination ('-- MORE --')...")
+        ser.write(b' ')
+        ser.flush()
+        member.buffer.clear()
+        return False
+    return bool(member.buffer.search(pattern))
+
+
+def run_lockstep(members, step, later_steps, straggler_timeout):
+    """
+    Device-timed steps: every port types the command at its own pace, then
+    one polling loop matches every port.
+    """
+    status_message = step.get("status", step['name'])
+    command = step.get('command')
+    expect = step.get('expect')
+    timeout = step.get('timeout', 30)
+    paced = step.get('pacing', True) is not False
+
+    # Like a single run, only a wait without a command searches what the last step left behind.
+    carry = {}
+    for member in members:
+        carry[member] = member.carry if command is None else ""
+        member.carry = ""
+        member.call(engine.send_status, status_message, False)
+        member.call(engine.send_step, step, status_message, False, timeout)
+        if command is None and expect:
+            member.call(engine.log_output, f"Waiting for prompt (expect: '{expect}')...")
+    if command is not None:
+        members = in_parallel(members, lambda m: engine.send_command(m.ser, command, m.pacer if paced else None,
+                                                                     m.extractor))
+    if not expect:
+        if command is not None:
+            def settle(member):
+                member.carry = engine.wait_for_quiet(member.ser, member.extractor)
+            in_parallel(members, settle)
+        return
+
+    pattern = compile_expect(expect)
+    pending = list(members)
+    first_match = None
+    for member in members:
+        member.buffer = ReceiveBuffer(carry[member].encode('ascii', errors='ignore'))
+        if carry[member] and member.buffer.search(pattern):
+            member.call(engine.log_output, f"[.] Matched: '{expect}'")
+            pending.remove(member)
+            first_match = first_match or clock.now()
+    start_time = clock.now()
+    while pending and clock.now() - start_time < timeout:
+        for member in list(pending):
+            try:
+                matched = poll(member, pattern)
+            except (serial.SerialException, OSError) as e:
+                # A port that was unplugged or failed is finished on its own; the rest keep matching.
+                pending.remove(member)
+                member.finish(e)
+                continue
+            if matched:
+                member.call(engine.log_output, f"[.] Matched: '{expect}'")
+                pending.remove(member)
+                first_match = first_match or clock.now()
+
+        if pending and first_match and clock.now() - first_match > straggler_timeout:
+            remaining = timeout - (clock.now() - start_time)
+            for member in pending:
+                straggle(member, step, remaining, later_steps)
+            return
+        engine.pause(0.1)
+
+    for member in pending:
+        member.call(engine.log_output, f"[!] TIMEOUT waiting for: '{expect}'")
+        error = serial.SerialTimeoutException(f"Timeout waiting for '{expect}'")
+        policy = engine.retry_policy(step, member.retry)
+        if policy is None:
+            member.finish(error)
+            continue
+        # Bind this member's values; the lambda runs on its own thread.
+        evict(member, f"Retrying '{step['name']}'",
+              lambda m=member, e=error, p=policy: engine.retry_step(m.ser, step, e, p, m.extractor, pacer=m.pacer),
+              later_steps)
+
+
+def main(json_path, com_ports):
+    signal.signal(signal.SIGTERM, engine.request_cancel)
+    signal.signal(signal.SIGINT, engine.request_cancel)
+    if hasattr(signal, "SIGBREAK"):
+        signal.signal(signal.SIGBREAK, engine.request_cancel)
+    threading.Thread(target=engine.watch_for_cancel, daemon=True).start()
+
+    try:
+        with open(json_path, 'r') as f:
+            workflow = json.load(f)
+        members = [GangPort(port, workflow) for port in com_ports]
+    except Exception as e:
+        for port in com_ports:
+            emit(port, "status", {"text": "Fatally Failed", "interactive": True})
+            emit(port, "output", f"[SCRIPT] !====== FAILED to load template: {e} ======!\n")
+            emit(port, "exit", 1)
+        sys.exit(1)
+
+    straggler_timeout = workflow.get('gang', {}).get('straggler_timeout', STRAGGLER_TIMEOUT)
+    engine.load_power()
+    gang = []
+    for member in members:
+        member.call(engine.log_output, f"*=*=*=*=*= Running workflow '{workflow['name']}' on {member.port} "
+                                       f"in a gang of {len(members)} *=*=*=*=*=")
+        try:
+            member.ser = serial.Serial(member.port, engine.BAUD_RATE, timeout=1)
+        except Exception as e:
+            member.call(engine.send_status, "Fatally Failed", True)
+            member.call(engine.log_output, f"!====== FAILED to open port {member.port}: {e} ======!")
+            member.mode, member.code = "done", 1
+            emit(member.port, "exit", 1)
+            continue
+        member.ser = member.call(engine.tap_console, member.ser, member.port)
+        gang.append(member)
+
+    steps = workflow['steps']
+    try:
+        for index, step in enumerate(steps):
+            gang = [m for m in gang if m.mode == "gang"]
+            if not gang:
+                break
+            if engine.cancel_event.is_set():
+                raise engine.WorkflowCancelled("Cancelled by operator")
+            if step.get('interrupt') or step.get("require_physical_interact", False) or step.get('transfer') \
+                    or step.get('push') or step.get('power'):
+                run_parallel(gang, step)
+            else:
+                run_lockstep(gang, step, steps[index + 1:], straggler_timeout)
+    except Exception as e:
+        for member in gang:
+            if member.mode == "gang":
+                member.finish(e)
+    for member in gang:
+        if member.mode == "gang":
+            member.finish()
+
+    for member in members:
+        if member.thread:
+            member.thread.join()
+    if engine.cancel_event.is_set():
+        sys.exit(engine.CANCEL_EXIT_CODE)
+    sys.exit(1 if any(m.code for m in members) else 0)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("[SCRIPT] ERROR: Missing arguments. Usage: python gang_runner.py <template.json> <COM_PORT> [<COM_PORT> ...]",
+              file=sys.stderr, flush=True)
+        sys.exit(1)
+
+    main(sys.argv[1], sys.argv[2:])
@@ -0,0 +1,72 @@
+BURST = 8
+MIN_BURST = 1
+MAX_BURST = 64
+BURST_STEP = 4
+MAX_GAP = 0.25
+MIN_GAP = 0.02
+GAP_DECAY_AFTER = 4
+ECHO_TIMEOUT = 0.5
+MAX_RESYNCS = 3
+QUIET_GAP = 0.2
+PROMPT_QUIET = 0.05     # silence that ends the prompt before a command is typed
+QUIET_MAX = 5.0
+
+
+def apply_echo(line, data):
+    """
+    Plays received characters onto a model of the device's input line:
+    printable characters are appended and backspace/DEL erase one, so the
+    usual "\\b \\b" erase echo nets out to a single deletion.
+    """
+    for char in data:
+        if char in "\x08\x7f":
+            line = line[:-1]
+        elif " " <= char <= "~":
+            line += char
+    return line
+
+
+def common_prefix(a, b):
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+class Pacer:
+    """
+    Typing speed for one port: a command is written 'burst' characters at a
+    time, 'gap' seconds apart, and each burst's echo is checked before the
+    next. Clean echoes grow the burst (and, after a few in a row, shrink the
+    gap) up to just below the smallest burst that ever lost characters; a
+    loss halves the burst, or backs the gap off once single characters are
+    being lost. The port settles on the fastest pace it takes cleanly.
+    """
+    def __init__(self, burst=BURST, gap=0.0, max_burst=MAX_BURST):
+        self.burst = burst
+        self.gap = gap
+        self.max_burst = max_burst
+        self.streak = 0
+        self.drops = 0
+
+    def success(self):
+        self.streak += 1
+        self.burst = min(self.burst + BURST_STEP, self.max_burst)
+        if self.streak >= GAP_DECAY_AFTER and self.gap:
+            self.gap = self.gap / 2 if self.gap / 2 >= MIN_GAP else 0.0
+            self.streak = 0
+
+    def failure(self):
+        self.streak = 0
+        self.drops += 1
+        if self.burst > MIN_BURST:
+            self.max_burst = max(self.burst - 1, MIN_BURST)
+            self.burst = max(self.burst // 2, MIN_BURST)
+        else:
+            self.gap = min(max(self.gap * 2, MIN_GAP), MAX_GAP)
+
+    def echo_timeout(self, chars, baudrate):
+        """How long to wait for 'chars' characters to come back, with room for the device to react."""
+        return ECHO_TIMEOUT + chars * 10 / baudrate
@@ -0,0 +1,261 @@
+"""
+Switched power for bench devices, so templates can power cycle a device
+instead of asking the operator to pull its cord.
+
+The bench's power map, power.json in the hub's working directory, says
+which PDU outlet feeds each port:
+
+    {
+      "stagger": 2.0,
+      "off_time": 5.0,
+      "pdus": {
+        "rack1": {"driver": "command",
+                  "on":  ["snmpset", "-v2c", "-c", "private", "10.0.0.5", "1.3.6.1.4.1.318.1.1.4.4.2.1.3.{outlet}", "i", "1"],
+                  "off": ["snmpset", "-v2c", "-c", "private", "10.0.0.5", "1.3.6.1.4.1.318.1.1.4.4.2.1.3.{outlet}", "i", "2"]},
+        "bench": {"driver": "local", "state_dir": "logs/power"}
+      },
+      "ports": {
+        "/dev/ttyUSB0": {"pdu": "rack1", "outlet": 3},
+        "COM5": {"pdu": "bench", "outlet": "sw-5"}
+      }
+    }
+
+A PDU is driven by a PowerDriver: "command" runs any command-line client
+(snmpset, ipmitool, a vendor CLI) and "local" is a stand-in that keeps
+outlet states in files, which hub.device_emulator --power-dir follows.
+register_driver() adds more.
+
+Power-ons are sequenced across the whole bench: no two outlets come on
+within 'stagger' seconds of each other, across every runner process,
+so a gang or a busy bench never draws every device's inrush at once.
+"""
+import json
+import os
+import shlex
+import subprocess
+import threading
+
+import serial
+
+import clock
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+POWER_CONFIG = "power.json"
+POWER_LOCK = "logs/power.lock"
+STAGGER = 2.0
+OFF_TIME = 5.0
+COMMAND_TIMEOUT = 10
+LOCK_POLL = 0.1
+POWER_ACTIONS = ("cycle", "off", "on")
+
+
+class PowerError(serial.SerialException):
+    pass
+
+
+class PowerDriver:
+    """One PDU, or anything else that switches outlets. Subclasses implement set()."""
+    def __init__(self, name):
+        self.name = name
+
+    def set(self, outlet, on):
+        raise NotImplementedError
+
+
+class LocalDriver(PowerDriver):
+    """
+    Stand-in PDU for testing: each outlet is a file in 'state_dir' holding
+    "on" or "off". Nothing is switched; hub.device_emulator --power-dir
+    powers its virtual devices off and on to match.
+    """
+    def __init__(self, name, state_dir="logs/power"):
+        super().__init__(name)
+        self.state_dir = state_dir
+
+    def set(self, outlet, on):
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = os.path.join(self.state_dir, str(outlet))
+        with open(path + ".tmp", "w") as f:
+            f.write("on" if on else "off")
+        os.replace(path + ".tmp", path)
+
+
+class CommandDriver(PowerDriver):
+    """
+    A PDU with a command-line client. 'on' and 'off' are argument lists (or
+    strings, split like a shell would) in which {outlet} is replaced.
+    """
+    def __init__(self, name, on, off, timeout=COMMAND_TIMEOUT):
+        super().__init__(name)
+        self.commands = {True: on, False: off}
+        self.timeout = timeout
+
+    def set(self, outlet, on):
+        command = self.commands[on]
+        if isinstance(command, str):
+            command = shlex.split(command, posix=os.name != "nt")
+        args = [arg.format(outlet=outlet) for arg in command]
+        try:
+            result = subprocess.run(args, capture_output=True, text=True, timeout=self.timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise PowerError(f"PDU '{self.name}': {e}") from e
+        if result.returncode:
+            raise PowerError(f"PDU '{self.name}' outlet {outlet}: '{args[0]}' exited with {result.returncode}: "
+                             f"{(result.stderr or result.stdout).strip()}")
+
+
+DRIVERS = {"local": LocalDriver, "command": CommandDriver}
+
+
+def register_driver(name, cls):
+    """Makes a PowerDriver subclass available to power.json as "driver": name."""
+    DRIVERS[name] = cls
+
+
+class PowerControl:
+    def __init__(self, outlets, stagger=STAGGER, off_time=OFF_TIME, lock_path=POWER_LOCK):
+        """
+        'outlets' maps port -> (driver, outlet). 'lock_path' is the file that
+        sequences power-ons between runner processes; None keeps the
+        sequencing inside this process (simulations).
+        """
+        self.outlets = outlets
+        self.stagger = stagger
+        self.off_time = off_time
+        self.lock_path = lock_path
+        self.lock = threading.Lock()
+        self.last_on = None
+
+    def has_outlet(self, port):
+        return port in self.outlets
+
+    def describe(self, port):
+        driver, outlet = self.outlets[port]
+        return f"PDU '{driver.name}' outlet {outlet}"
+
+    def turn_off(self, port):
+        driver, outlet = self.outlets[port]
+        driver.set(outlet, False)
+
+    def turn_on(self, port, wait):
+        """
+        Switches the port's outlet on in its turn. 'wait(seconds)' does the
+        waiting, so the engine's cancellable pause() can be passed in.
+        Returns the seconds it took, waiting for the turn included.
+        """
+        driver, outlet = self.outlets[port]
+        started = clock.now()
+        with self.lock:
+            if self.lock_path is None:
+                self.last_on = self._switch_on(driver, outlet, self.last_on, wait)
+            else:
+                with _BenchLock(self.lock_path, wait) as bench:
+                    bench.last_on = self._switch_on(driver, outlet, bench.last_on, wait)
+        return clock.now() - started
+
+    def _switch_on(self, driver, outlet, last_on, wait):
+        if last_on is not None:
+            delay = last_on + self.stagger - clock.now()
+            if delay > 0:
+                wait(delay)
+        driver.set(outlet, True)
+        return clock.now()
+
+
+class _BenchLock:
+    """
+    An exclusive lock on 'path', which holds the time of the bench's last
+    power-on. Taking it polls with 'wait', so a cancel still gets through.
+    """
+    def __init__(self, path, wait):
+        self.path = path
+        self.wait = wait
+        self.file = None
+        self.last_on = None
+
+    def __enter__(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, "a+")
+        try:
+            while not self._try_lock():
+                self.wait(LOCK_POLL)
+            self.file.seek(0)
+            text = self.file.read().strip()
+            self.last_on = float(text) if text else None
+        except BaseException:
+            self.file.close()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.last_on is not None:
+                self.file.seek(0)
+                self.file.truncate()
+                self.file.write(f"{self.last_on:.3f}")
+                self.file.flush()
+        finally:
+            self._unlock()
+            self.file.close()
+
+    def _try_lock(self):
+        try:
+            if fcntl:
+                fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _unlock(self):
+        if fcntl:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def load(path=POWER_CONFIG):
+    """The bench's PowerControl from 'path', or None when the bench has no power map."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        config = json.load(f)
+
+    drivers = {}
+    for name, spec in (config.get("pdus") or {}).items():
+        options = dict(spec)
+        kind = options.pop("driver", "local")
+        if kind not in DRIVERS:
+            raise ValueError(f"PDU '{name}': unknown driver '{kind}' (have: {', '.join(sorted(DRIVERS))})")
+        try:
+            drivers[name] = DRIVERS[kind](name, **options)
+        except TypeError as e:
+            raise ValueError(f"PDU '{name}': {e}") from e
+
+    outlets = {}
+    for port, spec in (config.get("ports") or {}).items():
+        if spec.get("pdu") not in drivers:
+            raise ValueError(f"Port '{port}': unknown PDU '{spec.get('pdu')}'")
+        if spec.get("outlet") is None:
+            raise ValueError(f"Port '{port}': no outlet")
+        outlets[port] = (drivers[spec["pdu"]], spec["outlet"])
+    return PowerControl(outlets, config.get("stagger", STAGGER), config.get("off_time", OFF_TIME))
+
+
+current = None
+
+
+def install(power):
+    """Makes 'power' the engine's power control; returns the previous one."""
+    global current
+    previous, current = current, power
+    return previous
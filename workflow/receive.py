@@ -0,0 +1,67 @@
+"""
+Byte-level receive path. Serial chunks are cleaned with one bytes.translate()
+call, appended into a preallocated bytearray and searched with compiled
+bytes patterns; text is only decoded for the log and the extractors.
+"""
+import re
+from functools import lru_cache
+
+WINDOW = 64 * 1024
+PATTERN_FLAGS = re.IGNORECASE | re.MULTILINE
+
+# Every control character except \t and \n (so \r goes too), DEL, and all
+# non-ASCII bytes: what is left decodes as ASCII and matches like the log reads.
+DELETE_BYTES = bytes(range(0x00, 0x09)) + bytes(range(0x0B, 0x20)) + bytes(range(0x7F, 0x100))
+
+
+def clean_bytes(data):
+    return data.translate(None, DELETE_BYTES)
+
+
+@lru_cache(maxsize=256)
+def compile_expect(expect_regex):
+    """An expect pattern compiled once per process, for matching cleaned bytes."""
+    return re.compile(expect_regex.encode('ascii'), PATTERN_FLAGS)
+
+
+class ReceiveBuffer:
+    """
+    Cleaned output received during one step, in a bytearray allocated once.
+    Only the newest 'window' bytes are kept: when the array fills up they
+    are moved to the front, so a step with megabytes of boot output neither
+    grows the buffer nor rescans all of it on every read.
+    """
+    def __init__(self, seed=b"", window=WINDOW):
+        self.window = window
+        self.data = bytearray(2 * window)
+        self.length = 0
+        if seed:
+            self.append(seed)
+
+    def append(self, chunk):
+        size = len(chunk)
+        view = memoryview(self.data)
+        if size >= self.window:
+            view[:self.window] = chunk[-self.window:]
+            self.length = self.window
+            return
+        if self.length + size > len(self.data):
+            keep = self.window - size
+            view[:keep] = view[self.length - keep:self.length]
+            self.length = keep
+        view[self.length:self.length + size] = chunk
+        self.length += size
+
+    def search(self, pattern):
+        return pattern.search(self.data, 0, self.length)
+
+    def endswith(self, suffix):
+        """Like bytes.endswith() after rstrip(), without copying the buffer."""
+        tail = bytes(self.data[max(self.length - len(suffix) - 64, 0):self.length]).rstrip()
+        return tail.endswith(suffix)
+
+    def clear(self):
+        self.length = 0
+
+    def text(self):
+        return self.data[:self.length].decode('ascii')
@@ -0,0 +1,80 @@
+"""
+Runs a template against a simulated device in virtual time.
+
+    python simulate.py <template.json> [<template.json> ...] [--profile cisco_ios] [device options]
+
+The device is one of hub.device_emulator's profiles, served without a pty
+and driven by the engine's VirtualClock: whenever the runner waits (a prompt
+that has not appeared, a 240 s MODE button step, an autoboot window, the
+quiet wait after a command) virtual time jumps to the device's next event.
+A full reset template finishes in seconds, with the output, status flags and
+exit code of a real run, so CI can check template changes. Device options
+are those of the emulator (--boot-delay, --fail-rate, --seed, ...). The
+device sits on a simulated outlet, so "power" steps switch it off and on;
+--no-power leaves them to an operator who never comes.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clock
+import power_control
+import workflow_runner as engine
+from hub.device_emulator import ClockedFleet, SimulatedSerial, add_device_options, load_profiles
+
+
+class SimulatedOutlet(power_control.PowerDriver):
+    """The simulated device's power, switched in virtual time."""
+    def __init__(self, device):
+        super().__init__("simulated")
+        self.device = device
+
+    def set(self, outlet, on):
+        if on:
+            self.device.power_on()
+        else:
+            self.device.power_off()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a template against a simulated device in virtual time.")
+    parser.add_argument("templates", nargs="+", help="Template JSON files, run back to back as a chain")
+    parser.add_argument("--profile", default="cisco_ios", help="Device profile to simulate")
+    parser.add_argument("--no-power", action="store_true", help="Give the device no power outlet")
+    add_device_options(parser)
+    args = parser.parse_args()
+
+    try:
+        profiles = load_profiles(args)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+    if args.profile not in profiles:
+        print(f"ERROR: Unknown profile '{args.profile}' (have: {', '.join(sorted(profiles))})", file=sys.stderr)
+        return 2
+
+    virtual = clock.VirtualClock()
+    clock.install(virtual)
+    fleet = ClockedFleet(args, virtual)
+    device = fleet.add(args.profile, profiles[args.profile], random.Random(args.seed))
+    device.power_on()
+    if not args.no_power:
+        power_control.install(power_control.PowerControl({device.name: (SimulatedOutlet(device), 1)}, lock_path=None))
+
+    started = time.time()
+    try:
+        engine.main(args.templates, device.name, lambda port: SimulatedSerial(device, virtual, args.baud))
+        code = 0
+    except SystemExit as e:
+        code = e.code or 0
+    print(f"\n[SIMULATE] {' + '.join(args.templates)} on {args.profile}: exit {code}, "
+          f"{virtual.now():.1f}s virtual in {time.time() - started:.1f}s", file=sys.stderr, flush=True)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
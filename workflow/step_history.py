@@ -0,0 +1,124 @@
+import math
+import os
+import sqlite3
+import time
+
+import serial
+
+import clock
+
+HISTORY_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "step_history.sqlite")
+MIN_SAMPLES = 10
+MAX_SAMPLES = 200
+MARGIN = 1.5
+MIN_SLACK = 5.0
+STALL_MARGIN = 3.0
+MIN_STALL = 10.0
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+class StepHistory:
+    """
+    Per-template, per-step durations and longest output gaps from past runs,
+    shared by every runner on the host (SQLite in WAL mode).
+    """
+    def __init__(self, path=HISTORY_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=5)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS step_runs (
+                template TEXT NOT NULL,
+                step     TEXT NOT NULL,
+                duration REAL NOT NULL,
+                max_gap  REAL NOT NULL,
+                finished REAL NOT NULL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS step_runs_key ON step_runs(template, step, finished)")
+        self.db.commit()
+
+    def samples(self, template, step):
+        rows = self.db.execute(
+            "SELECT duration, max_gap FROM step_runs WHERE template = ? AND step = ? ORDER BY finished DESC LIMIT ?",
+            (template, step, MAX_SAMPLES)).fetchall()
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    def record(self, template, step, duration, max_gap):
+        try:
+            with self.db:
+                self.db.execute("INSERT INTO step_runs VALUES (?, ?, ?, ?, ?)",
+                                (template, step, duration, max_gap, time.time()))
+        except sqlite3.Error:
+            # History is an optimisation; a busy database must never fail a run.
+            pass
+
+    def limits(self, template, step, static_timeout, settings=None):
+        """
+        Returns (deadline, stall_timeout) for a step. The deadline is p99 of
+        past durations times a margin, never above the template's static
+        timeout; stall_timeout is the longest usual silence times a margin.
+        Both are None until MIN_SAMPLES successful runs have been recorded.
+        """
+        settings = settings or {}
+        try:
+            durations, gaps = self.samples(template, step)
+        except sqlite3.Error:
+            return None, None
+        if len(durations) < settings.get("min_samples", MIN_SAMPLES):
+            return None, None
+        p99 = percentile(durations, 99)
+        deadline = min(max(p99 * settings.get("margin", MARGIN), p99 + MIN_SLACK), static_timeout)
+        stall = max(percentile(gaps, 99) * settings.get("stall_margin", STALL_MARGIN), MIN_STALL)
+        return deadline, stall
+
+    def close(self):
+        self.db.close()
+
+
+class StepMonitor:
+    """
+    Watches one step while it reads: tracks the longest silence for the
+    history, fails early once the device has gone quiet for longer than
+    'stall_timeout', and calls 'on_overdue' once when 'overdue_after' passes
+    (operator-timed steps alert instead of failing). Silence before the
+    first byte is not a stall: the device may simply not be powered yet.
+    """
+    def __init__(self, stall_timeout=None, overdue_after=None, on_overdue=None):
+        self.stall_timeout = stall_timeout
+        self.overdue_after = overdue_after
+        self.on_overdue = on_overdue
+        self.started = clock.now()
+        self.last_data = None
+        self.max_gap = 0.0
+        self.overdue_sent = False
+        self.retries = 0
+
+    def on_data(self):
+        now = clock.now()
+        if self.last_data is not None:
+            self.max_gap = max(self.max_gap, now - self.last_data)
+        self.last_data = now
+
+    def check(self):
+        now = clock.now()
+        if self.stall_timeout and self.last_data is not None and now - self.last_data > self.stall_timeout:
+            raise serial.SerialTimeoutException(
+                f"Device silent for {now - self.last_data:.0f}s (stall limit {self.stall_timeout:.0f}s)")
+        if self.overdue_after and not self.overdue_sent and now - self.started > self.overdue_after:
+            self.overdue_sent = True
+            if self.on_overdue:
+                self.on_overdue()
+
+    def retry(self):
+        """A retry starts: the silence that caused the timeout must not count as a stall again."""
+        self.retries += 1
+        self.last_data = None
+
+    def finish(self):
+        """Returns (duration, longest gap) for the history."""
+        return clock.now() - self.started, self.max_gap
@@ -1,30 +1,204 @@
 import serial
+import os
 import time
 import sys
 import json
 import re
+import signal
+import threading
 import ctypes
 from ctypes import wintypes
 
+import clock
+import config_push
+import console_tap
+import power_control
+import xmodem_transfer
+from extractors import StreamExtractor
+from step_history import StepHistory, StepMonitor
+from pacing import Pacer, apply_echo, common_prefix, MAX_RESYNCS, PROMPT_QUIET, QUIET_GAP, QUIET_MAX
+from receive import ReceiveBuffer, clean_bytes, compile_expect
+
 STATUS_FLAG = "STATUS_FLAG::"
+EVENT_FLAG = "EVENT_FLAG::"
 BAUD_RATE = 9600
+CANCEL_EXIT_CODE = 130
+
+cancel_event = threading.Event()
+
+# Gang mode drives several ports from one process; each port's thread sets
+# console.sink to a callable(kind, data) that tags its output with the port.
+console = threading.local()
+
+class WorkflowCancelled(Exception):
+    pass
+
+def request_cancel(*_):
+    cancel_event.set()
+
+def watch_for_cancel():
+    """
+    The hub asks for a cooperative stop by writing CANCEL to stdin. Unlike a
+    signal this also works on Windows, where SIGTERM kills outright.
+    """
+    for line in sys.stdin:
+        if line.strip() == "CANCEL":
+            request_cancel()
+            return
+
+def pause(seconds):
+    """time.sleep() that wakes up immediately and raises once a cancel is requested."""
+    if clock.sleep(seconds, cancel_event):
+        raise WorkflowCancelled("Cancelled by operator")
+
+def write_output(text):
+    """Device output and script logs go to stderr, or to this thread's console sink."""
+    sink = getattr(console, "sink", None)
+    if sink:
+        sink("output", text)
+    else:
+        print(text, file=sys.stderr, flush=True, end='')
 
 def log_output(message):
-    print(f"[SCRIPT] {message}", file=sys.stderr, flush=True)
+    write_output(f"[SCRIPT] {message}\n")
 
-def clean_output(data):
-    cleaned_data = re.sub(r'[\x00-\x08\x0B\x0C\x0D\x0E-\x1F\x7F]', '', data)
+def receive(ser, extractor=None, monitor=None):
+    """
+    Reads what is waiting and returns it cleaned, as bytes. Text is decoded
+    once here, for the log and the extractor.
+    """
+    cleaned_data = clean_bytes(ser.read(ser.in_waiting))
+    if cleaned_data:
+        text = cleaned_data.decode('ascii')
+        write_output(text)
+        if extractor:
+            extractor.feed(text)
+        if monitor:
+            monitor.on_data()
     return cleaned_data
 
-def send_command(ser, cmd):
+def send_command(ser, cmd, pacer=None, extractor=None):
+    """
+    Without a pacer the command goes out in one write. With one it is typed
+    in echo-verified bursts first (see type_paced()), then Enter is sent.
+    Commands with control characters are never paced: they are not echoed.
+    """
     log_output(f">> Sending: {cmd}")
+    if pacer is not None and cmd and cmd.isprintable():
+        type_paced(ser, cmd, pacer, extractor)
+        cmd = ""
     ser.write(cmd.encode('ascii') + b'\r')
     ser.flush()
 
-def interrupt_and_read_until(ser, interrupt_char, expect_regex, timeout=120):
+def read_echo(ser, line, target, timeout, extractor=None):
+    """
+    Reads the device's echo into 'line' until it equals 'target', stops
+    agreeing with it, or 'timeout' passes; with no target it just collects
+    until the timeout. Returns None if the device printed a new line, which
+    means other output (a log message) got mixed into the echo.
+    """
+    deadline = clock.now() + timeout
+    while line != target and clock.now() < deadline:
+        if ser.in_waiting > 0:
+            data = ser.read(ser.in_waiting)
+            cleaned_data = clean_bytes(data)
+            if cleaned_data:
+                text = cleaned_data.decode('ascii')
+                write_output(text)
+                if extractor:
+                    extractor.feed(text)
+            if b'\n' in data:
+                return None
+            # Raw, not cleaned: the backspaces in the echo matter here.
+            line = apply_echo(line, data.decode('ascii', errors='ignore'))
+            if target and line.startswith(' ') and not target.startswith(' '):
+                line = line.lstrip(' ')     # The prompt's trailing space, still in flight
+            if target is not None and not target.startswith(line):
+                break
+        else:
+            pause(0.005)
+    return line
+
+def type_paced(ser, cmd, pacer, extractor=None):
+    """
+    Types 'cmd' without Enter, one burst at a time, checking the device's
+    echo of each burst before sending the next. When characters are dropped
+    or garbled, the line is backspaced to the last character the device got
+    right, the pacer slows down and typing resumes from there; only
+    MAX_RESYNCS failures in a row without progress fail the step. If the echo
+    cannot be checked (no echo at a password prompt, or a log message in the
+    middle of it) the rest goes out in one write.
+    """
+    # The tail of the last prompt may still be arriving; it is not part of the echo.
+    wait_for_quiet(ser, extractor, gap=PROMPT_QUIET)
+
+    line = ""
+    pos = 0
+    resyncs = 0
+    while pos < len(cmd):
+        burst = cmd[pos:pos + pacer.burst]
+        ser.write(burst.encode('ascii'))
+        ser.flush()
+        target = cmd[:pos + len(burst)]
+        line = read_echo(ser, line, target, pacer.echo_timeout(len(burst), ser.baudrate), extractor)
+        if line == target:
+            pos = len(target)
+            resyncs = 0
+            pacer.success()
+            if pacer.gap and pos < len(cmd):
+                pause(pacer.gap)
+            continue
+
+        if line is None or (not line and pos == 0):
+            log_output("[.] Echo cannot be checked here, sending the rest unpaced")
+            ser.write(cmd[len(target):].encode('ascii'))
+            return
+
+        # Let the rest of a late echo arrive so the erase count is right.
+        line = read_echo(ser, line, None, QUIET_GAP, extractor)
+        if line is None:
+            # Other output got mixed in, so there is no telling what to erase.
+            log_output("[.] Echo cannot be checked here, sending the rest unpaced")
+            ser.write(cmd[len(target):].encode('ascii'))
+            return
+        pacer.failure()
+        resyncs += 1
+        if resyncs > MAX_RESYNCS:
+            raise serial.SerialException(f"Console keeps dropping characters while typing '{cmd}'")
+        keep = common_prefix(line, cmd)
+        log_output(f"[.] Echo lost characters after '{cmd[:keep]}', retyping "
+                   f"(burst {pacer.burst}, gap {pacer.gap * 1000:.0f} ms)")
+        for _ in range(len(line) - keep):
+            ser.write(b'\x08')
+            ser.flush()
+            pause(pacer.gap)
+        # The erase echo ("\b \b") passes through states that are not a prefix, so drain it whole.
+        read_echo(ser, line, None, pacer.echo_timeout(3 * (len(line) - keep), ser.baudrate), extractor)
+        line = cmd[:keep]
+        pos = keep
+
+def wait_for_quiet(ser, extractor=None, monitor=None, gap=QUIET_GAP, limit=QUIET_MAX):
+    """
+    For commands without an 'expect': returns once the device has been
+    silent for 'gap' seconds (or after 'limit'), instead of sleeping a fixed
+    time. What was read is returned so the next step still gets to match it.
+    """
+    buffer = ReceiveBuffer()
+    start_time = last_data = clock.now()
+    while clock.now() - start_time < limit:
+        if ser.in_waiting > 0:
+            buffer.append(receive(ser, extractor, monitor))
+            last_data = clock.now()
+        elif clock.now() - last_data >= gap:
+            break
+        pause(0.02)
+    return buffer.text()
+
+def interrupt_and_read_until(ser, interrupt_char, expect_regex, timeout=120, extractor=None, monitor=None):
     log_output(f"Sending interrupt '{interrupt_char.encode()}' until '{expect_regex}' is seen...")
-    buffer = ""
-    start_time = time.time()
+    pattern = compile_expect(expect_regex)
+    received = ReceiveBuffer()
+    start_time = clock.now()
 
     #cycle = 0
     try:
@@ -40,7 +214,7 @@ def interrupt_and_read_until(ser, interrupt_char, expect_regex, timeout=120):
             pass
 
     # WITCH CRAFT DO NOT TOUCH
-    while time.time() - start_time < timeout:
+    while clock.now() - start_time < timeout:
 
         if interrupt_char == "__BREAK__":
             if com_handle:
@@ -86,132 +260,511 @@ def interrupt_and_read_until(ser, interrupt_char, expect_regex, timeout=120):
             print("![300]", file=sys.stderr, end='', flush=True)"""
 
 
-        time.sleep(0.1)
+        pause(0.1)
 
         # 3. Read
         if ser.in_waiting > 0:
-            data = ser.read(ser.in_waiting).decode('ascii', errors='ignore')
-            cleaned_data = clean_output(data)
-            buffer += cleaned_data
-
-            if cleaned_data:
-                print(cleaned_data, file=sys.stderr, flush=True, end='')
+            received.append(receive(ser, extractor, monitor))
 
                 # 4. Check if we found it
-            if re.search(expect_regex, buffer, re.IGNORECASE | re.MULTILINE):
+            if received.search(pattern):
                 log_output(f"\n[.] Interrupt successful! Matched: '{expect_regex}'")
-                return buffer
+                return received.text()
+
+        if monitor:
+            monitor.check()
     # --- END MODIFIED LOOP ---
 
     log_output(f"\n[!] TIMEOUT waiting for: '{expect_regex}' after interrupt.")
     raise serial.SerialTimeoutException(f"Timeout waiting for '{expect_regex}' after interrupt")
 
-def read_until(ser, expect_regex, timeout=30):
-    buffer = ""
-    start_time = time.time()
-
-    while time.time() - start_time < timeout:
+def read_until(ser, expect_regex, timeout=30, extractor=None, monitor=None, buffer=""):
+    """
+    'buffer' seeds the search with output that was already read (gang
+    eviction, or what the previous step's quiet wait picked up).
+    """
+    start_time = clock.now()
+    pattern = compile_expect(expect_regex)
+    received = ReceiveBuffer(buffer.encode('ascii', errors='ignore'))
+    if buffer and received.search(pattern):
+        log_output(f"[.] Matched: '{expect_regex}'")
+        return buffer
+
+    while clock.now() - start_time < timeout:
         if ser.in_waiting > 0:
-            data = ser.read(ser.in_waiting).decode('ascii', errors='ignore')
-            cleaned_data = clean_output(data)
-            buffer += cleaned_data
-
-            if cleaned_data:
-                print(cleaned_data, file=sys.stderr, flush=True, end='')
+            received.append(receive(ser, extractor, monitor))
 
-            if buffer.rstrip().endswith('-- MORE --'):
+            if received.endswith(b'-- MORE --'):
                 log_output("[.] Handling pagination ('-- MORE --')...")
                 ser.write(b' ')
                 ser.flush()
-                buffer = ""
+                received.clear()
                 continue
 
-            if re.search(expect_regex, buffer, re.IGNORECASE | re.MULTILINE):
+            if received.search(pattern):
                 log_output(f"[.] Matched: '{expect_regex}'")
-                return buffer
+                return received.text()
 
-        time.sleep(0.1)
+        if monitor:
+            monitor.check()
+        pause(0.1)
 
     log_output(f"[!] TIMEOUT waiting for: '{expect_regex}'")
     raise serial.SerialTimeoutException(f"Timeout waiting for '{expect_regex}'")
 
+def send_event(event_type, data):
+    """
+    Sends a structured engine event (e.g. extracted inventory) to stdout,
+    next to the status flags.
+    """
+    sink = getattr(console, "sink", None)
+    if sink:
+        sink("event", {'type': event_type, 'data': data})
+        return
+    print(f"{EVENT_FLAG}{json.dumps({'type': event_type, 'data': data})}")
+    sys.stdout.flush()
+
+def transfer_file(ser, step, status_message):
+    """
+    Pushes a local image with Xmodem-1K/Ymodem. If 'transfer_baud' is set the
+    host side is switched for the duration of the transfer; the template must
+    raise the device's console speed in an earlier step.
+    """
+    path = step['transfer']
+    protocol = step.get('protocol', 'ymodem')
+    transfer_baud = step.get('transfer_baud')
+    original_baud = ser.baudrate
+
+    def report(sent, total, rate):
+        percent = 100 * sent // total if total else 100
+        log_output(f"[.] {sent}/{total} bytes ({percent}%) @ {rate / 1024:.1f} KiB/s")
+        send_status(f"{status_message} ({percent}% @ {rate / 1024:.1f} KiB/s)")
+
+    if transfer_baud:
+        log_output(f"Switching {ser.port} to {transfer_baud} baud for transfer")
+        ser.baudrate = transfer_baud
+    try:
+        log_output(f"Sending '{path}' via {protocol}...")
+        total, elapsed = xmodem_transfer.send_file(ser, path, protocol, step.get('timeout', 60), report, cancel_event)
+        log_output(f"[.] Transfer complete: {total} bytes in {elapsed:.1f}s")
+    finally:
+        if transfer_baud and not step.get('keep_baud', False):
+            ser.baudrate = original_baud
+
+def push_config(ser, step, status_message, timeout, extractor=None, monitor=None):
+    """
+    Streams the file in 'push' with up to 'window' lines in flight, counting
+    the device's prompts as acknowledgements (see config_push). XON/XOFF is
+    switched on for the push where the port supports it, so a console that
+    falls behind can pause the host. 'timeout' is how long the device may go
+    without finishing a line. Returns the prompt after the last line.
+    """
+    path = step['push']
+    lines = config_push.load_lines(path)
+    window = step.get('window', config_push.PUSH_WINDOW)
+    tracker = config_push.LineTracker(step.get('ack', config_push.ACK_PATTERN),
+                                      step.get('error', config_push.ERROR_PATTERN))
+    # The prompt the device is sitting at must not count as the first line's.
+    wait_for_quiet(ser, extractor, monitor)
+
+    xonxoff = step.get('xonxoff', True) and hasattr(ser, 'xonxoff')
+    if xonxoff:
+        original_xonxoff = ser.xonxoff
+        ser.xonxoff = True
+    log_output(f"Pushing '{path}': {len(lines)} lines, up to {window} in flight"
+               + (", XON/XOFF" if xonxoff else ""))
+    report_every = max(len(lines) // 20, 1)
+    sent = 0
+    started = last_progress = clock.now()
+    try:
+        while tracker.acks < len(lines):
+            while sent < len(lines) and sent - tracker.acks < window:
+                ser.write(lines[sent][1].encode('ascii') + b'\r')
+                sent += 1
+            ser.flush()
+
+            if ser.in_waiting > 0:
+                done = tracker.acks
+                error = tracker.feed(receive(ser, extractor, monitor))
+                if error:
+                    number, line = lines[tracker.acks]
+                    raise config_push.PushError(f"Line {number} of '{path}' was rejected: '{line}' -> {error}")
+                if tracker.acks > done:
+                    last_progress = clock.now()
+                    if tracker.acks // report_every > done // report_every:
+                        send_status(f"{status_message} ({min(tracker.acks, len(lines))}/{len(lines)} lines)")
+                continue
+
+            if clock.now() - last_progress > timeout:
+                number, line = lines[tracker.acks]
+                log_output(f"[!] TIMEOUT waiting for the prompt after line {number}")
+                raise serial.SerialTimeoutException(f"No prompt after line {number} of '{path}' ('{line}') "
+                                                    f"within {timeout}s")
+            if monitor:
+                monitor.check()
+            pause(0.02)
+    finally:
+        if xonxoff:
+            ser.xonxoff = original_xonxoff
+    log_output(f"[.] Pushed {len(lines)} lines in {clock.now() - started:.1f}s")
+    return tracker.partial.decode('ascii')
+
+def tap_console(ser, com_port):
+    """
+    Mirrors the port's raw console to read-only observers (see console_tap.py)
+    and tells the hub where. Returns the port to run on: the tapped one, or
+    'ser' itself in simulations, on Windows or when the mirror cannot start.
+    """
+    if clock.current.virtual or not console_tap.available():
+        return ser
+    try:
+        tapped = console_tap.TappedSerial(ser, com_port)
+    except OSError as e:
+        log_output(f"Console mirror unavailable: {e}")
+        return ser
+    endpoints = tapped.tap.endpoints()
+    log_output(f"Console mirror: screen {endpoints['pty']}  or  socat - UNIX-CONNECT:{endpoints['socket']}")
+    send_event("console", endpoints)
+    return tapped
+
+POWER_PROMPTS = {"cycle": "power cycle the device", "off": "switch the device off", "on": "switch the device on"}
+
+def load_power():
+    """Installs the bench's power map (power_control.py) unless a simulation installed its own."""
+    if power_control.current is not None:
+        return
+    try:
+        power_control.install(power_control.load())
+    except (OSError, ValueError) as e:
+        log_output(f"Power control unavailable, power steps fall back to the operator: {e}")
+
+def has_power(ser):
+    return power_control.current is not None and power_control.current.has_outlet(ser.port)
+
+def switch_power(ser, step, action):
+    """
+    Runs a step's "power" action ("cycle", "off" or "on") on the port's PDU
+    outlet. The rest of the step follows at once, so an interrupt starts
+    firing right after power-on. Power-ons wait their turn across the bench
+    (see power_control.py). A port without an outlet leaves it to the operator.
+    """
+    if not has_power(ser):
+        log_output(f"No power outlet for {ser.port}: {POWER_PROMPTS[action]} by hand")
+        return
+    power = power_control.current
+    if action in ("cycle", "off"):
+        log_output(f"Powering {ser.port} off ({power.describe(ser.port)})")
+        power.turn_off(ser.port)
+    if action == "cycle":
+        try:
+            pause(step.get('off_time', power.off_time))
+        except WorkflowCancelled:
+            # Do not leave a cancelled run's device dark.
+            power.turn_on(ser.port, clock.sleep)
+            raise
+    if action in ("cycle", "on"):
+        waited = power.turn_on(ser.port, pause)
+        log_output(f"Powered {ser.port} on" + (f" after waiting {waited:.1f}s for its turn" if waited >= 1 else ""))
+
+def send_step(step, status_message, is_interactive, timeout):
+    """
+    Announces a step as it starts, so the hub knows which ports are waiting
+    on the operator and how long they have left.
+    """
+    send_event("step", {
+        "name": step['name'],
+        "status": status_message,
+        "operator": bool(is_interactive),
+        "timeout": timeout,
+    })
+
 def send_status(text, is_interactive=False, is_completed=False):
     """
     Sends a structured JSON status to stdout.
     """
-    status_payload = json.dumps({
+    status = {
         "text": text,
         "interactive": is_interactive,
         "complete": is_completed,
-    })
-    print(f"{STATUS_FLAG}{status_payload}")
+    }
+    sink = getattr(console, "sink", None)
+    if sink:
+        sink("status", status)
+        return
+    print(f"{STATUS_FLAG}{json.dumps(status)}")
     sys.stdout.flush()
 
-def main(json_path, com_port):
+def retry_policy(step, default=None):
+    """
+    The step's "retry" as {"attempts", "action", "backoff", "timeout"}, or
+    None. 'retry: 2' is short for two resync attempts. 'default' (the
+    template's "retry") only covers steps that do not wait on the operator.
+    Interrupt, transfer and push steps are never retried: they cannot be
+    repeated from the middle.
+    """
+    policy = step.get('retry')
+    if policy is None and not step.get("require_physical_interact", False):
+        policy = default
+    if not policy or not step.get('expect') or step.get('interrupt') or step.get('transfer') or step.get('push'):
+        return None
+    if isinstance(policy, int):
+        policy = {"attempts": policy}
+    return {
+        "attempts": policy.get("attempts", 1),
+        "action": policy.get("action", "resync"),
+        "backoff": policy.get("backoff", 1.0),
+        "timeout": policy.get("timeout") or step.get('timeout', 30),
+    }
+
+def retry_step(ser, step, error, policy, extractor=None, monitor=None, pacer=None):
+    """
+    Recovers a step whose expect timed out instead of failing the run.
+    'resync' sends a bare Enter so the device reprints its prompt (a lost
+    Enter on a Tcl continuation line), 'resend' types the command again,
+    'reexpect' only waits again. Attempts back off 'backoff' seconds,
+    doubling each time. The last timeout is raised once they run out.
+    """
+    status_message = step.get("status", step['name'])
+    command = step.get('command')
+    action = policy['action']
+    if action == 'resend' and command is None:
+        action = 'reexpect'
+    attempts = policy['attempts']
+    for attempt in range(1, attempts + 1):
+        log_output(f"[!] {error}; retry {attempt}/{attempts} ({action})")
+        send_status(f"{status_message} (retry {attempt}/{attempts})", step.get("require_physical_interact", False))
+        pause(policy['backoff'] * 2 ** (attempt - 1))
+        if monitor:
+            monitor.retry()
+        if action == 'resync':
+            log_output(">> Sending: <Enter> (resync)")
+            ser.write(b'\r')
+            ser.flush()
+        elif action == 'resend':
+            send_command(ser, command, pacer, extractor)
+        try:
+            output = read_until(ser, step['expect'], policy['timeout'], extractor, monitor)
+        except serial.SerialTimeoutException as e:
+            error = e
+            continue
+        log_output(f"[.] Recovered on retry {attempt}/{attempts}")
+        send_status(status_message, step.get("require_physical_interact", False))
+        return output
+    raise error
+
+def run_step(ser, step, extractor=None, timeout=None, monitor=None, pacer=None, carry="", retry=None):
+    """
+    Runs one template step on an open port and returns the output it read.
+    'carry' is output already read that a prompt wait should search first:
+    what the quiet wait after a command picked up, or the last prompt of
+    the previous template in a chain. 'retry' is the template's default
+    retry policy (see retry_policy()).
+    """
+    policy = retry_policy(step, retry)
     try:
+        return run_step_once(ser, step, extractor, timeout, monitor, pacer, carry)
+    except serial.SerialTimeoutException as e:
+        if policy is None or cancel_event.is_set():
+            raise
+        return retry_step(ser, step, e, policy, extractor, monitor, pacer)
+
+def run_step_once(ser, step, extractor=None, timeout=None, monitor=None, pacer=None, carry=""):
+    status_message = step.get("status", step['name'])
+    command = step.get('command')
+    transfer = step.get('transfer')
+    push = step.get('push')
+    power = step.get('power')
+    interrupt_char = step.get('interrupt')
+    expect_string = step.get('expect')
+    if timeout is None:
+        timeout = step.get('timeout', 30)
+
+    # --- PHYSICAL INTERACTION FLAG ---
+    is_interactive = step.get("require_physical_interact", False)
+    is_completed = step.get("is_completed", False)
+    if power and not has_power(ser):
+        status_message = f"{status_message} ({POWER_PROMPTS[power]})"
+        is_interactive = True
+
+    # Send the structured status
+    send_status(status_message, is_interactive)
+    send_step(step, status_message, is_interactive, timeout)
+
+    if step.get('pacing', True) is False:
+        pacer = None
+
+    if power:
+        switch_power(ser, step, power)
+
+    if interrupt_char:
+        return interrupt_and_read_until(ser, interrupt_char, expect_string, timeout, extractor, monitor)
+
+    elif transfer:
+        if command is not None:
+            send_command(ser, command, pacer, extractor)
+        transfer_file(ser, step, status_message)
+        if expect_string:
+            return read_until(ser, expect_string, timeout, extractor, monitor)
+
+    elif push:
+        if command is not None:
+            send_command(ser, command, pacer, extractor)
+        prompt = push_config(ser, step, status_message, timeout, extractor, monitor)
+        if expect_string:
+            return read_until(ser, expect_string, timeout, extractor, monitor, prompt)
+        return prompt
+
+    elif command is None:
+        if expect_string:
+            log_output(f"Waiting for prompt (expect: '{expect_string}')...")
+            return read_until(ser, expect_string, timeout, extractor, monitor, carry)
+
+    else:
+        send_command(ser, command, pacer, extractor)
+        if expect_string:
+            return read_until(ser, expect_string, timeout, extractor, monitor)
+        return wait_for_quiet(ser, extractor, monitor)
+    return ""
+
+def carry_over(step, output):
+    """What a step leaves for the next one's prompt wait: the output of a command or push that expected nothing."""
+    if (step.get('command') is not None or step.get('push')) and not step.get('expect'):
+        return output
+    return ""
+
+def step_monitor(history, template_key, index, step, settings):
+    """
+    Builds the StepMonitor and effective timeout for a step from past runs.
+    Device-timed steps get a learned deadline and stall limit; steps that
+    wait on the operator (physical interaction, boot interrupts) keep their
+    static timeout and only raise an "overdue" alert.
+    """
+    timeout = step.get('timeout', 30)
+    if history is None or step.get('adaptive', True) is False or step.get('transfer') or step.get('push'):
+        return timeout, StepMonitor(step.get('stall_timeout'))
+
+    deadline, stall = history.limits(template_key, f"{index}:{step['name']}", timeout, settings)
+    stall = step.get('stall_timeout', stall)
+    if step.get("require_physical_interact", False) or step.get('interrupt'):
+        status_message = step.get("status", step['name'])
+        return timeout, StepMonitor(stall, deadline, lambda: send_status(f"{status_message} (overdue)", True))
+
+    if deadline is not None and deadline < timeout:
+        log_output(f"[.] Adaptive timeout {deadline:.0f}s (static {timeout}s), stall limit {stall:.0f}s")
+        timeout = deadline
+    return timeout, StepMonitor(stall)
+
+def main(json_paths, com_port, open_port=None):
+    """
+    Runs one template, or several back to back on one open port (a chain):
+    the session, the last prompt and any unread output, the learned typing
+    pace and the status stream all carry over from one template to the next.
+    'open_port' replaces serial.Serial for simulations (see simulate.py).
+    """
+    if isinstance(json_paths, str):
+        json_paths = [json_paths]
+    signal.signal(signal.SIGTERM, request_cancel)
+    signal.signal(signal.SIGINT, request_cancel)
+    if hasattr(signal, "SIGBREAK"):
+        signal.signal(signal.SIGBREAK, request_cancel)
+    threading.Thread(target=watch_for_cancel, daemon=True).start()
 
-        with open(json_path, 'r') as f:
-            workflow = json.load(f)
+    try:
+        workflows = []
+        for json_path in json_paths:
+            with open(json_path, 'r') as f:
+                workflows.append(json.load(f))
     except Exception as e:
         send_status("Fatally Failed", True) # Make errors flash
         log_output(f"!====== FAILED to load template: {e} ======!")
         sys.exit(1)
 
-    log_output(f"*=*=*=*=*= Running workflow '{workflow['name']}' on {com_port} *=*=*=*=*=")
+    names = " -> ".join(f"'{workflow['name']}'" for workflow in workflows)
+    log_output(f"*=*=*=*=*= Running workflow {names} on {com_port} *=*=*=*=*=")
 
     try:
-        ser = serial.Serial(com_port, BAUD_RATE, timeout=1)
-    except Exception as e:
+        extractors = [StreamExtractor(workflow.get('extract'), lambda fields: send_event("inventory", fields))
+                      for workflow in workflows]
+    except (re.error, ValueError) as e:
         send_status("Fatally Failed", True) # Make errors flash
-        log_output(f"!====== FAILED to open port {com_port}: {e} ======!")
+        log_output(f"!====== FAILED to compile extractors: {e} ======!")
         sys.exit(1)
 
     try:
-        for step in workflow['steps']:
-            status_message = step.get("status", step['name'])
-            command = step.get('command')
-            interrupt_char = step.get('interrupt')
-            expect_string = step.get('expect')
-            timeout = step.get('timeout', 30)
-
-            # --- PHYSICAL INTERACTION FLAG ---
-            is_interactive = step.get("require_physical_interact", False)
-            is_completed = step.get("is_completed", False)
-
-            # Send the structured status
-            send_status(status_message, is_interactive)
+        ser = open_port(com_port) if open_port else serial.Serial(com_port, BAUD_RATE, timeout=1)
+    except Exception as e:
+        send_status("Fatally Failed", True) # Make errors flash
+        log_output(f"!====== FAILED to open port {com_port}: {e} ======!")
+        sys.exit(1)
+    ser = tap_console(ser, com_port)
+    load_power()
 
-            if interrupt_char:
-                interrupt_and_read_until(ser, interrupt_char, expect_string, timeout)
+    history = None
+    # Virtual durations would teach real runs impossible deadlines.
+    if any(workflow.get('adaptive', {}) is not False for workflow in workflows) and not clock.current.virtual:
+        try:
+            history = StepHistory()
+        except Exception as e:
+            log_output(f"Step history unavailable, using static timeouts: {e}")
 
-            elif command is None:
-                if expect_string:
-                    log_output(f"Waiting for prompt (expect: '{expect_string}')...")
-                    read_until(ser, expect_string, timeout)
+    pacing = workflows[0].get('pacing', {})
+    pacer = Pacer(**(pacing if isinstance(pacing, dict) else {}))
+    carry = ""
+    last_output = ""
+    extractor = extractors[0]
 
-            else:
-                send_command(ser, command)
-                if expect_string:
-                    read_until(ser, expect_string, timeout)
-                else:
-                    time.sleep(0.5)
+    try:
+        for number, (json_path, workflow, extractor) in enumerate(zip(json_paths, workflows, extractors), 1):
+            if number > 1:
+                log_output(f"*=*=*=*=*= Chained workflow '{workflow['name']}' ({number}/{len(workflows)}) *=*=*=*=*=")
+                # The previous template already matched the prompt the device is sitting at.
+                carry = carry or last_output.rpartition("\n")[2]
+            template_key = os.path.basename(json_path)
+            settings = workflow.get('adaptive', {})
+            template_history = history if settings is not False else None
+            template_pacer = pacer if workflow.get('pacing', {}) is not False else None
+
+            for index, step in enumerate(workflow['steps']):
+                # Between steps is always a safe point to stop.
+                if cancel_event.is_set():
+                    raise WorkflowCancelled("Cancelled by operator")
+                timeout, monitor = step_monitor(template_history, template_key, index, step, settings)
+                output = run_step(ser, step, extractor, timeout, monitor, template_pacer, carry, workflow.get('retry'))
+                carry = carry_over(step, output)
+                last_output = output or last_output
+
+                if template_history and step.get('expect') and not step.get('transfer') and not step.get('push') \
+                        and not monitor.retries:
+                    template_history.record(template_key, f"{index}:{step['name']}", *monitor.finish())
+            extractor.flush()
 
     except Exception as e:
+        extractor.flush()
+        if cancel_event.is_set():
+            # Release the device first so a restart on this port can open it at once.
+            ser.close()
+            log_output("!====== Workflow cancelled, port closed ======!")
+            sys.stderr.flush()
+            send_status("Cancelled")
+            sys.exit(CANCEL_EXIT_CODE)
         send_status("Fatally Failed", True) # Make errors flash
         log_output(f"!====== CRITICAL ERROR: {e} ======!")
         ser.close()
         sys.exit(1)
 
     ser.close()
+    if pacer.drops:
+        log_output(f"[.] Console dropped characters {pacer.drops} time(s); settled on "
+                   f"{pacer.burst}-character bursts, {pacer.gap * 1000:.0f} ms apart")
     log_output("Workflow finished successfully.")
     send_status("Successfully Finished")
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
         send_status("Fatally Failed", True)
-        print("[SCRIPT] ERROR: Missing arguments. Usage: python workflow_runner.py <template.json> <COM_PORT>", file=sys.stderr, flush=True)
+        print("[SCRIPT] ERROR: Missing arguments. Usage: python workflow_runner.py <template.json> [<template.json> ...] <COM_PORT>", file=sys.stderr, flush=True)
         sys.exit(1)
 
-    json_path = sys.argv[1]
-    com_port = sys.argv[2]
-    main(json_path, com_port)
\ No newline at end of file
+    json_paths = sys.argv[1:-1]
+    com_port = sys.argv[-1]
+    main(json_paths, com_port)
\ No newline at end of file
@@ -0,0 +1,181 @@
+import binascii
+import mmap
+import os
+
+import serial
+
+import clock
+
+SOH = b'\x01'  # 128-byte block
+STX = b'\x02'  # 1024-byte block
+EOT = b'\x04'
+ACK = b'\x06'
+NAK = b'\x15'
+CAN = b'\x18'
+CRC_MODE = b'C'
+PAD = 0x1A
+
+BLOCK_SIZE = 1024
+MAX_RETRIES = 10
+READ_POLL = 0.01
+PROTOCOLS = ("xmodem1k", "ymodem")
+
+
+class TransferError(serial.SerialException):
+    pass
+
+
+def crc16(data):
+    """
+    CRC-16/XMODEM (poly 0x1021, init 0). binascii.crc_hqx is exactly that
+    and runs in C, which matters at 1K blocks on a 921600 baud link.
+    """
+    return binascii.crc_hqx(data, 0)
+
+
+def build_block(seq, payload, size=BLOCK_SIZE):
+    """
+    Frames one block: header, sequence number and its complement, payload
+    padded with ^Z up to the block size, big-endian CRC16.
+    """
+    header = STX if size == BLOCK_SIZE else SOH
+    block = bytearray(size)
+    block[:len(payload)] = payload
+    if len(payload) < size:
+        block[len(payload):] = bytes([PAD]) * (size - len(payload))
+    seq &= 0xFF
+    return header + bytes((seq, 0xFF - seq)) + bytes(block) + crc16(block).to_bytes(2, "big")
+
+
+def ymodem_header_block(file_name, file_size):
+    """Block 0 of a Ymodem batch: NUL-terminated name, then the size in decimal."""
+    if file_name is None:
+        return build_block(0, b'', size=128)
+    info = file_name.encode('ascii') + b'\x00' + str(file_size).encode('ascii') + b'\x00'
+    return build_block(0, info, size=128 if len(info) <= 128 else BLOCK_SIZE)
+
+
+def _read_byte(ser, deadline, cancelled=None):
+    while clock.now() < deadline:
+        if cancelled is not None and cancelled.is_set():
+            raise TransferError("Transfer cancelled by operator")
+        b = ser.read(1)
+        if b:
+            return b
+        # A port with a read timeout has already waited; this lets a virtual clock move on.
+        clock.sleep(READ_POLL)
+    return None
+
+
+def wait_for_receiver(ser, timeout, cancelled=None):
+    """
+    The receiver drives Xmodem-CRC: it repeats 'C' until the sender starts.
+    Anything else on the wire (prompt echo, banner text) is skipped.
+    """
+    deadline = clock.now() + timeout
+    while True:
+        b = _read_byte(ser, deadline, cancelled)
+        if b is None:
+            raise TransferError("Receiver never requested a CRC transfer")
+        if b == CRC_MODE:
+            return
+        if b == CAN and _read_byte(ser, clock.now() + 1) == CAN:
+            raise TransferError("Transfer cancelled by receiver")
+
+
+def send_block(ser, block, timeout=10, cancelled=None):
+    """Sends a framed block until ACKed, retransmitting on NAK or silence."""
+    for _ in range(MAX_RETRIES):
+        ser.write(block)
+        ser.flush()
+        deadline = clock.now() + timeout
+        while True:
+            b = _read_byte(ser, deadline, cancelled)
+            if b is None or b == NAK:
+                break
+            if b == ACK:
+                return
+            if b == CAN and _read_byte(ser, clock.now() + 1) == CAN:
+                raise TransferError("Transfer cancelled by receiver")
+            # A stray 'C' means the receiver missed our first block; resend.
+            if b == CRC_MODE:
+                break
+    raise TransferError(f"No ACK after {MAX_RETRIES} attempts")
+
+
+def send_eot(ser, timeout=10):
+    for _ in range(MAX_RETRIES):
+        ser.write(EOT)
+        ser.flush()
+        b = _read_byte(ser, clock.now() + timeout)
+        if b == ACK:
+            return
+    raise TransferError("Receiver never acknowledged EOT")
+
+
+def send_file(ser, path, protocol="ymodem", timeout=60, progress=None, cancelled=None):
+    """
+    Streams the file at 'path' to the device with Xmodem-1K or Ymodem.
+
+    The image is mapped read-only instead of read into memory, so every
+    runner pushing the same IOS image shares one copy in the page cache no
+    matter how many ports transfer in parallel.
+
+    'progress' is called as progress(sent_bytes, total_bytes, bytes_per_sec)
+    at most once per second and once at the end. Setting the optional
+    'cancelled' event aborts the transfer with CAN at the next read.
+
+    Returns (total_bytes, elapsed_seconds).
+    """
+    if protocol not in PROTOCOLS:
+        raise ValueError(f"Unknown transfer protocol '{protocol}' (expected one of {PROTOCOLS})")
+
+    total = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if total == 0:
+            view = memoryview(b'')
+            mapped = None
+        else:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mapped)
+        try:
+            wait_for_receiver(ser, timeout, cancelled)
+            start = clock.now()
+
+            if protocol == "ymodem":
+                send_block(ser, ymodem_header_block(os.path.basename(path), total), cancelled=cancelled)
+                wait_for_receiver(ser, timeout, cancelled)
+
+            seq = 1
+            sent = 0
+            last_report = start
+            while sent < total:
+                with view[sent:sent + BLOCK_SIZE] as chunk:
+                    send_block(ser, build_block(seq, chunk), cancelled=cancelled)
+                    sent += len(chunk)
+                seq += 1
+
+                now = clock.now()
+                if progress and now - last_report >= 1.0:
+                    progress(sent, total, sent / max(now - start, 1e-6))
+                    last_report = now
+
+            send_eot(ser)
+            if protocol == "ymodem":
+                # An empty block 0 closes the batch.
+                wait_for_receiver(ser, timeout, cancelled)
+                send_block(ser, ymodem_header_block(None, 0), cancelled=cancelled)
+
+            elapsed = clock.now() - start
+            if progress:
+                progress(total, total, total / max(elapsed, 1e-6))
+            return total, elapsed
+        except TransferError:
+            # Tell the receiver to give up too, so its prompt comes back.
+            ser.write(CAN * 2)
+            ser.flush()
+            raise
+        finally:
+            view.release()
+            if mapped is not None:
+                mapped.close()